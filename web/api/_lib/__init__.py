@@ -0,0 +1,5 @@
+"""Shared helpers for the FastAPI entry point and the Streamlit prototype.
+
+The package name starts with an underscore so Vercel does not deploy these
+modules as serverless functions of their own; only ``api/index.py`` is served.
+"""
@@ -0,0 +1,71 @@
+"""Concurrent fan-out for multi-location NASA POWER requests.
+
+Points falling in the same POWER grid cell with the same date range are
+fetched once. Distinct fetches run with bounded concurrency and retry with
+exponential backoff on transient upstream failures; results are yielded as
+soon as each one finishes, with failures reported per location.
+"""
+import asyncio
+import random
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from api._lib.nasa_cache import UpstreamError, snap_to_grid
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    import httpx
+
+    if isinstance(error, UpstreamError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+async def with_retries(call: Callable[[], Awaitable], attempts: int = 3,
+                       base_delay: float = 0.5, max_delay: float = 8.0):
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            # Full jitter, so a burst of failures does not retry in lockstep
+            await asyncio.sleep(random.uniform(0, delay))
+
+
+def group_by_cell(points: Sequence) -> Dict[Tuple, List[int]]:
+    """Indices of ``points`` keyed by (grid cell, start date, end date)."""
+    groups: Dict[Tuple, List[int]] = {}
+    for index, point in enumerate(points):
+        key = (snap_to_grid(point.lat, point.lon), point.start_date, point.end_date)
+        groups.setdefault(key, []).append(index)
+    return groups
+
+
+async def fan_out(points: Sequence, fetch: Callable[[object], Awaitable], max_concurrency: int = 8,
+                  attempts: int = 3):
+    """Yield ``(indices, result, error)`` per distinct fetch, in completion order.
+
+    ``indices`` are the positions in ``points`` the fetch answers; exactly one of
+    ``result`` and ``error`` is set.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(indices: List[int]):
+        async with semaphore:
+            try:
+                return indices, await with_retries(lambda: fetch(points[indices[0]]), attempts), None
+            except Exception as e:
+                return indices, None, e
+
+    tasks = [asyncio.ensure_future(run(indices)) for indices in group_by_cell(points).values()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away mid-stream; stop fetching for it
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,100 @@
+"""Scoring the latest conditions of many farms in one call.
+
+A batch holds one feature vector per farm, as columns (parameter -> value per
+farm), and the location whose model scores each farm. Farms are grouped by
+location with one sort, every group is predicted with a single call to its
+flat model (see ``flat_model``), and the recommendation rules run over the
+whole batch at once. The cost is one predict per distinct model plus a few
+array operations, whatever the number of farms.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class FarmBatch(NamedTuple):
+    ids: List[str]
+    locations: np.ndarray           # str (object) per farm
+    columns: Dict[str, np.ndarray]  # parameter -> float64 value per farm, NaN where missing
+
+    @classmethod
+    def from_columns(cls, ids: Optional[Sequence[str]], locations: Sequence[str],
+                     columns: Dict[str, Sequence]) -> "FarmBatch":
+        ids = list(ids) if ids is not None else list(locations)
+        arrays = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        lengths = {len(ids), len(locations)} | {len(values) for values in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"ids, locations and columns have different lengths: {sorted(lengths)}")
+        return cls(ids, np.asarray(locations, dtype=object), arrays)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def group_rows(keys: np.ndarray) -> Dict[str, np.ndarray]:
+    """Row indices per distinct key, in one sort rather than one scan per key."""
+    unique, inverse = np.unique(keys.astype(str), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(unique)))[:-1]
+    return dict(zip(unique.tolist(), np.split(order, bounds)))
+
+
+def score_batch(batch: FarmBatch, features: Sequence[str], model_for: Callable[[str], Optional[dict]],
+                rule_engine, default_location: Optional[str] = None) -> dict:
+    """Predicted condition and recommendation codes per farm.
+
+    ``model_for(location)`` returns a model result (with its ``predictor``)
+    or None. Farms whose location has no model are scored with the model of
+    ``default_location`` when given, and reported under ``"errors"`` otherwise,
+    one ``{"row", "id", "error"}`` per farm in input order; ``row`` is the
+    farm's position, since ids need not be unique (they default to locations).
+    Recommendation codes index ``rule_engine.legend()``; like
+    ``generate_recommendations``, only farms predicted unfavorable get them.
+    """
+    X = np.column_stack([batch.columns[name] for name in features])
+    condition = np.full(len(batch), -1)
+    scored_by = np.full(len(batch), None, dtype=object)
+    models = {}
+    errors = []
+
+    groups = group_rows(batch.locations)
+    fallback = None
+    if default_location is not None:
+        fallback = model_for(default_location)
+    missing = []
+    for location, rows in groups.items():
+        result = model_for(location)
+        if result is None:
+            missing.append(rows)
+            continue
+        condition[rows] = result["predictor"].predict(X[rows])
+        scored_by[rows] = location
+        models[location] = {"farms": len(rows), "accuracy": result["accuracy"]}
+    if missing:
+        rows = np.concatenate(missing)
+        if fallback is not None:
+            condition[rows] = fallback["predictor"].predict(X[rows])
+            scored_by[rows] = default_location
+            previous = models.get(default_location, {}).get("farms", 0)
+            models[default_location] = {"farms": previous + len(rows), "accuracy": fallback["accuracy"]}
+        else:
+            for row in sorted(rows.tolist()):
+                errors.append({"row": row, "id": batch.ids[row],
+                               "error": f"No trained model for location {batch.locations[row]}"})
+
+    unfavorable = condition == 0
+    recommendations = {
+        name: np.where(unfavorable, codes, -1).tolist()
+        for name, codes in rule_engine.codes_for_frame(batch.columns).items()
+    }
+    labels = np.array(["unfavorable", "favorable", None], dtype=object)
+    return {
+        "ids": batch.ids,
+        "predicted_condition": labels[np.where(condition < 0, 2, condition)].tolist(),
+        "model_location": scored_by.tolist(),
+        # Per metric, an index into "messages" for each farm; -1 where none applies
+        "recommendations": recommendations,
+        "messages": rule_engine.legend(),
+        "models": models,
+        "errors": errors,
+    }
@@ -0,0 +1,89 @@
+"""Serialization of the daily NASA POWER frame into chart series.
+
+All series are built from whole columns in one pass: dates are formatted once
+with a vectorized ``strftime`` and values are pulled out with ``tolist``, so no
+per-row Series objects are created. Long ranges can be reduced to a bounded
+number of points per series with ``build_downsampled_chart_data``.
+"""
+from typing import Dict, Optional
+
+
+# Response series -> field name -> source column
+CHART_SERIES: Dict[str, Dict[str, str]] = {
+    "temperature": {"min": "T2M_MIN", "max": "T2M_MAX", "avg": "T2M"},
+    "precipitation": {"value": "PRECTOTCORR"},
+    "windSpeed": {"value": "WS2M"},
+    "solarRadiation": {"value": "ALLSKY_SFC_SW_DWN"},
+}
+
+
+def column_values(df, column: str) -> list:
+    """Values of ``column`` as Python floats.
+
+    Columns narrowed to float32 by the columnar store are rounded back to their
+    source precision, so 1.95 is sent as 1.95 rather than 1.9500000476837158.
+    """
+    decimals = df.attrs.get("decimals", {}).get(column)
+    values = df[column].to_numpy()
+    if decimals is not None and values.dtype.name == "float32":
+        return values.astype("float64").round(decimals).tolist()
+    return values.tolist()
+
+
+def build_chart_data(df, columnar: bool = False) -> dict:
+    """Chart series for ``df``.
+
+    By default every series is a list of ``{"date": ..., field: ...}`` records.
+    With ``columnar`` the dates are sent once under ``"dates"`` and each series
+    holds one array per field, which is much smaller for long ranges.
+    """
+    dates = df['date'].dt.strftime("%Y-%m-%d").tolist()
+    columns = {
+        column: column_values(df, column)
+        for fields in CHART_SERIES.values() for column in fields.values()
+    }
+
+    if columnar:
+        response = {"dates": dates}
+        for series, fields in CHART_SERIES.items():
+            response[series] = {field: columns[column] for field, column in fields.items()}
+        return response
+
+    return {
+        series: series_records(dates, {field: columns[column] for field, column in fields.items()})
+        for series, fields in CHART_SERIES.items()
+    }
+
+
+def series_records(dates: list, fields: Dict[str, list]) -> list:
+    names = list(fields)
+    return [{"date": row[0], **dict(zip(names, row[1:]))} for row in zip(dates, *fields.values())]
+
+
+def build_downsampled_chart_data(df, resolution: Optional[str] = None, max_points: Optional[int] = None,
+                                 columnar: bool = False) -> dict:
+    """Chart series of ``df`` reduced to at most ``max_points`` points (see ``downsample``).
+
+    Calendar buckets share one list of dates, the period starts. With LTTB each
+    series keeps its own days, so in the columnar layout every series carries
+    its own ``"dates"``. ``"resolution"`` tells which of the two was used.
+    """
+    from api._lib.downsample import DEFAULT_MAX_POINTS, bucket_series, choose_resolution, json_values, lttb_series
+
+    resolution = choose_resolution(df['date'].to_numpy(), resolution, max_points)
+    response = {"resolution": resolution}
+    if resolution == "lttb":
+        for series, (days, fields) in lttb_series(df, max_points or DEFAULT_MAX_POINTS).items():
+            dates = days.astype(str).tolist()
+            fields = {field: json_values(values) for field, values in fields.items()}
+            response[series] = {"dates": dates, **fields} if columnar else series_records(dates, fields)
+        return response
+
+    days, aggregated = bucket_series(df, resolution)
+    dates = days.astype(str).tolist()
+    if columnar:
+        response["dates"] = dates
+    for series, fields in aggregated.items():
+        fields = {field: json_values(values) for field, values in fields.items()}
+        response[series] = fields if columnar else series_records(dates, fields)
+    return response
@@ -0,0 +1,323 @@
+"""Per-location climatology and running totals of the daily NASA POWER frame.
+
+What is "normal" for a day is computed once, not per request. For every
+location and parameter the index keeps:
+
+* a (year, day of year) grid of daily values, with February 29 as its own day
+  so every year lines up;
+* per day of year, the mean, percentiles and sample count of all years' values
+  within ``SMOOTHING_DAYS`` of that day (a few years of data leave too few
+  samples for one calendar day alone), and for precipitation the share of
+  rain days;
+* prefix sums of values, valid days and rain days over consecutive calendar
+  days, so any trailing window (7, 30, 90 days...) or period total is two
+  lookups.
+
+Anomaly, rolling and frequency queries are then array lookups over the
+requested days. Appending a day touches one grid cell, re-derives the stats of
+the ``2 * SMOOTHING_DAYS + 1`` days of year around it and extends the prefix
+sums; nothing is rescanned. ``columnar_store`` saves the index next to the
+columns at ingest time; when a reloaded dataset is parsed from CSV instead,
+``from_frame`` appends its new days to copies of the previous index's entries.
+"""
+import json
+import warnings
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from api._lib.frame_index import DEFAULT_LOCATION, PERIOD_UNITS, period_start
+from api._lib.nasa_cache import FILL_VALUE
+
+
+CLIMATE_PARAMETERS = ("T2M", "T2M_MAX", "T2M_MIN", "PRECTOTCORR", "RH2M", "WS2M", "ALLSKY_SFC_SW_DWN")
+# Summed over a window instead of averaged
+ACCUMULATED = {"PRECTOTCORR"}
+PRECIPITATION = "PRECTOTCORR"
+# PRECTOTCORR above this (mm/day) counts as a rain day, as in the precipitation frequency chart
+RAIN_THRESHOLD = 0.0
+PERCENTILES = (10, 50, 90)
+SMOOTHING_DAYS = 7
+ROLLING_WINDOWS = (7, 30, 90)
+DAYS_IN_YEAR = 366
+BUCKETS = tuple(PERIOD_UNITS)
+
+
+def day_of_year(dates: np.ndarray) -> np.ndarray:
+    """0-365 position of each date in a leap year, so March 1 is always 60."""
+    days = dates.astype("datetime64[D]")
+    years = days.astype("datetime64[Y]")
+    ordinal = (days - years).astype(int)
+    year_numbers = years.astype(int) + 1970
+    leap = (year_numbers % 4 == 0) & ((year_numbers % 100 != 0) | (year_numbers % 400 == 0))
+    return ordinal + ((~leap) & (ordinal >= 59))
+
+
+def clean(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(values <= FILL_VALUE, np.nan, values)
+
+
+class LocationClimate:
+    def __init__(self, parameters: Sequence[str], first_day: np.datetime64):
+        self.parameters = list(parameters)
+        self.first_day = np.datetime64(first_day, "D")
+        self.first_year = int(self.first_day.astype("datetime64[Y]").astype(int)) + 1970
+        self.last_day = self.first_day - np.timedelta64(1, "D")
+        self.grid = {name: np.full((1, DAYS_IN_YEAR), np.nan) for name in self.parameters}
+        self.mean = {name: np.full(DAYS_IN_YEAR, np.nan) for name in self.parameters}
+        self.percentiles = {name: np.full((DAYS_IN_YEAR, len(PERCENTILES)), np.nan) for name in self.parameters}
+        self.samples = {name: np.zeros(DAYS_IN_YEAR, dtype=np.int64) for name in self.parameters}
+        self.rain_share = np.full(DAYS_IN_YEAR, np.nan)
+        # Entry i covers the calendar days before first_day + i
+        self.value_sums = {name: np.zeros(1) for name in self.parameters}
+        self.valid_days = {name: np.zeros(1, dtype=np.int64) for name in self.parameters}
+        self.rain_days = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def from_days(cls, dates: np.ndarray, columns: Mapping[str, np.ndarray]) -> "LocationClimate":
+        climate = cls(list(columns), dates[0])
+        climate._extend(dates, {name: clean(values) for name, values in columns.items()})
+        climate._refresh(np.arange(DAYS_IN_YEAR))
+        return climate
+
+    def _extend(self, dates: np.ndarray, columns: Dict[str, np.ndarray]):
+        days = dates.astype("datetime64[D]")
+        if len(days) and (days[0] <= self.last_day or np.any(np.diff(days) <= np.timedelta64(0, "D"))):
+            raise ValueError("Days can only be appended after the last one, in date order")
+        new_last = days[-1]
+        offsets = (days - self.first_day).astype(int)
+        span = int((new_last - self.first_day).astype(int)) + 1
+        added = span - (len(self.rain_days) - 1)
+        years = days.astype("datetime64[Y]").astype(int) + 1970 - self.first_year
+        slots = day_of_year(days)
+        for name in self.parameters:
+            values = columns.get(name, np.full(len(days), np.nan))
+            grid = self.grid[name]
+            if years[-1] >= len(grid):
+                grid = np.vstack([grid, np.full((years[-1] + 1 - len(grid), DAYS_IN_YEAR), np.nan)])
+                self.grid[name] = grid
+            grid[years, slots] = values
+            # Daily contributions over the new calendar days (0 for days without data)
+            daily = np.zeros(added)
+            valid = np.zeros(added, dtype=np.int64)
+            positions = offsets - (len(self.rain_days) - 1)
+            present = ~np.isnan(values)
+            daily[positions[present]] = values[present]
+            valid[positions[present]] = 1
+            self.value_sums[name] = np.concatenate([self.value_sums[name], self.value_sums[name][-1] + np.cumsum(daily)])
+            self.valid_days[name] = np.concatenate([self.valid_days[name], self.valid_days[name][-1] + np.cumsum(valid)])
+        rain = np.zeros(added, dtype=np.int64)
+        if PRECIPITATION in columns:
+            precipitation = columns[PRECIPITATION]
+            wet = precipitation > RAIN_THRESHOLD
+            rain[(offsets - (len(self.rain_days) - 1))[wet]] = 1
+        self.rain_days = np.concatenate([self.rain_days, self.rain_days[-1] + np.cumsum(rain)])
+        self.last_day = new_last
+        return slots
+
+    def _refresh(self, slots: np.ndarray):
+        """Recompute the day-of-year stats of ``slots`` from the grid."""
+        window = (slots[:, None] + np.arange(-SMOOTHING_DAYS, SMOOTHING_DAYS + 1)) % DAYS_IN_YEAR
+        for name in self.parameters:
+            # (slots, years * window) samples pooled around each day of year
+            pooled = self.grid[name][:, window].transpose(1, 0, 2).reshape(len(slots), -1)
+            present = ~np.isnan(pooled)
+            self.samples[name][slots] = present.sum(axis=1)
+            with warnings.catch_warnings():
+                # Days of year without any data yet stay NaN
+                warnings.simplefilter("ignore", RuntimeWarning)
+                self.mean[name][slots] = np.nanmean(pooled, axis=1)
+                self.percentiles[name][slots] = np.nanpercentile(pooled, PERCENTILES, axis=1).T
+                if name == PRECIPITATION:
+                    self.rain_share[slots] = (pooled > RAIN_THRESHOLD).sum(axis=1) / present.sum(axis=1)
+
+    def append(self, dates: np.ndarray, columns: Mapping[str, np.ndarray]):
+        """Add days after the last one; only the stats of their neighbouring days of year change."""
+        if not len(dates):
+            return
+        slots = self._extend(np.asarray(dates), {name: clean(values) for name, values in columns.items()})
+        touched = np.unique((np.unique(slots)[:, None] + np.arange(-SMOOTHING_DAYS, SMOOTHING_DAYS + 1))
+                            % DAYS_IN_YEAR)
+        self._refresh(touched)
+
+    def copy(self) -> "LocationClimate":
+        """An independent copy, appended to while requests still read this one."""
+        return LocationClimate.from_arrays(self.parameters,
+                                           {key: value.copy() for key, value in self.arrays().items()})
+
+    def _positions(self, start: np.datetime64, end: np.datetime64) -> np.ndarray:
+        start = max(np.datetime64(start, "D"), self.first_day)
+        end = min(np.datetime64(end, "D"), self.last_day)
+        return np.arange((start - self.first_day).astype(int), (end - self.first_day).astype(int) + 1)
+
+    def dates(self, start: np.datetime64, end: np.datetime64) -> np.ndarray:
+        return self.first_day + self._positions(start, end)
+
+    def values(self, name: str, days: np.ndarray) -> np.ndarray:
+        years = days.astype("datetime64[Y]").astype(int) + 1970 - self.first_year
+        return self.grid[name][years, day_of_year(days)]
+
+    def anomalies(self, name: str, start: np.datetime64, end: np.datetime64) -> dict:
+        days = self.dates(start, end)
+        slots = day_of_year(days)
+        values = self.values(name, days)
+        mean = self.mean[name][slots]
+        percentiles = self.percentiles[name][slots]
+        low, high = percentiles[:, 0], percentiles[:, -1]
+        band = np.select([values < low, values > high], [-1, 1], default=0)
+        return {
+            "value": values,
+            "normal": mean,
+            "anomaly": values - mean,
+            **{f"p{q}": percentiles[:, i] for i, q in enumerate(PERCENTILES)},
+            # -1 below the lowest percentile, 1 above the highest, 0 within the normal band
+            "band": np.where(np.isnan(values), 0, band),
+        }
+
+    def rolling(self, name: str, window: int, start: np.datetime64, end: np.datetime64) -> dict:
+        """Trailing ``window``-day total (accumulated parameters) or mean for each day."""
+        positions = self._positions(start, end) + 1
+        before = np.maximum(positions - window, 0)
+        totals = self.value_sums[name][positions] - self.value_sums[name][before]
+        counts = self.valid_days[name][positions] - self.valid_days[name][before]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = totals if name in ACCUMULATED else totals / counts
+        return {"value": np.where(counts > 0, values, np.nan), "days": counts}
+
+    def frequency(self, start: np.datetime64, end: np.datetime64, bucket: str) -> dict:
+        """Rain days, days with data and total precipitation per ``bucket`` period."""
+        days = self.dates(start, end)
+        if not len(days):
+            return {"periods": days, "rain_days": days, "days": days, "precipitation": days}
+        starts = np.unique(period_start(days, bucket))
+        edges = np.maximum(starts, days[0])
+        bounds = np.r_[(edges - self.first_day).astype(int), (days[-1] - self.first_day).astype(int) + 1]
+        sums = self.value_sums.get(PRECIPITATION)
+        valid = self.valid_days.get(PRECIPITATION)
+        return {
+            "periods": starts,
+            "rain_days": np.diff(self.rain_days[bounds]),
+            "days": np.diff(valid[bounds]) if valid is not None else np.zeros(len(starts), dtype=np.int64),
+            "precipitation": np.diff(sums[bounds]) if sums is not None else np.full(len(starts), np.nan),
+        }
+
+    def normals(self, name: str) -> dict:
+        return {
+            "mean": self.mean[name],
+            **{f"p{q}": self.percentiles[name][:, i] for i, q in enumerate(PERCENTILES)},
+            "samples": self.samples[name],
+            **({"rain_share": self.rain_share} if name == PRECIPITATION else {}),
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"first_day": np.array(self.first_day), "last_day": np.array(self.last_day),
+                  "rain_days": self.rain_days, "rain_share": self.rain_share}
+        for name in self.parameters:
+            arrays.update({f"{name}/grid": self.grid[name], f"{name}/mean": self.mean[name],
+                           f"{name}/percentiles": self.percentiles[name], f"{name}/samples": self.samples[name],
+                           f"{name}/value_sums": self.value_sums[name],
+                           f"{name}/valid_days": self.valid_days[name]})
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, parameters: Sequence[str], arrays: Mapping[str, np.ndarray]) -> "LocationClimate":
+        climate = cls(parameters, arrays["first_day"][()])
+        climate.last_day = arrays["last_day"][()]
+        climate.rain_days = arrays["rain_days"]
+        climate.rain_share = arrays["rain_share"]
+        for name in parameters:
+            climate.grid[name] = arrays[f"{name}/grid"]
+            climate.mean[name] = arrays[f"{name}/mean"]
+            climate.percentiles[name] = arrays[f"{name}/percentiles"]
+            climate.samples[name] = arrays[f"{name}/samples"]
+            climate.value_sums[name] = arrays[f"{name}/value_sums"]
+            climate.valid_days[name] = arrays[f"{name}/valid_days"]
+        return climate
+
+
+class ClimatologyIndex:
+    def __init__(self, locations: Dict[str, LocationClimate]):
+        self.locations = locations
+
+    @classmethod
+    def from_frame(cls, df, date_column: str = "date", location_column: str = "location",
+                   parameters: Iterable[str] = CLIMATE_PARAMETERS,
+                   previous: Optional["ClimatologyIndex"] = None) -> "ClimatologyIndex":
+        """Index over a frame sorted by (location, date), e.g. ``DateIndexedFrame.frame``.
+
+        With ``previous``, the index of an earlier version of the same data, a
+        location whose history still starts on the same day and has the same
+        parameters only gets its days after the last indexed one appended to a
+        copy of its entry; the days already indexed are taken as unchanged.
+        Other locations are built from scratch. ``previous`` itself is left
+        as it was, so it can keep serving until the new index replaces it.
+        """
+        parameters = [name for name in parameters if name in df.columns]
+        decimals = df.attrs.get("decimals", {})
+        columns = {}
+        for name in parameters:
+            values = df[name].to_numpy(dtype=np.float64)
+            # float32 store columns back at their source precision
+            columns[name] = values.round(decimals[name]) if name in decimals else values
+        dates = df[date_column].to_numpy(dtype="datetime64[D]")
+        if location_column in df.columns:
+            locations = df[location_column].to_numpy()
+            # Sorted, so each location's rows start where the value changes
+            starts = np.flatnonzero(np.r_[True, locations[1:] != locations[:-1]]) if len(df) else []
+        else:
+            locations = np.full(len(df), DEFAULT_LOCATION, dtype=object)
+            starts = [0] if len(df) else []
+        stops = list(starts[1:]) + [len(df)]
+        index = {}
+        for start, stop in zip(starts, stops):
+            location = str(locations[start])
+            climate = previous.locations.get(location) if previous is not None else None
+            if (climate is not None and climate.first_day == dates[start]
+                    and list(climate.parameters) == parameters):
+                new = start + int(np.searchsorted(dates[start:stop], climate.last_day, side="right"))
+                if new < stop:
+                    climate = climate.copy()
+                    climate.append(dates[new:stop], {name: values[new:stop] for name, values in columns.items()})
+            else:
+                climate = LocationClimate.from_days(
+                    dates[start:stop], {name: values[start:stop] for name, values in columns.items()})
+            index[location] = climate
+        return cls(index)
+
+    def get(self, location: Optional[str]) -> Optional[LocationClimate]:
+        return self.locations.get(location or DEFAULT_LOCATION)
+
+    def append(self, location: Optional[str], dates: np.ndarray, columns: Mapping[str, np.ndarray]):
+        location = location or DEFAULT_LOCATION
+        climate = self.locations.get(location)
+        if climate is None:
+            self.locations[location] = LocationClimate.from_days(np.asarray(dates), columns)
+        else:
+            climate.append(dates, columns)
+
+    def save(self, path: str):
+        arrays = {"meta": np.array(json.dumps({
+            "locations": list(self.locations),
+            "parameters": {name: climate.parameters for name, climate in self.locations.items()},
+        }))}
+        for i, climate in enumerate(self.locations.values()):
+            arrays.update({f"{i}/{key}": value for key, value in climate.arrays().items()})
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ClimatologyIndex":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            locations = {}
+            for i, name in enumerate(meta["locations"]):
+                prefix = f"{i}/"
+                arrays = {key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)}
+                locations[name] = LocationClimate.from_arrays(meta["parameters"][name], arrays)
+        return cls(locations)
+
+
+def labels(days: np.ndarray) -> List[str]:
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
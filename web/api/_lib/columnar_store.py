@@ -0,0 +1,214 @@
+"""Columnar, memory-mapped store for the daily NASA POWER frame.
+
+``ingest_csv`` converts a CSV into one ``.npy`` file per column plus a
+``manifest.json``: dates as ``datetime64[ns]``, numeric columns as float32
+wherever that round-trips at the column's decimal precision, rows sorted by
+(location, date). ``load_store`` maps the columns read-only, so a cold start
+skips the text parse entirely and workers on the same host share the pages.
+The day-of-year climatology of the frame (see ``climatology``) is built at
+ingest time too and saved next to the columns.
+
+    python -m api._lib.columnar_store nasa_power_data_with_date.csv api/nasa_power_store
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST = "manifest.json"
+CLIMATOLOGY = "climatology.npz"
+STORE_VERSION = 1
+MAX_DECIMALS = 6
+
+
+def column_decimals(values: np.ndarray) -> Optional[int]:
+    """Smallest number of decimals that represents every value exactly, if any."""
+    finite = values[np.isfinite(values)]
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.allclose(np.round(finite, decimals), finite, rtol=0, atol=1e-9):
+            return decimals
+    return None
+
+
+def narrow_float(values: np.ndarray):
+    """``(array, decimals)``, using float32 when it round-trips at ``decimals``."""
+    decimals = column_decimals(values)
+    if decimals is None:
+        return values, None
+    with np.errstate(over="ignore"):
+        narrowed = values.astype(np.float32)
+    restored = np.round(narrowed.astype(np.float64), decimals)
+    if np.array_equal(restored, np.round(values, decimals), equal_nan=True):
+        return narrowed, decimals
+    return values, decimals
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_source_csv(csv_path: str, date_column: str = "date") -> pd.DataFrame:
+    """The CSV with its date column named ``date_column`` and parsed."""
+    df = pd.read_csv(csv_path)
+    # The raw exports name the column "Date"
+    if date_column not in df.columns and date_column.capitalize() in df.columns:
+        df = df.rename(columns={date_column.capitalize(): date_column})
+    df[date_column] = pd.to_datetime(df[date_column])
+    return df
+
+
+def ingest_csv(csv_path: str, store_dir: str, date_column: str = "date",
+               location_column: str = "location") -> dict:
+    df = read_source_csv(csv_path, date_column)
+    sort_by = [location_column, date_column] if location_column in df.columns else [date_column]
+    df = df.sort_values(sort_by, kind="mergesort").reset_index(drop=True)
+
+    parent = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".store-")
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        decimals = None
+        if name == date_column:
+            values = series.to_numpy(dtype="datetime64[ns]")
+        elif pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+            values, decimals = narrow_float(series.to_numpy(dtype=np.float64))
+        else:
+            values = series.astype(str).to_numpy(dtype=str)
+        file_name = f"{i:03d}.npy"
+        np.save(os.path.join(staging, file_name), values)
+        columns.append({"name": name, "file": file_name, "dtype": str(values.dtype), "decimals": decimals})
+
+    from api._lib.climatology import ClimatologyIndex
+
+    ClimatologyIndex.from_frame(df, date_column, location_column).save(os.path.join(staging, CLIMATOLOGY))
+
+    manifest = {
+        "version": STORE_VERSION,
+        "rows": len(df),
+        "columns": columns,
+        "climatology": CLIMATOLOGY,
+        "source": {"size": os.path.getsize(csv_path), "mtime_ns": os.stat(csv_path).st_mtime_ns,
+                   "sha1": file_digest(csv_path)},
+    }
+    write_manifest(staging, manifest)
+    # Swap the finished store in, so readers never see a half-written one
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.replace(staging, store_dir)
+    return manifest
+
+
+def write_manifest(store_dir: str, manifest: dict):
+    staging = os.path.join(store_dir, f".{MANIFEST}.tmp")
+    with open(staging, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, os.path.join(store_dir, MANIFEST))
+
+
+def read_manifest(store_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(store_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if manifest.get("version") == STORE_VERSION else None
+
+
+def load_store(store_dir: str, manifest: Optional[dict] = None) -> pd.DataFrame:
+    """Frame backed by read-only memory maps of the stored columns.
+
+    ``df.attrs["decimals"]`` records each narrowed column's precision so
+    serializers can round float32 values back to what the source held, and
+    ``df.attrs["climatology"]`` the path of the climatology saved at ingest.
+    """
+    manifest = manifest or read_manifest(store_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No columnar store in {store_dir}")
+    data = {
+        column["name"]: np.load(os.path.join(store_dir, column["file"]), mmap_mode="r")
+        for column in manifest["columns"]
+    }
+    # copy=False keeps one block per column, each still backed by its map
+    df = pd.DataFrame(data, copy=False)
+    df.attrs["decimals"] = {
+        column["name"]: column["decimals"] for column in manifest["columns"]
+        if column["decimals"] is not None and column["dtype"] == "float32"
+    }
+    if manifest.get("climatology"):
+        df.attrs["climatology"] = os.path.join(store_dir, manifest["climatology"])
+    return df
+
+
+def store_matches(store_dir: str, manifest: dict, csv_path: str) -> bool:
+    """Whether the store was built from the CSV now at ``csv_path``.
+
+    A different size settles it without reading the file. With the same size
+    and modification time as recorded, the file is taken as unchanged; otherwise
+    (deploys reset mtimes) its contents are hashed once, and on a match the new
+    mtime is recorded so later cold starts skip the hash.
+    """
+    source = manifest["source"]
+    stat = os.stat(csv_path)
+    if source["size"] != stat.st_size:
+        return False
+    if source.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if source["sha1"] != file_digest(csv_path):
+        return False
+    source["mtime_ns"] = stat.st_mtime_ns
+    try:
+        write_manifest(store_dir, manifest)
+    except OSError:
+        # Read-only deploys hash on every cold start, which is still far cheaper than parsing
+        pass
+    return True
+
+
+def load_frame(csv_path: str, store_dir: Optional[str]) -> pd.DataFrame:
+    """The daily frame from ``store_dir`` if it was ingested from ``csv_path``
+    (or the CSV is not deployed), otherwise parsed from the CSV.
+
+    ``df.attrs["version"]`` is the SHA-1 of the source CSV, identifying the
+    data for caches built on top of it.
+    """
+    manifest = read_manifest(store_dir) if store_dir else None
+    if manifest is not None:
+        if not os.path.exists(csv_path) or store_matches(store_dir, manifest, csv_path):
+            df = load_store(store_dir, manifest)
+            df.attrs["version"] = manifest["source"]["sha1"]
+            return df
+        logger.warning("Columnar store %s was not built from %s, parsing the CSV", store_dir, csv_path)
+    df = read_source_csv(csv_path)
+    df.attrs["version"] = file_digest(csv_path)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a NASA POWER CSV into a columnar store")
+    parser.add_argument("csv_path")
+    parser.add_argument("store_dir")
+    args = parser.parse_args()
+    manifest = ingest_csv(args.csv_path, args.store_dir)
+    narrowed = [c["name"] for c in manifest["columns"] if c["dtype"] == "float32"]
+    print(f"Wrote {manifest['rows']} rows to {args.store_dir} ({len(narrowed)} float32 columns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Chunked ingest of uploaded NASA POWER histories.
+
+A CSV is read ``chunk_rows`` rows at a time, so memory stays bounded however
+long the upload is. Which columns are weather parameters comes from
+``nasa_power_metadata.txt`` (plus the current POWER names of renamed
+parameters). Parameters and any other numeric columns are kept as float32,
+and text columns (e.g. a station name) as categories. Each chunk is
+validated: rows whose date does not parse are dropped, non-numeric values
+and POWER fill values become NaN, and every problem is counted.
+
+Only summaries are kept from the chunks, all folded in incrementally:
+- per-column statistics;
+- monthly means for plotting;
+- a uniform random sample of rows for previews;
+- the most recent ``training_rows`` rows, to train on and predict from.
+"""
+import os
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from api._lib.nasa_cache import FILL_VALUE
+
+
+DEFAULT_METADATA_PATH = os.getenv(
+    "NASA_POWER_METADATA",
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "nasa_power_metadata.txt"))
+DATE_COLUMNS = ("Date", "date", "DATE")
+CHUNK_ROWS = 100_000
+SAMPLE_ROWS = 1000
+TRAINING_ROWS = 100_000
+MAX_ISSUES = 20
+# Parameters the metadata lists under their older POWER names
+RENAMED_PARAMETERS = {"PRECTOT": "PRECTOTCORR", "TMAX": "T2M_MAX", "TMIN": "T2M_MIN"}
+
+
+class IngestError(ValueError):
+    pass
+
+
+def load_metadata(path: str = DEFAULT_METADATA_PATH) -> Dict[str, str]:
+    """Parameter name -> description from the ``NAME: description`` lines of the metadata file."""
+    descriptions = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                name, _, description = line.strip().partition(":")
+                # Parameter lines only: an upper-case name without spaces (not the numbered prose)
+                if description and name.replace("_", "").isalnum() and name.isupper():
+                    descriptions[name] = description.strip()
+    except FileNotFoundError:
+        return {}
+    for old, new in RENAMED_PARAMETERS.items():
+        if old in descriptions:
+            descriptions.setdefault(new, descriptions[old])
+    return descriptions
+
+
+class IngestResult(NamedTuple):
+    rows: int
+    dropped_rows: int
+    first_date: Optional[pd.Timestamp]
+    last_date: Optional[pd.Timestamp]
+    summary: pd.DataFrame   # per numeric column: description, count, missing, min, mean, max, std
+    monthly: pd.DataFrame   # "Date" (month start) plus the monthly mean of each numeric column
+    sample: pd.DataFrame    # up to SAMPLE_ROWS rows drawn uniformly, in date order
+    training: pd.DataFrame  # the last TRAINING_ROWS rows, in file order
+    issues: List[str]
+
+
+class _Accumulator:
+    def __init__(self, sample_rows: int, training_rows: int, seed: int):
+        self.sample_rows = sample_rows
+        self.training_rows = training_rows
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.dropped = 0
+        self.first = self.last = None
+        self.stats: Dict[str, np.ndarray] = {}  # column -> [count, missing, min, max, sum, sum of squares]
+        self.monthly: List[pd.DataFrame] = []
+        self.sample: Optional[pd.DataFrame] = None
+        self.training: Optional[pd.DataFrame] = None
+
+    def add(self, chunk: pd.DataFrame, numeric: List[str]):
+        self.rows += len(chunk)
+        if not len(chunk):
+            return
+        dates = chunk["Date"]
+        self.first = dates.min() if self.first is None else min(self.first, dates.min())
+        self.last = dates.max() if self.last is None else max(self.last, dates.max())
+
+        for name in numeric:
+            values = chunk[name].to_numpy(dtype=np.float64)
+            finite = values[~np.isnan(values)]
+            stats = np.array([len(finite), len(values) - len(finite),
+                              finite.min() if len(finite) else np.inf, finite.max() if len(finite) else -np.inf,
+                              finite.sum(), np.square(finite).sum()])
+            previous = self.stats.get(name)
+            if previous is None:
+                self.stats[name] = stats
+            else:
+                previous[[0, 1, 4, 5]] += stats[[0, 1, 4, 5]]
+                previous[2] = min(previous[2], stats[2])
+                previous[3] = max(previous[3], stats[3])
+
+        # Sums and counts per month; combined into means once every chunk is in
+        month = dates.dt.to_period("M").dt.start_time.rename("Date")
+        values = chunk[numeric].astype(np.float64)
+        self.monthly.append(pd.concat({"sum": values.groupby(month).sum(),
+                                       "count": values.groupby(month).count()}, axis=1))
+
+        # Bottom-k of random keys over every row seen is a uniform sample
+        keyed = chunk.assign(_key=self.rng.random(len(chunk)))
+        keyed = keyed if self.sample is None else pd.concat([self.sample, keyed], ignore_index=True)
+        self.sample = keyed.nsmallest(self.sample_rows, "_key")
+
+        recent = chunk if self.training is None else pd.concat([self.training, chunk], ignore_index=True)
+        self.training = recent.iloc[-self.training_rows:]
+
+    def result(self, numeric: List[str], metadata: Dict[str, str], issues: List[str]) -> IngestResult:
+        summary = pd.DataFrame(
+            [{"column": name, "description": metadata.get(name, ""), "count": int(s[0]), "missing": int(s[1]),
+              "min": s[2] if s[0] else np.nan, "mean": s[4] / s[0] if s[0] else np.nan,
+              "max": s[3] if s[0] else np.nan,
+              "std": np.sqrt(max(s[5] / s[0] - (s[4] / s[0]) ** 2, 0)) if s[0] else np.nan}
+             for name, s in self.stats.items()],
+            columns=["column", "description", "count", "missing", "min", "mean", "max", "std"])
+        if self.monthly:
+            combined = pd.concat(self.monthly).groupby(level=0).sum()
+            monthly = (combined["sum"] / combined["count"].where(combined["count"] > 0)).reset_index()
+        else:
+            monthly = pd.DataFrame(columns=["Date"] + numeric)
+        empty = pd.DataFrame(columns=["Date"] + numeric)
+        sample = empty if self.sample is None else (
+            self.sample.drop(columns="_key").sort_values("Date", kind="stable").reset_index(drop=True))
+        training = empty if self.training is None else self.training.reset_index(drop=True)
+        return IngestResult(self.rows, self.dropped, self.first, self.last, summary.round(3),
+                            monthly, sample, training, issues)
+
+
+def ingest_csv(source: Union[str, BinaryIO], metadata: Optional[Dict[str, str]] = None,
+               chunk_rows: int = CHUNK_ROWS, sample_rows: int = SAMPLE_ROWS,
+               training_rows: int = TRAINING_ROWS, seed: int = 0) -> IngestResult:
+    """Read a daily history CSV (a path or a file object) chunk by chunk into summaries.
+
+    Raises ``IngestError`` when the file has no date column or cannot be parsed at all.
+    """
+    metadata = load_metadata() if metadata is None else metadata
+    issues: List[str] = []
+
+    def issue(message: str):
+        if len(issues) < MAX_ISSUES:
+            issues.append(message)
+
+    try:
+        reader = pd.read_csv(source, chunksize=chunk_rows, na_values=[FILL_VALUE, str(FILL_VALUE)])
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise IngestError(f"Could not read the CSV: {e}")
+
+    accumulator = _Accumulator(sample_rows, training_rows, seed)
+    numeric: Optional[List[str]] = None
+    categorical: List[str] = []
+    offset = 0
+    try:
+        for chunk in reader:
+            if numeric is None:
+                date_column = next((name for name in DATE_COLUMNS if name in chunk.columns), None)
+                if date_column is None:
+                    raise IngestError(f"No date column; expected one of {list(DATE_COLUMNS)}")
+                # Documented parameters are numeric whatever the first rows hold; other
+                # columns are numeric if pandas parsed them as numbers
+                numeric = [name for name in chunk.columns if name != date_column and (
+                    name in metadata or pd.api.types.is_numeric_dtype(chunk[name]))]
+                categorical = [name for name in chunk.columns if name != date_column and name not in numeric]
+            chunk = chunk.rename(columns={date_column: "Date"})
+
+            dates = pd.to_datetime(chunk["Date"], errors="coerce")
+            invalid = dates.isna()
+            if invalid.any():
+                first_bad = offset + int(np.flatnonzero(invalid.to_numpy())[0]) + 2  # 1-based, after the header
+                issue(f"Dropped {int(invalid.sum())} rows with an invalid date (first at line {first_bad})")
+                accumulator.dropped += int(invalid.sum())
+            offset += len(chunk)
+            chunk = chunk.assign(Date=dates)[~invalid]
+
+            columns = {}
+            for name in numeric:
+                values = chunk[name]
+                if not pd.api.types.is_numeric_dtype(values):
+                    coerced = pd.to_numeric(values, errors="coerce")
+                    bad = int((coerced.isna() & values.notna()).sum())
+                    if bad:
+                        issue(f"{name}: {bad} non-numeric values treated as missing")
+                    values = coerced
+                columns[name] = values.astype(np.float32)
+            for name in categorical:
+                columns[name] = chunk[name].astype("category")
+            chunk = pd.DataFrame({"Date": chunk["Date"], **columns})
+            accumulator.add(chunk, numeric)
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise IngestError(f"Could not read the CSV after {offset} rows: {e}")
+    if numeric is None:
+        raise IngestError("The CSV has no rows")
+    return accumulator.result(numeric, metadata, issues)
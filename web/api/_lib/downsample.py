@@ -0,0 +1,142 @@
+"""Bounded-size chart series for long date ranges.
+
+A chart cannot draw more distinct points than it has pixels, so long ranges
+are reduced on the server, in one of two ways:
+
+* calendar buckets (``day``, ``week``, ``month``, ``year``): each series is
+  aggregated per period as in ``BUCKET_SERIES`` (temperature min/max/mean,
+  precipitation total and rain days, ...). Buckets start on calendar
+  boundaries, so a given week or month has the same value whatever range it
+  was requested in;
+* ``lttb`` (largest triangle three buckets): for line charts, each series keeps
+  the ``max_points`` days that best preserve its visual shape, peaks included.
+
+With only ``max_points``, the finest calendar bucket that fits is used, and
+LTTB when even years do not fit.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from api._lib.chart_data import CHART_SERIES
+from api._lib.frame_index import PERIOD_UNITS, period_start
+
+
+RESOLUTIONS = tuple(PERIOD_UNITS) + ("lttb",)
+DEFAULT_MAX_POINTS = 500
+# Aggregated values are sent at this precision
+AGGREGATE_DECIMALS = 3
+RAIN_THRESHOLD = 0.0
+
+# Response series -> field name -> (source column, aggregation per bucket)
+BUCKET_SERIES: Dict[str, Dict[str, Tuple[str, str]]] = {
+    "temperature": {"min": ("T2M_MIN", "min"), "max": ("T2M_MAX", "max"), "avg": ("T2M", "mean")},
+    "precipitation": {"value": ("PRECTOTCORR", "sum"), "rainDays": ("PRECTOTCORR", "rain_days"),
+                      "days": ("PRECTOTCORR", "count")},
+    "windSpeed": {"value": ("WS2M", "mean")},
+    "solarRadiation": {"value": ("ALLSKY_SFC_SW_DWN", "mean")},
+}
+# Field whose shape LTTB preserves for each series; the other fields follow its days
+LTTB_FIELDS = {"temperature": "avg", "precipitation": "value", "windSpeed": "value", "solarRadiation": "value"}
+
+
+def float_column(df, column: str) -> np.ndarray:
+    """``column`` as float64, float32 store columns rounded back to their source precision."""
+    values = df[column].to_numpy(dtype=np.float64)
+    decimals = df.attrs.get("decimals", {}).get(column)
+    return values.round(decimals) if decimals is not None else values
+
+
+def choose_resolution(days: np.ndarray, resolution: Optional[str], max_points: Optional[int]) -> str:
+    """The resolution to serve; ``ValueError`` when an explicit one exceeds ``max_points``."""
+    if resolution in PERIOD_UNITS:
+        if max_points is not None:
+            buckets = len(np.unique(period_start(days, resolution)))
+            if buckets > max_points:
+                raise ValueError(f"{buckets} {resolution} buckets exceed max_points={max_points}; "
+                                 f"use a coarser resolution")
+        return resolution
+    if resolution == "lttb" or max_points is None:
+        return "lttb"
+    for period in PERIOD_UNITS:
+        if len(np.unique(period_start(days, period))) <= max_points:
+            return period
+    return "lttb"
+
+
+def aggregate(values: np.ndarray, edges: np.ndarray, how: str) -> np.ndarray:
+    present = ~np.isnan(values)
+    counts = np.add.reduceat(present, edges)
+    if how == "count":
+        return counts
+    if how == "rain_days":
+        return np.add.reduceat(values > RAIN_THRESHOLD, edges)
+    if how == "min":
+        result = np.fmin.reduceat(values, edges)
+    elif how == "max":
+        result = np.fmax.reduceat(values, edges)
+    else:
+        result = np.add.reduceat(np.where(present, values, 0.0), edges)
+        if how == "mean":
+            result = result / np.maximum(counts, 1)
+    # Buckets without any data are sent as null, not 0
+    return np.where(counts > 0, result, np.nan)
+
+
+def bucket_series(df, period: str) -> Tuple[np.ndarray, Dict[str, Dict[str, np.ndarray]]]:
+    """Period start dates and ``BUCKET_SERIES`` aggregated per ``period``; ``df`` is sorted by date."""
+    starts = period_start(df["date"].to_numpy(), period)
+    edges = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]]) if len(starts) else np.empty(0, dtype=int)
+    columns = {column: float_column(df, column)
+               for fields in BUCKET_SERIES.values() for column, _ in fields.values()}
+    if not len(edges):
+        return starts, {series: {field: np.empty(0) for field in fields} for series, fields in BUCKET_SERIES.items()}
+    return starts[edges], {
+        series: {field: aggregate(columns[column], edges, how) for field, (column, how) in fields.items()}
+        for series, fields in BUCKET_SERIES.items()
+    }
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Positions of the ``points`` (x, y) samples chosen by largest triangle three buckets.
+
+    NaN samples are never chosen; the first and last valid samples always are.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= points or points < 3:
+        return valid if len(valid) <= points else valid[np.linspace(0, len(valid) - 1, points).round().astype(int)]
+    x, y = x[valid].astype(np.float64), y[valid]
+    # Everything between the first and last sample split into points - 2 buckets
+    bounds = np.linspace(1, len(x) - 1, points - 1).astype(int)
+    chosen = np.empty(points, dtype=int)
+    chosen[0], chosen[-1] = 0, len(x) - 1
+    previous = 0
+    for i in range(points - 2):
+        start, stop = bounds[i], bounds[i + 1]
+        # The third corner is the average of the next bucket (the last sample for the last bucket)
+        following = slice(stop, bounds[i + 2]) if i + 2 < len(bounds) else slice(len(x) - 1, len(x))
+        next_x, next_y = x[following].mean(), y[following].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        chosen[i + 1] = previous
+    return valid[chosen]
+
+
+def lttb_series(df, max_points: int) -> Dict[str, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """Per series, its own chosen dates and the values of its fields on those days."""
+    dates = df["date"].to_numpy(dtype="datetime64[D]")
+    x = dates.astype(np.int64)
+    result = {}
+    for series, fields in CHART_SERIES.items():
+        keep = lttb_indices(x, float_column(df, fields[LTTB_FIELDS[series]]), max_points)
+        result[series] = (dates[keep], {field: float_column(df, column)[keep] for field, column in fields.items()})
+    return result
+
+
+def json_values(values: np.ndarray, decimals: int = AGGREGATE_DECIMALS) -> list:
+    """Counts as ints, other values rounded, with NaN as None."""
+    if values.dtype.kind in "iu":
+        return values.tolist()
+    values = np.round(values, decimals)
+    return [None if value != value else value for value in values.tolist()]
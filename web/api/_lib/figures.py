@@ -0,0 +1,91 @@
+"""Rendering of daily histories into chart images.
+
+``history_png`` draws the temperature and precipitation panels on its own
+``matplotlib.figure.Figure``, so no pyplot global state is touched and
+concurrent renders do not contend. Series are first reduced with the
+calendar buckets of ``downsample`` (the finest of day, week, month and year
+with at most ``max_points`` buckets), so a multi-year range draws a few
+hundred points rather than every day. The result is PNG bytes, which callers
+cache under ``frame_digest`` and the plotted range.
+"""
+import hashlib
+import io
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from api._lib.csv_ingest import RENAMED_PARAMETERS
+from api._lib.downsample import BUCKET_SERIES, DEFAULT_MAX_POINTS, bucket_series, choose_resolution
+
+
+# Approximate length of each bucket, for bar widths
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+FIGURE_SIZE = (12, 8)
+DPI = 100
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """SHA-1 of the column names and values of ``df``, identifying it in render caches."""
+    digest = hashlib.sha1("\0".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def chart_frame(df: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    """The ``downsample`` columns of ``df`` between ``start`` and ``end``, sorted by ``date``.
+
+    Accepts a ``Date`` or ``date`` column and the older POWER parameter names;
+    parameters the frame lacks are all NaN.
+    """
+    df = df.rename(columns={"Date": "date", **RENAMED_PARAMETERS})
+    dates = pd.to_datetime(df["date"])
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= (dates >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        keep &= (dates <= pd.Timestamp(end)).to_numpy()
+    columns = {column for fields in BUCKET_SERIES.values() for column, _ in fields.values()}
+    frame = pd.DataFrame({"date": dates[keep].to_numpy()})
+    for column in columns:
+        frame[column] = df[column].to_numpy(dtype=np.float64)[keep] if column in df.columns else np.nan
+    return frame.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def history_png(df: pd.DataFrame, start=None, end=None, max_points: int = DEFAULT_MAX_POINTS,
+                dpi: int = DPI) -> bytes:
+    """Temperatures and precipitation of ``df`` between ``start`` and ``end`` as a PNG."""
+    frame = chart_frame(df, start, end)
+    days = frame["date"].to_numpy()
+    resolution = choose_resolution(days, None, max_points)
+    if resolution == "lttb":
+        # Bars need buckets; years fit any range a farm history can have
+        resolution = "year"
+    starts, series = bucket_series(frame, resolution)
+    x = starts.astype("datetime64[ns]")
+    per = "" if resolution == "day" else f" per {resolution}"
+
+    figure = Figure(figsize=FIGURE_SIZE, dpi=dpi)
+    temperature = figure.add_subplot(2, 1, 1)
+    for field, label, color in (("avg", "Temperature (°C)", "blue"), ("max", "Max Temperature (°C)", "red"),
+                                ("min", "Min Temperature (°C)", "green")):
+        values = series["temperature"][field]
+        if not np.isnan(values).all():
+            temperature.plot(x, values, label=label, color=color)
+    temperature.set_title(f"Temperatures (°C){per}")
+    if temperature.lines:
+        temperature.legend()
+
+    precipitation = series["precipitation"]["value"]
+    if not np.isnan(precipitation).all():
+        bars = figure.add_subplot(2, 1, 2, sharex=temperature)
+        bars.bar(x, precipitation, width=0.8 * BUCKET_DAYS[resolution], align="edge",
+                 label="Precipitation (mm)", color="orange", alpha=0.5)
+        bars.set_title(f"Precipitation (mm{per})")
+        bars.legend()
+
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
@@ -0,0 +1,148 @@
+"""Array-backed copies of fitted models for fast, sklearn-free prediction.
+
+``export_model`` turns a fitted ``RandomForestClassifier`` into a
+``FlatForest``: every tree's split nodes concatenated into flat arrays
+(feature, threshold, children) and its leaves into one class probability
+table, with one root index per tree. Prediction steps every (row, tree) pair of a batch down one level per
+NumPy call, dropping pairs as they reach a leaf, so one row costs a few dozen
+small array operations and thousands of rows (days, farms) the same number of
+calls. The linear online model exports
+to a ``FlatLinear`` the same way.
+
+Both only need NumPy, pickle compactly, and predict exactly what the model
+they were exported from predicts.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+
+# Rows predicted per step, bounding the (rows x trees) index arrays
+BATCH_ROWS = 4096
+
+
+class FlatForest(NamedTuple):
+    classes: np.ndarray
+    roots: np.ndarray         # root of each tree, encoded like ``children``
+    feature: np.ndarray       # split feature of each internal node
+    threshold: np.ndarray     # go left when the float32 value <= threshold
+    missing_left: np.ndarray  # where NaN goes, as decided at fit time
+    children: np.ndarray      # node i's left child at 2 * i, right at 2 * i + 1; leaf j is ~j
+    proba: np.ndarray         # (leaves, classes) class probabilities
+
+    @property
+    def nbytes(self) -> int:
+        return sum(value.nbytes for value in self if isinstance(value, np.ndarray))
+
+    def _leaves(self, values: np.ndarray) -> np.ndarray:
+        # Only the (row, tree) pairs not yet at a leaf move down a level
+        rows, n_features = values.shape
+        n_trees = len(self.roots)
+        has_nan = np.isnan(values).any()
+        values = values.ravel()
+        leaves = np.tile(self.roots, rows)
+        position = np.flatnonzero(leaves >= 0)
+        node = leaves[position]
+        offset = position // n_trees * n_features
+        while len(node):
+            x = values[offset + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            if has_nan:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            node = self.children[2 * node + go_right]
+            done = node < 0
+            if done.any():
+                leaves[position[done]] = node[done]
+                moving = ~done
+                node, offset, position = node[moving], offset[moving], position[moving]
+        return (~leaves).reshape(rows, n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        # Trees split on float32 values, as sklearn casts its input
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        out = np.empty((len(X), len(self.classes)))
+        for start in range(0, len(X), BATCH_ROWS):
+            batch = X[start:start + BATCH_ROWS]
+            out[start:start + BATCH_ROWS] = self.proba[self._leaves(batch)].sum(axis=1) / len(self.roots)
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class FlatLinear(NamedTuple):
+    classes: np.ndarray
+    mean: np.ndarray
+    scale: np.ndarray
+    coef: np.ndarray
+    intercept: float
+
+    @property
+    def nbytes(self) -> int:
+        return sum(value.nbytes for value in self if isinstance(value, np.ndarray))
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        return ((X - self.mean) / self.scale) @ self.coef + self.intercept
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes[(self.decision_function(X) > 0).astype(int)]
+
+
+def float32_threshold(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each threshold, so ``x <= t`` is unchanged for float32 ``x``."""
+    narrowed = threshold.astype(np.float32)
+    above = narrowed.astype(np.float64) > threshold
+    narrowed[above] = np.nextafter(narrowed[above], np.float32(-np.inf))
+    return narrowed
+
+
+def export_forest(forest) -> FlatForest:
+    roots, features, thresholds, missing, children, probas = [], [], [], [], [], []
+    nodes = leaves = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        # Internal nodes and leaves are numbered separately, leaves stored as ~index
+        index = np.where(leaf, ~(leaves + np.cumsum(leaf) - 1), nodes + np.cumsum(~leaf) - 1)
+        internal = ~leaf
+        roots.append(index[0])
+        features.append(tree.feature[internal])
+        thresholds.append(tree.threshold[internal])
+        # Older scikit-learn has no missing value support; NaN then fails every <= test
+        missing.append(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count))[internal].astype(bool))
+        children.append(np.stack([index[tree.children_left[internal]],
+                                  index[tree.children_right[internal]]], axis=1).ravel())
+        proba = tree.value[leaf, 0, :len(forest.classes_)].astype(np.float64)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        probas.append(proba / normalizer)
+        nodes += int(internal.sum())
+        leaves += int(leaf.sum())
+    index_type = np.int32 if max(nodes, leaves) < 2 ** 30 else np.int64
+    return FlatForest(
+        classes=np.asarray(forest.classes_),
+        roots=np.asarray(roots, dtype=index_type),
+        feature=np.concatenate(features).astype(np.int32),
+        threshold=float32_threshold(np.concatenate(thresholds)),
+        missing_left=np.concatenate(missing),
+        children=np.concatenate(children).astype(index_type),
+        proba=np.concatenate(probas),
+    )
+
+
+def export_linear(model) -> FlatLinear:
+    return FlatLinear(
+        classes=np.asarray(model.classes_),
+        mean=model.scaler.mean_.copy(),
+        scale=model.scaler.scale_.copy(),
+        coef=model.classifier.coef_[0].copy(),
+        intercept=float(model.classifier.intercept_[0]),
+    )
+
+
+def export_model(model):
+    """Flat copy of a fitted forest or ``OnlineLinearModel``."""
+    if hasattr(model, "estimators_"):
+        return export_forest(model)
+    return export_linear(model)
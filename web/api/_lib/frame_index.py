@@ -0,0 +1,97 @@
+"""Date-sorted index over daily frames for fast range queries.
+
+Rows are sorted once by (location, date). Each location's rows form one
+contiguous block, so a date range query is a dictionary lookup for the block
+followed by two ``searchsorted`` calls, and the result is a positional slice of
+the sorted frame rather than a boolean mask over every row.
+"""
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_LOCATION = "default"
+
+DATE_FORMATS = ("%Y%m%d", "%Y-%m-%d")
+
+PERIOD_UNITS = {"day": "D", "week": "W", "month": "M", "year": "Y"}
+
+
+def parse_date(value: str) -> np.datetime64:
+    """Parse a ``YYYYMMDD`` or ``YYYY-MM-DD`` date, raising ``ValueError`` otherwise."""
+    for date_format in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.strptime(value, date_format), "ns")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date {value!r}, expected YYYYMMDD or YYYY-MM-DD")
+
+
+def period_start(dates: np.ndarray, period: str) -> np.ndarray:
+    """First day of the calendar ``period`` ("day", "week", "month" or "year") of each date.
+
+    Weeks start on Monday.
+    """
+    days = dates.astype("datetime64[D]")
+    if period == "week":
+        # 1970-01-01 was a Thursday
+        return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    return days.astype(f"datetime64[{PERIOD_UNITS[period]}]").astype("datetime64[D]")
+
+
+def parse_date_range(start: str, end: str) -> Tuple[np.datetime64, np.datetime64]:
+    first, last = parse_date(start), parse_date(end)
+    if first > last:
+        raise ValueError(f"Start date {start} is after end date {end}")
+    return first, last
+
+
+class DateIndexedFrame:
+    def __init__(self, df: pd.DataFrame, date_column: str = "date",
+                 location_column: str = "location"):
+        # Frames from the columnar store are already sorted; only sort (and so
+        # copy) the ones that are not, to keep memory-mapped columns mapped
+        if location_column in df.columns:
+            keys = pd.MultiIndex.from_arrays([df[location_column], df[date_column]])
+            if not keys.is_monotonic_increasing:
+                df = df.sort_values([location_column, date_column], kind="mergesort").reset_index(drop=True)
+        elif not df[date_column].is_monotonic_increasing:
+            df = df.sort_values(date_column, kind="mergesort").reset_index(drop=True)
+        self.frame = df
+        # Identifies the data for caches keyed on it; frames without one never share entries
+        self.version: str = df.attrs.get("version") or uuid.uuid4().hex
+        self.date_column = date_column
+        self.location_column = location_column
+        self._dates = df[date_column].to_numpy(dtype="datetime64[ns]")
+
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        if location_column not in df.columns:
+            self._blocks[DEFAULT_LOCATION] = (0, len(df))
+        elif len(df):
+            locations = df[location_column].to_numpy()
+            # Sorted, so each location's rows start where the value changes
+            starts = np.flatnonzero(np.r_[True, locations[1:] != locations[:-1]])
+            stops = np.r_[starts[1:], len(locations)]
+            for start, stop in zip(starts, stops):
+                self._blocks[locations[start]] = (int(start), int(stop))
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def locations(self) -> List[str]:
+        return list(self._blocks)
+
+    def slice(self, start: np.datetime64, end: np.datetime64,
+              location: Optional[str] = None) -> pd.DataFrame:
+        """Rows of ``location`` dated between ``start`` and ``end`` inclusive."""
+        block = self._blocks.get(location or DEFAULT_LOCATION)
+        if block is None:
+            return self.frame.iloc[0:0]
+        block_start, block_stop = block
+        dates = self._dates[block_start:block_stop]
+        lo = block_start + int(np.searchsorted(dates, start, side="left"))
+        hi = block_start + int(np.searchsorted(dates, end, side="right"))
+        return self.frame.iloc[lo:hi]
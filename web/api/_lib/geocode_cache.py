@@ -0,0 +1,283 @@
+"""Persistent cache in front of the OpenCage geocoder.
+
+Queries are normalized before lookup, entries expire after a TTL and the
+least recently used ones are evicted once the cache is full. New entries
+are written to disk at most every ``flush_seconds`` by a background timer (and
+at exit or ``close``), never on the lookup path. Concurrent lookups of the
+same place share a single upstream call, both for threaded callers
+(``lookup``) and for coroutines on the event loop (``alookup``).
+"""
+import asyncio
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from api._lib.http_client import AsyncHttpClient
+
+
+OPEN_CAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "geocode-cache.json")
+
+LatLon = Tuple[float, float]
+
+
+class GeocoderNotConfigured(Exception):
+    pass
+
+
+class GeocoderError(Exception):
+    """The geocoder answered with an error status (bad key, quota exhausted, outage...)."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Error from the geocoder: {status_code}")
+        self.status_code = status_code
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class OpenCageGeocoder:
+    def __init__(self, api_key: Optional[str], base_url: str = OPEN_CAGE_URL,
+                 session: Optional["requests.Session"] = None, timeout: float = 10,
+                 client: Optional[AsyncHttpClient] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._session = session
+        self.timeout = timeout
+        self.client = client or AsyncHttpClient(timeout=timeout)
+
+    @property
+    def session(self) -> "requests.Session":
+        # Only the synchronous path needs requests; import it on first use
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def _params(self, query: str) -> dict:
+        if self.api_key is None:
+            raise GeocoderNotConfigured("OpenCage API key is not configured")
+        return {"q": query, "key": self.api_key}
+
+    @staticmethod
+    def _parse(response) -> Optional[LatLon]:
+        # Unknown places are a 200 without results; anything else is an upstream failure
+        if not 200 <= response.status_code < 300:
+            raise GeocoderError(response.status_code)
+        data = response.json()
+        if not data.get('results'):
+            return None
+        geometry = data['results'][0]['geometry']
+        return geometry['lat'], geometry['lng']
+
+    def __call__(self, query: str) -> Optional[LatLon]:
+        response = self.session.get(self.base_url, params=self._params(query), timeout=self.timeout)
+        return self._parse(response)
+
+    async def acall(self, query: str) -> Optional[LatLon]:
+        response = await self.client.get(self.base_url, params=self._params(query))
+        return self._parse(response)
+
+
+class GeocodeCache:
+    def __init__(self, geocoder: Callable[[str], Optional[LatLon]], path: str = DEFAULT_CACHE_PATH,
+                 ttl_seconds: float = 30 * 24 * 3600, max_entries: int = 10000,
+                 max_concurrency: int = 8,
+                 async_geocoder: Optional[Callable[[str], Awaitable[Optional[LatLon]]]] = None,
+                 flush_seconds: float = 5.0):
+        self.geocoder = geocoder
+        self.async_geocoder = async_geocoder
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.flush_seconds = flush_seconds
+        self._entries: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="geocode")
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "evictions": 0}
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        now = time.time()
+        # Stored oldest first, so replaying keeps the LRU order
+        for query, (lat, lon, stored_at) in stored:
+            if now - stored_at < self.ttl_seconds:
+                self._entries[query] = (lat, lon, stored_at)
+
+    def flush(self):
+        """Write the entries to disk if any changed since the last write."""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                self._flush_timer = None
+                snapshot = [[query, list(entry)] for query, entry in self._entries.items()]
+            try:
+                self._save(snapshot)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def close(self):
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    def _save(self, snapshot: list):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def _cached(self, query: str) -> Optional[LatLon]:
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        lat, lon, stored_at = entry
+        if time.time() - stored_at >= self.ttl_seconds:
+            del self._entries[query]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(query)
+        return lat, lon
+
+    def _store(self, query: str, result: LatLon):
+        with self._lock:
+            self._entries[query] = (result[0], result[1], time.time())
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._dirty = True
+            # Entries stored within one window are written together
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _resolve(self, query: str, future: Future):
+        try:
+            result = self.geocoder(query)
+            if result is not None:
+                self._store(query, result)
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(query, None)
+
+    def _submit(self, query: str) -> Tuple[Future, bool]:
+        """Future for ``query`` and whether this caller has to run the lookup itself."""
+        with self._lock:
+            cached = self._cached(query)
+            if cached is not None:
+                self.stats["hits"] += 1
+                future = Future()
+                future.set_result(cached)
+                return future, False
+            future = self._inflight.get(query)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False
+            self.stats["misses"] += 1
+            future = Future()
+            self._inflight[query] = future
+            return future, True
+
+    def lookup(self, query: str) -> Optional[LatLon]:
+        """Latitude and longitude for ``query``, or ``None`` if the place is unknown."""
+        query = normalize_query(query)
+        future, owner = self._submit(query)
+        if owner:
+            self._resolve(query, future)
+        return future.result()
+
+    def lookup_many(self, queries: Iterable[str]) -> Dict[str, Optional[LatLon]]:
+        """Resolve a batch of places, looking up each distinct one at most once.
+
+        Exceptions raised by the geocoder are returned in place of the result.
+        """
+        queries = list(queries)
+        futures = {}
+        for query in queries:
+            normalized = normalize_query(query)
+            if normalized not in futures:
+                future, owner = self._submit(normalized)
+                if owner:
+                    self._executor.submit(self._resolve, normalized, future)
+                futures[normalized] = future
+        results = {}
+        for query in queries:
+            future = futures[normalize_query(query)]
+            exception = future.exception()
+            results[query] = exception if exception is not None else future.result()
+        return results
+
+    async def _aresolve(self, query: str) -> Optional[LatLon]:
+        if self.async_geocoder is not None:
+            result = await self.async_geocoder(query)
+        else:
+            result = await asyncio.to_thread(self.geocoder, query)
+        if result is not None:
+            self._store(query, result)
+        return result
+
+    async def alookup(self, query: str) -> Optional[LatLon]:
+        """Async ``lookup``; coroutines asking for the same place await one task."""
+        query = normalize_query(query)
+        with self._lock:
+            cached = self._cached(query)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return cached
+            task = self._ainflight.get(query)
+            if task is None:
+                self.stats["misses"] += 1
+                task = asyncio.ensure_future(self._aresolve(query))
+                self._ainflight[query] = task
+                task.add_done_callback(lambda _: self._ainflight.pop(query, None))
+            else:
+                self.stats["coalesced"] += 1
+        # Shielded so a cancelled caller does not cancel the lookup others wait on
+        return await asyncio.shield(task)
+
+    async def alookup_many(self, queries: Iterable[str]) -> Dict[str, Optional[LatLon]]:
+        """Async ``lookup_many``; places are resolved concurrently."""
+        queries = list(queries)
+        results = await asyncio.gather(*(self.alookup(query) for query in queries),
+                                       return_exceptions=True)
+        return dict(zip(queries, results))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,158 @@
+"""Daily weather histories sent to the recommendation endpoints, held as arrays.
+
+A ``History`` is a date vector plus one float64 array per parameter. It is
+built once per request from whichever body the client sent:
+
+* JSON row records (``[{"date": ..., "T2M": ...}, ...]``, the original layout);
+* JSON columns (``{"dates": [...], "columns": {"T2M": [...], ...}}``), which
+  skip per-row dicts entirely;
+* msgpack (``application/msgpack``) with the same keys, where a column may be
+  raw little-endian float64 bytes that are used without copying;
+* an Arrow IPC stream (``application/vnd.apache.arrow.stream``) with a
+  ``date`` column and numeric columns, converted without copying where Arrow
+  allows.
+
+The binary formats need the optional ``msgpack`` / ``pyarrow`` packages.
+Everything downstream (fingerprints, row ids, the training frame, the latest
+row) is computed from the arrays, and histories pickle compactly into the
+training workers.
+"""
+import hashlib
+import importlib.util
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+DATE_COLUMN = "date"
+
+
+def binary_format_available(media_type: str) -> bool:
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return importlib.util.find_spec("msgpack") is not None
+    if media_type == ARROW_MEDIA_TYPE:
+        return importlib.util.find_spec("pyarrow") is not None
+    return False
+
+
+def float_array(values) -> np.ndarray:
+    """float64 array of ``values``, None as NaN; ``ValueError`` for non-numeric values."""
+    return np.asarray(values, dtype=np.float64)
+
+
+class History(NamedTuple):
+    dates: Optional[np.ndarray]    # str (object) per day, None entries for undated rows
+    columns: Dict[str, np.ndarray]  # parameter -> float64 values
+
+    @classmethod
+    def from_columns(cls, dates: Optional[Sequence], columns: Dict[str, object]) -> "History":
+        arrays = {name: float_array(values) for name, values in columns.items()}
+        lengths = {len(values) for values in arrays.values()}
+        if dates is not None:
+            dates = np.array([None if day is None else str(day) for day in dates], dtype=object)
+            lengths.add(len(dates))
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        return cls(dates, arrays)
+
+    @classmethod
+    def from_records(cls, rows: Sequence[dict]) -> "History":
+        """From row dicts; non-numeric fields other than the date are left out."""
+        names = list(dict.fromkeys(name for row in rows for name in row))
+        columns = {}
+        for name in names:
+            if name == DATE_COLUMN:
+                continue
+            try:
+                columns[name] = float_array([row.get(name) for row in rows])
+            except (TypeError, ValueError):
+                continue
+        dates = [row.get(DATE_COLUMN) for row in rows] if DATE_COLUMN in names else None
+        return cls.from_columns(dates, columns)
+
+    @classmethod
+    def from_parameters(cls, nasa_data: Dict[str, Dict[str, float]]) -> "History":
+        """From POWER's parameter -> {date: value} mapping."""
+        days = list(next(iter(nasa_data.values()), {}))
+        return cls.from_columns(days, {parameter: [values.get(day) for day in days]
+                                       for parameter, values in nasa_data.items()})
+
+    @classmethod
+    def from_msgpack(cls, body: bytes) -> "History":
+        import msgpack
+
+        payload = msgpack.unpackb(body, raw=False)
+        if not isinstance(payload, dict) or not isinstance(payload.get("columns"), dict):
+            raise ValueError('Expected a map with "columns" (and optionally "dates")')
+        columns = {
+            # Raw float64 buffers are viewed as is; lists are converted
+            name: np.frombuffer(values, dtype="<f8") if isinstance(values, bytes) else values
+            for name, values in payload["columns"].items()
+        }
+        return cls.from_columns(payload.get("dates"), columns)
+
+    @classmethod
+    def from_arrow(cls, body: bytes) -> "History":
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(body).read_all()
+        dates, columns = None, {}
+        for name in table.column_names:
+            column = table.column(name).combine_chunks()
+            if name == DATE_COLUMN:
+                dates = column.cast(pa.string()).to_pylist()
+            elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+                # Zero-copy for float64 columns without nulls
+                columns[name] = column.to_numpy(zero_copy_only=False)
+        return cls.from_columns(dates, columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ())) if self.dates is None else len(self.dates)
+
+    def tail(self, rows: int) -> "History":
+        return History(None if self.dates is None else self.dates[-rows:],
+                       {name: values[-rows:] for name, values in self.columns.items()})
+
+    def fingerprint(self) -> str:
+        """Stable hash of the history, used to detect newly arrived data."""
+        digest = hashlib.sha1()
+        if self.dates is not None:
+            digest.update("\n".join(map(str, self.dates)).encode("utf-8"))
+        for name in sorted(self.columns):
+            digest.update(name.encode("utf-8"))
+            digest.update(np.ascontiguousarray(self.columns[name]).tobytes())
+        return digest.hexdigest()
+
+    def row_ids(self) -> List[str]:
+        """Identity of each row: its date when it has one, else a hash of its values."""
+        names = sorted(self.columns)
+        matrix = np.column_stack([self.columns[name] for name in names]) if names else np.empty((len(self), 0))
+        key = ",".join(names).encode("utf-8")
+        dates = self.dates if self.dates is not None else [None] * len(self)
+        return [day if day is not None else hashlib.sha1(key + row.tobytes()).hexdigest()
+                for day, row in zip(dates, matrix)]
+
+    def latest(self, features: Sequence[str]) -> np.ndarray:
+        """The last row's ``features``, as a one-row matrix."""
+        return np.array([[self.columns[name][-1] for name in features]], dtype=np.float64)
+
+    def frame(self):
+        """DataFrame over the arrays, with the dates as a ``date`` column when present."""
+        import pandas as pd
+
+        data = dict(self.columns)
+        if self.dates is not None:
+            data = {DATE_COLUMN: self.dates, **data}
+        return pd.DataFrame(data, copy=False)
+
+
+class HistoryRequest(NamedTuple):
+    history: History
+    location: Optional[str] = None
+    window_days: Optional[int] = None
+
+    def window(self) -> History:
+        """The history restricted to the last ``window_days`` days, if set."""
+        return self.history.tail(self.window_days) if self.window_days else self.history
@@ -0,0 +1,49 @@
+"""Shared async HTTP client for upstream calls (NASA POWER, OpenCage).
+
+One pooled ``httpx.AsyncClient`` per worker keeps connections alive between
+requests, uses HTTP/2 when the ``h2`` package is installed, and a semaphore
+bounds how many upstream requests are in flight at once. ``httpx`` itself is
+only imported when the first request is made.
+"""
+import asyncio
+import importlib.util
+from typing import Optional
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class AsyncHttpClient:
+    def __init__(self, max_connections: int = 200, max_keepalive_connections: int = 50,
+                 timeout: float = 30, connect_timeout: float = 5, max_in_flight: int = 200):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_in_flight = max_in_flight
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # Created on first use so it binds to the event loop serving requests
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_keepalive_connections)
+            timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            self._client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2_available())
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._client
+
+    async def get(self, url: str, params: Optional[dict] = None) -> "httpx.Response":
+        client = self.client
+        async with self._semaphore:
+            return await client.get(url, params=params)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
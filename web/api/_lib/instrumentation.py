@@ -0,0 +1,277 @@
+"""Metrics, stage timers, sampled request profiles and structured logging.
+
+* ``metrics`` holds Prometheus-style counters and histograms, rendered in the
+  text exposition format by ``/api/py/metrics``. Collectors add gauges that
+  are read at scrape time (e.g. cache statistics).
+* ``stage("fit")`` times a block of work. The time goes to the
+  ``api_stage_duration_seconds`` histogram and, when the current request is
+  being profiled, to its profile as well.
+* ``InstrumentationMiddleware`` counts and times every request by route
+  template. It profiles a sample of requests (``sample_rate``, or an
+  ``X-Profile: 1`` header when allowed): their stage timings are returned in
+  a ``Server-Timing`` header and logged.
+* ``configure_logging`` sets up the ``api`` loggers with a level (so debug
+  logs on the hot path cost one level check when off) and a logfmt or JSON
+  formatter. Fields passed with ``extra=`` become keys of the record.
+
+With metrics disabled and no profile active, ``stage`` does nothing but read a
+context variable.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILE_HEADER = "x-profile"
+
+# Stage timings of the request being profiled, shared with the threads it runs work in
+_profile: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_profile", default=None)
+
+
+def _label_text(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    # Full precision; "%g" would round large counters
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (not cumulative), then the sum and total count
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (f'{bound:g}',))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {count}")
+                labels = _label_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total:.6f}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: list = []
+        self._collectors: List[Tuple[str, str, Sequence[str], Callable[[], Iterable[Tuple[tuple, float]]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, documentation: str, labelnames: Sequence[str],
+                  collect: Callable[[], Iterable[Tuple[tuple, float]]]):
+        """Gauge family whose ``(label values, value)`` samples are read from ``collect`` at scrape time."""
+        self._collectors.append((name, documentation, tuple(labelnames), collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, documentation, labelnames, collect in self._collectors:
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge"])
+            for key, value in collect():
+                lines.append(f"{name}{_label_text(labelnames, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter("api_requests_total", "HTTP requests served", ("method", "route", "status"))
+REQUEST_SECONDS = metrics.histogram("api_request_duration_seconds", "Time to the response headers",
+                                    ("method", "route"))
+STAGE_SECONDS = metrics.histogram("api_stage_duration_seconds", "Time spent per processing stage", ("stage",))
+
+
+@contextmanager
+def stage(name: str):
+    profile = _profile.get()
+    if not metrics.enabled and profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if metrics.enabled:
+            STAGE_SECONDS.observe(elapsed, stage=name)
+        if profile is not None:
+            profile.append((name, elapsed))
+
+
+def server_timing(stages: Sequence[Tuple[str, float]], total: float) -> str:
+    """``Server-Timing`` header value; repeated stages are summed, in first-seen order."""
+    durations: Dict[str, float] = {}
+    for name, elapsed in stages:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    durations["total"] = total
+    return ", ".join(f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in durations.items())
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware counting and timing requests, and profiling a sample of them."""
+
+    def __init__(self, app, sample_rate: float = 0.0, header_enabled: bool = False):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.logger = logging.getLogger("api.profile")
+
+    def _sampled(self, scope) -> bool:
+        if self.header_enabled:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER.encode() and value.strip() in (b"1", b"true"):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = [] if self._sampled(scope) else None
+        if not metrics.enabled and profile is None:
+            await self.app(scope, receive, send)
+            return
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        def route() -> str:
+            # The template (e.g. /api/py/train_jobs/{job_id}), so ids do not become labels
+            matched = scope.get("route")
+            return getattr(matched, "path", "unmatched")
+
+        async def send_instrumented(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                status["code"] = message["status"]
+                if metrics.enabled:
+                    REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route())
+                if profile is not None:
+                    timing = server_timing(profile, elapsed)
+                    message = {**message, "headers": list(message.get("headers", []))
+                               + [(b"server-timing", timing.encode("latin-1"))]}
+                    self.logger.info("request profile", extra={
+                        "method": scope["method"], "route": route(), "status": message["status"],
+                        "server_timing": timing})
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_instrumented)
+        finally:
+            _profile.reset(token)
+            if metrics.enabled:
+                REQUESTS.inc(method=scope["method"], route=route(), status=status["code"])
+
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: logfmt (``key=value``) or JSON."""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+        if self.json_lines:
+            return json.dumps(fields, default=str)
+        return " ".join(f"{key}={_logfmt_value(value)}" for key, value in fields.items())
+
+
+def _logfmt_value(value) -> str:
+    text = str(value)
+    if text and not any(char in text for char in ' ="\n'):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def configure_logging(level: str = "INFO", json_lines: bool = False):
+    """Send the ``api`` loggers to stderr at ``level``."""
+    logger = logging.getLogger("api")
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_lines))
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    # Uvicorn configures the root logger; do not log twice
+    logger.propagate = False
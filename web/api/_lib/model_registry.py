@@ -0,0 +1,224 @@
+"""On-disk registry of fitted models shared by the recommendation endpoints.
+
+Models are keyed by location, feature set and training window. Each worker
+loads a model from disk at most once, keeps the most recently used ones in
+memory and, when a request brings a history that differs from the one the
+model was fitted on, updates it incrementally or refits it in the background.
+Background disk writes and refits run on separate threads, so a long refit
+never holds back persisting the models updated meanwhile.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_REGISTRY_DIR = os.path.join(tempfile.gettempdir(), "nasa-power-models")
+# Part of every file name, so models stored in an older result layout are never loaded
+FORMAT_VERSION = 2
+
+
+class ModelKey(NamedTuple):
+    location: str
+    features: Tuple[str, ...]
+    window: str
+
+    def digest(self) -> str:
+        payload = json.dumps([FORMAT_VERSION, self.location, list(self.features), self.window])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RegistryEntry(NamedTuple):
+    key: ModelKey
+    fingerprint: str
+    result: dict
+    trained_at: float
+
+
+class ModelRegistry:
+    def __init__(self, directory: str = DEFAULT_REGISTRY_DIR, max_entries: int = 256,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, RegistryEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._refreshing = set()
+        self._unwritten: Dict[str, RegistryEntry] = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-write")
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-refresh")
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "disk_loads": 0,
+            "refreshes": 0,
+            "incremental_updates": 0,
+            "evictions": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.joblib")
+
+    def _lookup(self, key: ModelKey) -> Optional[RegistryEntry]:
+        digest = key.digest()
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                self._memory.move_to_end(digest)
+                return entry
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        import joblib
+
+        try:
+            entry = joblib.load(path)
+        except Exception as e:
+            logger.warning("Discarding unreadable model %s: %s", path, e)
+            os.remove(path)
+            return None
+        with self._lock:
+            self.stats["disk_loads"] += 1
+            self._remember(digest, entry)
+        return entry
+
+    def _remember(self, digest: str, entry: RegistryEntry):
+        self._memory[digest] = entry
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def put(self, key: ModelKey, fingerprint: str, result: dict, background: bool = False) -> RegistryEntry:
+        """Store a model; with ``background`` it is only written to disk later,
+        keeping the (size dependent) dump off the request path."""
+        entry = RegistryEntry(key, fingerprint, result, time.time())
+        digest = key.digest()
+        with self._lock:
+            self._remember(digest, entry)
+            if background:
+                # Rapid successive updates of one model are written once, with the latest version
+                queued = digest in self._unwritten
+                self._unwritten[digest] = entry
+                if not queued:
+                    self._writer.submit(self._write_latest, digest)
+                return entry
+        self._write(digest, entry)
+        return entry
+
+    def _write_latest(self, digest: str):
+        with self._lock:
+            entry = self._unwritten.pop(digest, None)
+        if entry is not None:
+            self._write(digest, entry)
+
+    def _write(self, digest: str, entry: RegistryEntry):
+        import joblib
+
+        # Write to a temp file first so other workers never load a partial model
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, self._path(digest))
+        self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".joblib"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self._memory.pop(os.path.basename(path)[:-len(".joblib")], None)
+                self.stats["evictions"] += 1
+
+    def latest(self, key: ModelKey) -> Optional[RegistryEntry]:
+        """The stored model for ``key``, whatever history it was fitted on; never trains."""
+        return self._lookup(key)
+
+    def get_or_train(self, key: ModelKey, fingerprint: str, train: Callable[[], dict],
+                     update: Optional[Callable[[RegistryEntry], Optional[dict]]] = None,
+                     refit: Optional[Callable[[], dict]] = None) -> RegistryEntry:
+        """Return a fitted model for ``key``, training it only on a cold miss.
+
+        ``train`` may raise instead of fitting inline (e.g. after queueing the
+        fit); the exception reaches the caller. A model fitted on an older
+        history is brought up to date with ``update`` when given; if there is
+        no ``update`` or it returns None, the old model is returned as is while
+        ``refit`` (``train`` by default) runs in the background.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return self.put(key, fingerprint, train())
+        if entry.fingerprint == fingerprint:
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry
+        with self._lock:
+            self.stats["stale_hits"] += 1
+        if update is not None:
+            result = update(entry)
+            if result is not None:
+                with self._lock:
+                    self.stats["incremental_updates"] += 1
+                return self.put(key, fingerprint, result, background=True)
+        self.refresh(key, fingerprint, refit or train)
+        return entry
+
+    def refresh(self, key: ModelKey, fingerprint: str, train: Callable[[], dict]):
+        digest = key.digest()
+        with self._lock:
+            if digest in self._refreshing:
+                return
+            self._refreshing.add(digest)
+
+        def run():
+            try:
+                self.put(key, fingerprint, train())
+                with self._lock:
+                    self.stats["refreshes"] += 1
+            except Exception as e:
+                logger.warning("Background refresh failed for %s: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(digest)
+
+        self._refresher.submit(run)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": (lookups - self.stats["misses"]) / lookups if lookups else 0.0,
+                "entries_in_memory": len(self._memory),
+                "refreshing": len(self._refreshing),
+                "unwritten": len(self._unwritten),
+            }
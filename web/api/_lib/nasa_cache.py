@@ -0,0 +1,269 @@
+"""On-disk cache of NASA POWER daily point data.
+
+Responses are stored per POWER grid cell and parameter set as one row of
+values per day. A request is answered from the cache where possible and only
+the missing days are fetched from upstream, in as few contiguous spans as
+possible, then merged back in. ``get`` serves the synchronous callers (the
+Streamlit app) and ``aget`` the async API endpoints.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api._lib.http_client import AsyncHttpClient
+
+
+NASA_POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "nasa-power-cache")
+
+# Resolution of the MERRA-2 grid behind the POWER meteorology parameters; its points lie
+# at -90 + k * GRID_LAT_STEP and -180 + k * GRID_LON_STEP
+GRID_LAT_STEP = 0.5
+GRID_LON_STEP = 0.625
+
+# POWER marks days it has no value for yet (usually the most recent ones)
+FILL_VALUE = -999
+
+DATE_FORMAT = "%Y%m%d"
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, detail: str = ""):
+        super().__init__(detail or f"Error fetching data from NASA: {status_code}")
+        self.status_code = status_code
+
+
+def snap_to_grid(lat: float, lon: float) -> Tuple[float, float]:
+    """The POWER grid point nearest to ``(lat, lon)``; points sharing it get the same values."""
+    grid_lat = round((lat + 90) / GRID_LAT_STEP) * GRID_LAT_STEP - 90
+    grid_lon = round((lon + 180) / GRID_LON_STEP) * GRID_LON_STEP - 180
+    if grid_lon >= 180:
+        # 180 and -180 are the same meridian
+        grid_lon -= 360
+    return round(grid_lat, 4), round(grid_lon, 4)
+
+
+def date_range(start: str, end: str) -> List[str]:
+    first = datetime.strptime(start, DATE_FORMAT)
+    last = datetime.strptime(end, DATE_FORMAT)
+    return [(first + timedelta(days=i)).strftime(DATE_FORMAT)
+            for i in range((last - first).days + 1)]
+
+
+def contiguous_spans(days: Iterable[str]) -> List[Tuple[str, str]]:
+    """Group sorted ``YYYYMMDD`` days into ``(start, end)`` runs of consecutive days."""
+    spans = []
+    previous = None
+    for day in days:
+        current = datetime.strptime(day, DATE_FORMAT)
+        if previous is not None and current - previous == timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+        previous = current
+    return [tuple(span) for span in spans]
+
+
+class NasaPowerCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, base_url: str = NASA_POWER_URL,
+                 session: Optional["requests.Session"] = None, timeout: float = 60,
+                 client: Optional[AsyncHttpClient] = None):
+        self.directory = directory
+        self.base_url = base_url
+        self._session = session
+        self.timeout = timeout
+        self.client = client or AsyncHttpClient(timeout=timeout)
+        # Per cell path: the lock and how many callers hold or wait for it; dropped at zero
+        self._locks: Dict[str, list] = {}
+        self._async_locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "days_requested": 0,
+            "days_from_cache": 0,
+            "upstream_calls": 0,
+            "bytes_fetched": 0,
+            "bytes_saved": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def session(self) -> "requests.Session":
+        # Only the synchronous path needs requests; import it on first use
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def _cell_path(self, lat: float, lon: float, parameters: List[str], extra: dict) -> str:
+        key = json.dumps([lat, lon, parameters, sorted(extra.items())])
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _acquire_entry(self, locks: Dict[str, list], path: str, factory) -> list:
+        with self._locks_guard:
+            entry = locks.get(path)
+            if entry is None:
+                entry = locks[path] = [factory(), 0]
+            entry[1] += 1
+            return entry
+
+    def _release_entry(self, locks: Dict[str, list], path: str, entry: list):
+        with self._locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del locks[path]
+
+    @contextmanager
+    def _locked(self, path: str):
+        entry = self._acquire_entry(self._locks, path, threading.Lock)
+        try:
+            with entry[0]:
+                yield
+        finally:
+            self._release_entry(self._locks, path, entry)
+
+    @asynccontextmanager
+    async def _alocked(self, path: str):
+        entry = self._acquire_entry(self._async_locks, path, asyncio.Lock)
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            self._release_entry(self._async_locks, path, entry)
+
+    def _read(self, path: str) -> Dict[str, list]:
+        try:
+            with open(path) as f:
+                return json.load(f)["days"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+
+    def _write(self, path: str, parameters: List[str], days: Dict[str, list]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"parameters": parameters, "days": days}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _request_params(self, lat: float, lon: float, start: str, end: str,
+                        parameters: List[str], extra: dict) -> dict:
+        return {
+            "start": start,
+            "end": end,
+            "latitude": lat,
+            "longitude": lon,
+            "parameters": ",".join(parameters),
+            "format": "JSON",
+            **extra,
+        }
+
+    def _fetch(self, lat: float, lon: float, start: str, end: str,
+               parameters: List[str], extra: dict) -> Tuple[Dict[str, dict], int]:
+        params = self._request_params(lat, lon, start, end, parameters, extra)
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code)
+        return response.json()["properties"]["parameter"], len(response.content)
+
+    async def _afetch(self, lat: float, lon: float, start: str, end: str,
+                      parameters: List[str], extra: dict) -> Tuple[Dict[str, dict], int]:
+        params = self._request_params(lat, lon, start, end, parameters, extra)
+        response = await self.client.get(self.base_url, params=params)
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code)
+        return response.json()["properties"]["parameter"], len(response.content)
+
+    def _prepare(self, lat: float, lon: float, start: str, end: str, parameters: List[str],
+                 community: str, extra: dict):
+        extra = {"community": community, **extra}
+        lat, lon = snap_to_grid(lat, lon)
+        path = self._cell_path(lat, lon, sorted(parameters), extra)
+        return lat, lon, path, extra, date_range(start, end)
+
+    def _merge(self, path: str, parameters: List[str], days: Dict[str, list],
+               span_payloads: List[Tuple[str, str, Dict[str, dict]]]) -> Dict[str, list]:
+        fresh = {}
+        for span_start, span_end, payload in span_payloads:
+            for day in date_range(span_start, span_end):
+                fresh[day] = [payload.get(p, {}).get(day, FILL_VALUE) for p in sorted(parameters)]
+        # Days POWER has not published yet come back as fill values; serve them
+        # but do not persist them, so the next request picks up the real data
+        publishable = {day: row for day, row in fresh.items()
+                       if any(value != FILL_VALUE for value in row)}
+        if publishable:
+            days.update(publishable)
+            self._write(path, sorted(parameters), days)
+        return fresh
+
+    def _assemble(self, parameters: List[str], wanted: List[str], days: Dict[str, list],
+                  fresh: Dict[str, list], spans: list, fetched_bytes: int) -> Dict[str, Dict[str, float]]:
+        column = {p: i for i, p in enumerate(sorted(parameters))}
+        result = {p: {} for p in parameters}
+        for day in wanted:
+            row = fresh.get(day) or days[day]
+            for p in parameters:
+                result[p][day] = row[column[p]]
+
+        cached_days = len(wanted) - len(fresh)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["days_requested"] += len(wanted)
+            self.stats["days_from_cache"] += cached_days
+            self.stats["upstream_calls"] += len(spans)
+            self.stats["bytes_fetched"] += fetched_bytes
+            if cached_days:
+                cached = {p: {day: result[p][day] for day in wanted if day not in fresh}
+                          for p in parameters}
+                self.stats["bytes_saved"] += len(json.dumps(cached))
+        return result
+
+    def get(self, lat: float, lon: float, start: str, end: str, parameters: List[str],
+            community: str = "AG", **extra) -> Dict[str, Dict[str, float]]:
+        """Daily values for ``start``..``end`` (``YYYYMMDD``), shaped like POWER's
+        ``properties.parameter`` object."""
+        parameters = list(parameters)
+        lat, lon, path, extra, wanted = self._prepare(lat, lon, start, end, parameters, community, extra)
+        with self._locked(path):
+            days = self._read(path)
+            spans = contiguous_spans(day for day in wanted if day not in days)
+            span_payloads = []
+            fetched_bytes = 0
+            for span_start, span_end in spans:
+                payload, size = self._fetch(lat, lon, span_start, span_end, parameters, extra)
+                span_payloads.append((span_start, span_end, payload))
+                fetched_bytes += size
+            fresh = self._merge(path, parameters, days, span_payloads)
+        return self._assemble(parameters, wanted, days, fresh, spans, fetched_bytes)
+
+    async def aget(self, lat: float, lon: float, start: str, end: str, parameters: List[str],
+                   community: str = "AG", **extra) -> Dict[str, Dict[str, float]]:
+        """Async ``get``: missing spans are fetched concurrently through ``self.client``."""
+        parameters = list(parameters)
+        lat, lon, path, extra, wanted = self._prepare(lat, lon, start, end, parameters, community, extra)
+        async with self._alocked(path):
+            # File reads and rewrites stay off the event loop
+            days = await asyncio.to_thread(self._read, path)
+            spans = contiguous_spans(day for day in wanted if day not in days)
+            results = await asyncio.gather(*(
+                self._afetch(lat, lon, span_start, span_end, parameters, extra)
+                for span_start, span_end in spans
+            ))
+            span_payloads = [(span[0], span[1], payload) for span, (payload, _) in zip(spans, results)]
+            fresh = await asyncio.to_thread(self._merge, path, parameters, days, span_payloads)
+        return self._assemble(parameters, wanted, days, fresh, spans,
+                              sum(size for _, size in results))
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            requested = self.stats["days_requested"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["days_from_cache"] / requested if requested else 0.0,
+            }
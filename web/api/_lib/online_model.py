@@ -0,0 +1,234 @@
+"""Incremental updates for the recommendation models.
+
+After a full fit, a model carries a bounded buffer of the feature rows it has
+seen (one buffer per registry key, so per location). When a request brings
+days the buffer does not have yet, they are appended and the model is updated
+from recent rows only:
+
+* ``forest``: the random forest grows ``trees_per_update`` new trees (via
+  ``warm_start``) on the last ``update_rows`` buffered rows and retires its
+  oldest trees beyond ``max_trees``;
+* ``sgd``: a standardized linear model learns the new rows with ``partial_fit``;
+* ``refit``: no incremental state is kept and every change refits in full.
+
+An update therefore costs the same whatever the length of the history. Only
+models that can be updated are kept in the result, under ``online``; requests
+predict with the exported ``predictor`` (see ``flat_model``). A full
+refit is still asked for (``update`` returns None) every ``refit_every``
+updates, once ``refit_interval`` seconds have passed, or on drift: when the
+model's accuracy on new days, measured before it learns from them, falls more
+than ``drift_tolerance`` below the held-out accuracy of its last full fit.
+"""
+import copy
+import logging
+import time
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from api._lib.flat_model import export_model
+
+
+logger = logging.getLogger(__name__)
+
+
+UPDATE_MODES = ("forest", "sgd", "refit")
+CLASSES = np.array([0, 1])
+THRESHOLD_TEMP = 20
+
+
+def training_arrays(df, available_features):
+    """Features and favorable (1) / unfavorable (0) labels of the complete rows of ``df``."""
+    df = df.dropna()
+    return df[available_features], (df['T2M'] >= THRESHOLD_TEMP).astype(int)
+
+
+class FeatureBuffer(NamedTuple):
+    X: np.ndarray
+    y: np.ndarray
+    row_ids: tuple
+    max_rows: int
+
+    @classmethod
+    def empty(cls, n_features: int, max_rows: int) -> "FeatureBuffer":
+        return cls(np.empty((0, n_features)), np.empty(0, dtype=int), (), max_rows)
+
+    def unseen(self, ids: Sequence[str]) -> np.ndarray:
+        seen = set(self.row_ids)
+        return np.array([row_id not in seen for row_id in ids], dtype=bool)
+
+    def append(self, ids: Sequence[str], X: np.ndarray, y: np.ndarray) -> "FeatureBuffer":
+        # Returns a new buffer; the one in the served model is never modified
+        keep = -self.max_rows
+        return self._replace(X=np.concatenate([self.X, X])[keep:],
+                             y=np.concatenate([self.y, y])[keep:],
+                             row_ids=(self.row_ids + tuple(ids))[keep:])
+
+    def tail(self, rows: int):
+        return self.X[-rows:], self.y[-rows:]
+
+
+class OnlineState(NamedTuple):
+    mode: str
+    model: object  # the trainable estimator; requests predict with the exported copy
+    buffer: FeatureBuffer
+    refit_at: float
+    holdout_accuracy: float
+    updates: int = 0
+    drift_correct: int = 0
+    drift_seen: int = 0
+
+    def recent_accuracy(self) -> Optional[float]:
+        return self.drift_correct / self.drift_seen if self.drift_seen else None
+
+
+class OnlineLinearModel:
+    """Standard scaler plus logistic SGD classifier, both trainable with ``partial_fit``."""
+
+    def __init__(self, random_state: int = 42):
+        self.random_state = random_state
+
+    def fit(self, X, y) -> "OnlineLinearModel":
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.classifier = SGDClassifier(loss="log_loss", random_state=self.random_state)
+        X = np.asarray(X, dtype=np.float64)
+        self.classifier.partial_fit(self.scaler.fit_transform(X), np.asarray(y), classes=CLASSES)
+        # A few passes over the full history; updates afterwards see each new day once
+        for _ in range(4):
+            self.classifier.partial_fit(self.scaler.transform(X), np.asarray(y))
+        return self
+
+    def partial_fit(self, X, y) -> "OnlineLinearModel":
+        X = np.asarray(X, dtype=np.float64)
+        self.scaler.partial_fit(X)
+        self.classifier.partial_fit(self.scaler.transform(X), np.asarray(y))
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        return self.classifier.predict(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.classifier.classes_
+
+    @property
+    def feature_importances_(self) -> np.ndarray:
+        weights = np.abs(self.classifier.coef_[0])
+        total = weights.sum()
+        return weights / total if total else weights
+
+
+class IncrementalTrainer:
+    def __init__(self, mode: str = "forest", max_buffer_rows: int = 1095, update_rows: int = 365,
+                 trees_per_update: int = 10, max_trees: int = 200, refit_every: int = 30,
+                 refit_interval: float = 7 * 24 * 3600, drift_tolerance: float = 0.1,
+                 drift_min_rows: int = 30, n_jobs: int = 1):
+        if mode not in UPDATE_MODES:
+            raise ValueError(f"Unknown model update mode {mode!r}, expected one of {UPDATE_MODES}")
+        self.mode = mode
+        self.max_buffer_rows = max_buffer_rows
+        self.update_rows = update_rows
+        self.trees_per_update = trees_per_update
+        self.max_trees = max_trees
+        self.refit_every = refit_every
+        self.refit_interval = refit_interval
+        self.drift_tolerance = drift_tolerance
+        self.drift_min_rows = drift_min_rows
+        self.n_jobs = n_jobs
+
+    def new_model(self):
+        if self.mode == "sgd":
+            return OnlineLinearModel()
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=self.n_jobs)
+
+    def fit(self, df, available_features, ids: Optional[Sequence[str]] = None,
+            max_rows: Optional[int] = None) -> dict:
+        """Full fit on ``df``; with ``ids`` (see ``History.row_ids``) the result can be updated later."""
+        from sklearn.metrics import accuracy_score, classification_report
+        from sklearn.model_selection import train_test_split
+
+        X, y = training_arrays(df, available_features)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42)
+        model = self.new_model()
+        model.fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+        accuracy = accuracy_score(y_test, y_pred)
+        report = classification_report(y_test, y_pred)
+        logger.debug("Model trained", extra={"accuracy": accuracy, "rows": len(X)})
+        result = {
+            "feature_importances": dict(zip(available_features, model.feature_importances_.tolist())),
+            "predictor": export_model(model),
+            "accuracy": accuracy,
+            "classification_report": report
+        }
+        if ids is not None:
+            # Kept with the model so later requests can update it with just their new days
+            online = self.start(model, X.to_numpy(dtype=float), y.to_numpy(), [ids[i] for i in X.index],
+                                accuracy, max_rows)
+            if online is not None:
+                result["online"] = online
+        return result
+
+    def start(self, model, X: np.ndarray, y: np.ndarray, ids: Sequence[str], holdout_accuracy: float,
+              max_rows: Optional[int] = None) -> Optional[OnlineState]:
+        """Incremental state for ``model``, just fitted in full on ``X``/``y``."""
+        if self.mode == "refit":
+            return None
+        max_rows = min(max_rows or self.max_buffer_rows, self.max_buffer_rows)
+        buffer = FeatureBuffer.empty(X.shape[1], max_rows).append(ids, X, y)
+        return OnlineState(self.mode, model, buffer, time.time(), holdout_accuracy)
+
+    def refit_due(self, state: OnlineState) -> bool:
+        if state.updates >= self.refit_every or time.time() - state.refit_at >= self.refit_interval:
+            return True
+        accuracy = state.recent_accuracy()
+        return (state.drift_seen >= self.drift_min_rows
+                and accuracy < state.holdout_accuracy - self.drift_tolerance)
+
+    def update(self, result: dict, X: np.ndarray, y: np.ndarray, ids: Sequence[str]) -> Optional[dict]:
+        """``result`` updated with the rows of ``X``/``y`` it has not seen, or None
+        when a full refit is needed instead."""
+        state: Optional[OnlineState] = result.get("online")
+        if state is None or state.mode != self.mode or self.refit_due(state):
+            return None
+        fresh = state.buffer.unseen(ids)
+        if not fresh.any():
+            return result
+        X_new, y_new = X[fresh], y[fresh]
+        model = state.model
+        # Scored before learning from them, so this tracks how well the model generalizes
+        correct = int((result["predictor"].predict(X_new) == y_new).sum())
+        buffer = state.buffer.append([row_id for row_id, new in zip(ids, fresh) if new], X_new, y_new)
+        if self.mode == "sgd":
+            model = copy.deepcopy(model).partial_fit(X_new, y_new)
+        else:
+            model = self._grow_forest(model, *buffer.tail(self.update_rows))
+        state = state._replace(model=model, buffer=buffer, updates=state.updates + 1,
+                               drift_correct=state.drift_correct + correct,
+                               drift_seen=state.drift_seen + len(y_new))
+        return {
+            **result,
+            "feature_importances": dict(zip(result["feature_importances"], model.feature_importances_.tolist())),
+            "predictor": export_model(model),
+            "online": state,
+        }
+
+    def _grow_forest(self, model, X: np.ndarray, y: np.ndarray):
+        # New trees only make sense if the recent rows cover the classes the forest knows
+        if not np.array_equal(np.unique(y), model.classes_):
+            return model
+        # Shallow copy with its own tree list, so requests predicting with the served forest are unaffected
+        grown = copy.copy(model)
+        grown.estimators_ = list(model.estimators_)
+        grown.set_params(warm_start=True, n_estimators=len(grown.estimators_) + self.trees_per_update)
+        grown.fit(X, y)
+        if len(grown.estimators_) > self.max_trees:
+            grown.estimators_ = grown.estimators_[-self.max_trees:]
+            grown.n_estimators = self.max_trees
+        return grown
@@ -0,0 +1,447 @@
+"""Local mirror of NASA POWER daily data for a registry of farm locations.
+
+The farms to mirror are listed in ``farms.json`` in the mirror directory
+(``[{"name": ..., "lat": ..., "lon": ...}, ...]``). ``sync`` downloads the
+configured parameter set for every POWER grid cell the farms fall in and
+stores each cell as one ``.npz`` file: a contiguous block of days by
+parameters, plus the time of the last successful sync. Later syncs only
+download the days after the last published one, so a daily run costs one
+small request per cell. Days POWER has not published yet (fill values at the
+end of the range) are not stored and are asked for again on the next run.
+
+Data comes from a ``source``: ``HttpPowerSource`` talks to the POWER API and
+``FilePowerSource`` reads POWER-shaped JSON files from a directory. The file
+source stands in for POWER in tests and air-gapped installs.
+
+Reads (``get``) never touch the network. They return the same
+``parameter -> {YYYYMMDD: value}`` shape as POWER, plus freshness metadata.
+A range running past the last synced day raises ``MirrorBehind``, so online
+callers fetch those days upstream; offline callers get them as fill values.
+Syncs run from the command line (e.g. from cron) or on an interval in the
+API process (see ``MirrorScheduler``):
+
+    python -m api._lib.power_mirror sync --mirror-dir /data/power-mirror --start 20150101
+    python -m api._lib.power_mirror sync --mirror-dir /data/power-mirror --source-dir /data/power-dump
+    python -m api._lib.power_mirror status --mirror-dir /data/power-mirror
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api._lib.nasa_cache import DATE_FORMAT, FILL_VALUE, NASA_POWER_URL, UpstreamError, snap_to_grid
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MIRROR_DIR = os.path.join(tempfile.gettempdir(), "nasa-power-mirror")
+FARMS_FILE = "farms.json"
+CELLS_DIR = "cells"
+
+# Everything the API and the Streamlit app ask for; POWER allows 20 parameters per request
+MIRROR_PARAMETERS = ("T2M", "PRECTOTCORR", "RH2M", "WS2M", "ALLSKY_SFC_SW_DWN", "T2M_MAX", "T2M_MIN", "PS",
+                     "QV10M", "SNODP", "TS", "U10M", "U2M", "U50M", "V10M", "V2M", "PSC", "WD10M", "WD2M", "WS10M")
+DEFAULT_START = "20150101"
+# Longest span fetched in one request, to bound response sizes on a first sync
+MAX_SPAN_DAYS = 5 * 366
+
+
+class NotMirrored(Exception):
+    pass
+
+
+class MirrorBehind(NotMirrored):
+    """The range ends after the last mirrored day; days up to ``last_day`` are mirrored."""
+
+    def __init__(self, last_day: str):
+        super().__init__(f"The mirror is synced through {last_day}")
+        self.last_day = last_day
+
+
+class SyncInProgress(Exception):
+    pass
+
+
+class Farm(NamedTuple):
+    name: str
+    lat: float
+    lon: float
+
+
+def to_day(day: str) -> np.datetime64:
+    return np.datetime64(datetime.strptime(day, DATE_FORMAT).date(), "D")
+
+
+def day_labels(first: np.datetime64, count: int) -> List[str]:
+    days = np.arange(first, first + count, dtype="datetime64[D]")
+    return [label.replace("-", "") for label in np.datetime_as_string(days).tolist()]
+
+
+def next_day(day: str) -> str:
+    return day_labels(to_day(day) + 1, 1)[0]
+
+
+def today() -> np.datetime64:
+    return np.datetime64(datetime.now(timezone.utc).date(), "D")
+
+
+def cell_name(lat: float, lon: float) -> str:
+    lat, lon = snap_to_grid(lat, lon)
+    return f"{lat}_{lon}"
+
+
+def load_farms(path: str) -> List[Farm]:
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    return [Farm(str(entry["name"]), float(entry["lat"]), float(entry["lon"])) for entry in entries]
+
+
+class MirrorCell(NamedTuple):
+    first_day: np.datetime64
+    parameters: Tuple[str, ...]
+    values: np.ndarray  # days x parameters, float64, NaN where POWER has no value
+    synced_at: float
+
+    @property
+    def last_day(self) -> np.datetime64:
+        return self.first_day + (len(self.values) - 1)
+
+    def save(self, path: str):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, first_day=np.array(self.first_day), parameters=np.array(self.parameters),
+                     values=self.values, synced_at=np.array(self.synced_at))
+        # Readers see the old cell or the new one, never a partial file
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MirrorCell":
+        with np.load(path) as data:
+            return cls(data["first_day"][()], tuple(data["parameters"].tolist()), data["values"],
+                       float(data["synced_at"]))
+
+    def freshness(self) -> dict:
+        last_day = self.last_day
+        return {
+            "synced_at": datetime.fromtimestamp(self.synced_at, timezone.utc).isoformat(timespec="seconds"),
+            "first_day": str(self.first_day).replace("-", ""),
+            "last_day": str(last_day).replace("-", ""),
+            "lag_days": int((today() - last_day).astype(int)),
+        }
+
+
+class HttpPowerSource:
+    """The live POWER daily point API."""
+
+    def __init__(self, base_url: str = NASA_POWER_URL, session: Optional["requests.Session"] = None,
+                 timeout: float = 120, community: str = "AG"):
+        self.base_url = base_url
+        self._session = session
+        self.timeout = timeout
+        self.community = community
+
+    @property
+    def session(self) -> "requests.Session":
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def fetch(self, lat: float, lon: float, start: str, end: str,
+              parameters: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        params = {
+            "start": start,
+            "end": end,
+            "latitude": lat,
+            "longitude": lon,
+            "parameters": ",".join(parameters),
+            "community": self.community,
+            "format": "JSON",
+        }
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code)
+        return response.json()["properties"]["parameter"]
+
+
+class FilePowerSource:
+    """POWER responses saved as ``<lat>_<lon>.json`` (grid points, see ``snap_to_grid``), one per cell.
+
+    Each file holds a POWER daily point response, or just its
+    ``properties.parameter`` object. Days and parameters outside the file come
+    back as fill values, as POWER reports days it has not published.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, lat: float, lon: float, start: str, end: str,
+              parameters: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        path = os.path.join(self.directory, cell_name(lat, lon) + ".json")
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            raise UpstreamError(404, f"No POWER data file for cell {cell_name(lat, lon)}")
+        payload = payload.get("properties", {}).get("parameter", payload)
+        days = day_labels(to_day(start), int((to_day(end) - to_day(start)).astype(int)) + 1)
+        return {parameter: {day: payload.get(parameter, {}).get(day, FILL_VALUE) for day in days}
+                for parameter in parameters}
+
+
+def payload_matrix(payload: Dict[str, Dict[str, float]], parameters: Sequence[str],
+                   labels: Sequence[str]) -> np.ndarray:
+    values = np.array([[payload.get(parameter, {}).get(day, FILL_VALUE) for parameter in parameters]
+                       for day in labels], dtype=np.float64).reshape(len(labels), len(parameters))
+    values[values == FILL_VALUE] = np.nan
+    return values
+
+
+class PowerMirror:
+    def __init__(self, directory: str = DEFAULT_MIRROR_DIR, parameters: Sequence[str] = MIRROR_PARAMETERS,
+                 farms_path: Optional[str] = None):
+        self.directory = directory
+        self.parameters = tuple(parameters)
+        self.farms_path = farms_path or os.path.join(directory, FARMS_FILE)
+        # Loaded cells, reloaded when a sync (from any process) replaces the file
+        self._cells: Dict[str, Tuple[int, MirrorCell]] = {}
+        self._farms: Tuple[Optional[int], List[Farm]] = (None, [])
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.last_sync: Optional[dict] = None
+        os.makedirs(os.path.join(directory, CELLS_DIR), exist_ok=True)
+
+    def farms(self) -> List[Farm]:
+        try:
+            mtime = os.stat(self.farms_path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._farms[0] != mtime:
+            self._farms = (mtime, load_farms(self.farms_path))
+        return self._farms[1]
+
+    def farm(self, name: str) -> Optional[Farm]:
+        wanted = " ".join(name.split()).casefold()
+        return next((farm for farm in self.farms() if " ".join(farm.name.split()).casefold() == wanted), None)
+
+    def _cell_path(self, lat: float, lon: float) -> str:
+        return os.path.join(self.directory, CELLS_DIR, cell_name(lat, lon) + ".npz")
+
+    def cell(self, lat: float, lon: float) -> Optional[MirrorCell]:
+        path = self._cell_path(lat, lon)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cells.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        cell = MirrorCell.load(path)
+        with self._lock:
+            self._cells[path] = (mtime, cell)
+        return cell
+
+    def get(self, lat: float, lon: float, start: str, end: str, parameters: Sequence[str],
+            fill_tail: bool = False) -> Tuple[Dict[str, Dict[str, float]], dict]:
+        """Daily values for ``start``..``end`` shaped like POWER's ``properties.parameter``,
+        and the freshness of the cell they came from.
+
+        Raises ``NotMirrored`` when the cell, the parameters or the start of the
+        range are not in the mirror, and ``MirrorBehind`` when the range ends
+        after the last mirrored day. With ``fill_tail`` (offline use) those days
+        are fill values instead, as POWER returns them for days not published yet.
+        """
+        cell = self.cell(lat, lon)
+        if cell is None:
+            raise NotMirrored(f"Location {lat}, {lon} is not mirrored")
+        missing = [parameter for parameter in parameters if parameter not in cell.parameters]
+        if missing:
+            raise NotMirrored(f"Parameters {missing} are not mirrored")
+        first, last = to_day(start), to_day(end)
+        if last < first:
+            raise ValueError("End date is before start date")
+        if first < cell.first_day:
+            raise NotMirrored(f"The mirror starts on {cell.freshness()['first_day']}")
+        if last > cell.last_day and not fill_tail:
+            raise MirrorBehind(cell.freshness()["last_day"])
+        count = int((last - first).astype(int)) + 1
+        offset = int((first - cell.first_day).astype(int))
+        columns = [cell.parameters.index(parameter) for parameter in parameters]
+        values = np.full((count, len(columns)), np.nan)
+        available = cell.values[offset:offset + count, columns]
+        values[:len(available)] = available
+        values[np.isnan(values)] = FILL_VALUE
+        labels = day_labels(first, count)
+        return ({parameter: dict(zip(labels, values[:, i].tolist())) for i, parameter in enumerate(parameters)},
+                cell.freshness())
+
+    def _sync_cell(self, lat: float, lon: float, source, start: np.datetime64, end: np.datetime64) -> int:
+        """Bring one cell up to ``end``; returns the number of days downloaded."""
+        lat, lon = snap_to_grid(lat, lon)
+        path = self._cell_path(lat, lon)
+        cell = self.cell(lat, lon)
+        if cell is not None and cell.parameters != self.parameters:
+            # The parameter set changed: start over
+            cell = None
+        if cell is None:
+            wanted = [(start, end)]
+        else:
+            wanted = [(start, cell.first_day - 1), (cell.last_day + 1, end)]
+        spans = []
+        for span_start, span_end in wanted:
+            while span_start <= span_end:
+                spans.append((span_start, min(span_end, span_start + (MAX_SPAN_DAYS - 1))))
+                span_start += MAX_SPAN_DAYS
+        if not spans:
+            if cell is not None:
+                # Nothing new; record that the cell was checked
+                cell._replace(synced_at=time.time()).save(path)
+            return 0
+
+        blocks = [] if cell is None else [(cell.first_day, cell.values)]
+        for span_start, span_end in spans:
+            labels = day_labels(span_start, int((span_end - span_start).astype(int)) + 1)
+            payload = source.fetch(lat, lon, labels[0], labels[-1], self.parameters)
+            blocks.append((span_start, payload_matrix(payload, self.parameters, labels)))
+        first = min(block_start for block_start, _ in blocks)
+        last = max(block_start + (len(values) - 1) for block_start, values in blocks)
+        merged = np.full((int((last - first).astype(int)) + 1, len(self.parameters)), np.nan)
+        for block_start, values in blocks:
+            offset = int((block_start - first).astype(int))
+            merged[offset:offset + len(values)] = values
+        # Leave out the trailing days POWER has not published, so they are fetched again
+        published = np.flatnonzero(~np.isnan(merged).all(axis=1))
+        if not len(published):
+            raise UpstreamError(404, f"No published data for cell {lat}, {lon}")
+        merged = merged[:published[-1] + 1]
+        MirrorCell(first, self.parameters, merged, time.time()).save(path)
+        return sum(int((span_end - span_start).astype(int)) + 1 for span_start, span_end in spans)
+
+    def sync(self, source, farms: Optional[Sequence[Farm]] = None, start: str = DEFAULT_START,
+             end: Optional[str] = None, max_workers: int = 4) -> dict:
+        """Download what is missing for every farm's cell from ``start`` to ``end`` (default: today).
+
+        Cells are synced concurrently and independently; a failed cell keeps
+        its previous data and is reported under ``"failed"``. Raises
+        ``SyncInProgress`` if this mirror is already syncing.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            raise SyncInProgress("A mirror sync is already running")
+        try:
+            return self._sync(source, self.farms() if farms is None else farms, start, end, max_workers)
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self, source, farms: Sequence[Farm], start: str, end: Optional[str], max_workers: int) -> dict:
+        started = time.time()
+        first = to_day(start)
+        last = to_day(end) if end else today()
+        cells = {}
+        for farm in farms:
+            cells.setdefault(cell_name(farm.lat, farm.lon), (farm.lat, farm.lon))
+
+        def run(item):
+            name, (lat, lon) = item
+            try:
+                return name, self._sync_cell(lat, lon, source, first, last), None
+            except Exception as e:
+                logger.warning("Mirror sync failed for cell %s: %s", name, e)
+                return name, 0, str(e) or type(e).__name__
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            results = list(pool.map(run, cells.items()))
+        summary = {
+            "farms": len(farms),
+            "cells": len(cells),
+            "updated": sum(1 for _, days, error in results if days and error is None),
+            "days_fetched": sum(days for _, days, _ in results),
+            "failed": {name: error for name, _, error in results if error is not None},
+            "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(timespec="seconds"),
+            "seconds": round(time.time() - started, 3),
+        }
+        self.last_sync = summary
+        logger.info("Mirror sync finished", extra={key: value for key, value in summary.items() if key != "failed"})
+        return summary
+
+    def status(self) -> dict:
+        farms = []
+        for farm in self.farms():
+            cell = self.cell(farm.lat, farm.lon)
+            farms.append({**farm._asdict(), "cell": cell_name(farm.lat, farm.lon),
+                          "freshness": None if cell is None else cell.freshness()})
+        return {"directory": self.directory, "parameters": list(self.parameters), "farms": farms,
+                "last_sync": self.last_sync}
+
+
+class MirrorScheduler:
+    """Runs ``mirror.sync`` every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, mirror: PowerMirror, source, interval: float, start: str = DEFAULT_START,
+                 max_workers: int = 4):
+        self.mirror = mirror
+        self.source = source
+        self.interval = interval
+        self.start_day = start
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.mirror.sync(self.source, start=self.start_day, max_workers=self.max_workers)
+            except SyncInProgress:
+                # Started from the sync endpoint; this round is covered by it
+                pass
+            except Exception:
+                logger.exception("Mirror sync failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="power-mirror-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync or inspect the local NASA POWER mirror")
+    parser.add_argument("command", choices=["sync", "status"])
+    parser.add_argument("--mirror-dir", default=os.getenv("NASA_POWER_MIRROR_DIR", DEFAULT_MIRROR_DIR))
+    parser.add_argument("--farms", help=f"farm registry (default: <mirror-dir>/{FARMS_FILE})")
+    parser.add_argument("--start", default=DEFAULT_START, help="first day to mirror, YYYYMMDD")
+    parser.add_argument("--end", help="last day to mirror, YYYYMMDD (default: today)")
+    parser.add_argument("--source-dir", help="read POWER responses from this directory instead of the API")
+    parser.add_argument("--url", default=os.getenv("NASA_POWER_URL", NASA_POWER_URL))
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    mirror = PowerMirror(args.mirror_dir, farms_path=args.farms)
+    if args.command == "sync":
+        source = FilePowerSource(args.source_dir) if args.source_dir else HttpPowerSource(args.url)
+        summary = mirror.sync(source, start=args.start, end=args.end, max_workers=args.workers)
+        print(json.dumps(summary, indent=2))
+        if summary["failed"]:
+            raise SystemExit(1)
+    else:
+        print(json.dumps(mirror.status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""In-process cache of encoded JSON responses for repeated chart queries.
+
+Entries are keyed by the endpoint, its normalized parameters and the version
+of the dataset they were computed from, and hold the response body exactly
+as sent. The key digest doubles as the ``ETag``: a body is fully determined
+by its key, so a client revalidating with ``If-None-Match`` can be answered
+304 without computing or even looking up the body. The least recently used
+entries are evicted beyond ``max_entries`` or ``max_bytes``, and everything is
+dropped as soon as a request sees a new dataset version.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value covers ``etag``."""
+    if not if_none_match:
+        return False
+    # Weak comparison, as HTTP requires for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def encode_json(content) -> bytes:
+    """Encoded like FastAPI's default ``JSONResponse``."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def key(endpoint: str, params: dict, version: str) -> str:
+        payload = json.dumps([endpoint, params, version], sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _check_version(self, version: str):
+        # Called with the lock held; entries of an older dataset can never be hit again
+        if version != self._version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key: str, version: str) -> Optional[bytes]:
+        with self._lock:
+            self._check_version(version)
+            body = self._entries.get(key)
+            if body is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return body
+
+    def put(self, key: str, version: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def get_or_build(self, key: str, version: str, build: Callable[[], object],
+                     encode: Callable[[object], bytes] = encode_json) -> bytes:
+        """The cached body for ``key``, or ``build()`` encoded and stored."""
+        body = self.get(key, version)
+        if body is None:
+            body = encode(build())
+            self.put(key, version, body)
+        return body
+
+    def not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,86 @@
+"""Table-driven threshold rules for the crop care recommendations.
+
+Each metric has an ordered list of ranges; like an if/elif chain, the first
+range containing the value wins and values matching none (including NaN) get
+the metric's default message. Rules are evaluated over whole NumPy arrays with
+``np.select``, so one call scores every day of a history or every farm of a
+batch. The tables live in ``recommendation_rules.json`` and can be replaced
+through ``RECOMMENDATION_RULES_PATH``.
+
+A metric's ``scale`` is applied to every value before matching; ``column`` and
+``column_scale`` say which frame column feeds the metric and how the caller
+converts it (wind speed is given in km/h, and the rule then converts again,
+exactly as ``generate_recommendations`` always has).
+"""
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "recommendation_rules.json")
+
+
+class MetricRules(NamedTuple):
+    name: str
+    column: str
+    column_scale: float
+    scale: float
+    rules: List[dict]
+    messages: np.ndarray  # rule messages followed by the default
+
+    def codes(self, values) -> np.ndarray:
+        """Index into ``messages`` of the matching rule for each value."""
+        values = np.asarray(values, dtype=np.float64) * self.scale
+        conditions = []
+        for rule in self.rules:
+            condition = np.ones(values.shape, dtype=bool)
+            if rule.get("min") is not None:
+                condition &= (values >= rule["min"]) if rule.get("min_inclusive", True) else (values > rule["min"])
+            if rule.get("max") is not None:
+                condition &= (values <= rule["max"]) if rule.get("max_inclusive", True) else (values < rule["max"])
+            # NaN compares false, so it falls through to the default like the old chains
+            condition &= ~np.isnan(values)
+            conditions.append(condition)
+        return np.select(conditions, np.arange(len(self.rules)), default=len(self.rules))
+
+
+class RuleEngine:
+    def __init__(self, tables: Dict[str, dict]):
+        self.metrics: Dict[str, MetricRules] = {}
+        for name, table in tables.items():
+            messages = [rule["message"] for rule in table["rules"]] + [table["default"]]
+            self.metrics[name] = MetricRules(
+                name=name,
+                column=table["column"],
+                column_scale=table.get("column_scale", 1.0),
+                scale=table.get("scale", 1.0),
+                rules=table["rules"],
+                messages=np.array(messages, dtype=object),
+            )
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "RuleEngine":
+        with open(path or DEFAULT_RULES_PATH) as f:
+            return cls(json.load(f))
+
+    def evaluate(self, metric: str, value) -> str:
+        """Message for a single value, as passed to the old scalar helper."""
+        rules = self.metrics[metric]
+        return rules.messages[int(rules.codes(value))]
+
+    def codes_for_frame(self, df) -> Dict[str, np.ndarray]:
+        """Rule index per row for every metric whose column is in ``df``
+        (a DataFrame or a mapping of column name to array)."""
+        return {
+            name: rules.codes(np.asarray(df[rules.column], dtype=np.float64) * rules.column_scale)
+            for name, rules in self.metrics.items() if rules.column in df
+        }
+
+    def messages_for_frame(self, df) -> Dict[str, np.ndarray]:
+        """Message per row for every metric whose column is in ``df``."""
+        return {name: self.metrics[name].messages[codes] for name, codes in self.codes_for_frame(df).items()}
+
+    def legend(self) -> Dict[str, List[str]]:
+        return {name: rules.messages.tolist() for name, rules in self.metrics.items()}
@@ -0,0 +1,62 @@
+"""Lazily built per-worker services.
+
+Each service is registered as a factory and only constructed (importing its
+heavy dependencies) the first time an endpoint asks for it, so a cold start
+that only serves ``/api/py/`` or a cached geocode does not pay for pandas,
+scikit-learn or the dataset load. ``warm_up`` builds them ahead of time.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class Services:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._init_seconds: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        return factory
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for names that are not regular attributes
+        if name.startswith("_") or name not in self._factories:
+            raise AttributeError(name)
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._init_seconds[name] = time.perf_counter() - started
+            return self._instances[name]
+
+    def reset(self, *names: str):
+        """Drop built instances so the next access rebuilds them."""
+        with self._lock:
+            for name in names:
+                self._instances.pop(name, None)
+                self._init_seconds.pop(name, None)
+
+    def put(self, name: str, instance: Any):
+        """Install an instance built outside the factory (e.g. updated from the previous one)."""
+        with self._lock:
+            self._instances[name] = instance
+            # Built by the caller, so no factory time to report in status()
+            self._init_seconds[name] = 0.0
+
+    def get_if_initialized(self, name: str) -> Optional[Any]:
+        return self._instances.get(name)
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Build ``names`` (default: every service); returns seconds spent per service."""
+        for name in names or list(self._factories):
+            getattr(self, name)
+        return self.status()
+
+    def status(self) -> Dict[str, float]:
+        return {name: round(self._init_seconds[name], 4) for name in self._instances}
@@ -0,0 +1,44 @@
+"""NDJSON generators for long-range responses.
+
+Rows are serialized one chunk at a time, so memory per request is bounded by the
+chunk size rather than the requested range and the first rows reach the client
+before the rest are built.
+"""
+import json
+from typing import Dict, Iterator
+
+from api._lib.chart_data import CHART_SERIES, column_values
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def iter_chart_ndjson(df, chunk_rows: int = 1000) -> Iterator[str]:
+    """One line per day with every chart series, e.g.
+    ``{"date": ..., "temperature": {"min": ..., ...}, "precipitation": {"value": ...}}``."""
+    for offset in range(0, len(df), chunk_rows):
+        chunk = df.iloc[offset:offset + chunk_rows]
+        dates = chunk['date'].dt.strftime("%Y-%m-%d").tolist()
+        series = {
+            name: [(field, column_values(chunk, column)) for field, column in fields.items()]
+            for name, fields in CHART_SERIES.items()
+        }
+        lines = []
+        for i, date in enumerate(dates):
+            row = {"date": date}
+            for name, fields in series.items():
+                row[name] = {field: values[i] for field, values in fields}
+            lines.append(json.dumps(row))
+        yield "\n".join(lines) + "\n"
+
+
+def iter_parameter_ndjson(nasa_data: Dict[str, Dict[str, float]], chunk_rows: int = 1000) -> Iterator[str]:
+    """One line per day of a POWER ``properties.parameter`` payload:
+    ``{"date": ..., "T2M": ..., "RH2M": ...}``."""
+    days = list(next(iter(nasa_data.values()), {}))
+    for offset in range(0, len(days), chunk_rows):
+        lines = [
+            json.dumps({"date": day, **{parameter: values.get(day) for parameter, values in nasa_data.items()}})
+            for day in days[offset:offset + chunk_rows]
+        ]
+        yield "\n".join(lines) + "\n"
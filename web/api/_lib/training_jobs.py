@@ -0,0 +1,207 @@
+"""Background queue for model fits, backed by a process pool.
+
+Fits run in worker processes so they neither hold a request thread nor the
+API process's GIL; ``n_jobs`` on the trainer controls how many cores a single
+forest fit uses inside its worker. Jobs are keyed: submitting a key that
+already has a queued or running job returns that job instead of fitting
+twice. Once ``max_pending`` jobs are waiting, new ones are refused with
+``QueueFull`` so callers can push back on clients. Request handlers do not
+wait for a fit: they raise ``TrainingPending`` with the job, answered with 202
+and the job's status URL.
+
+Where processes cannot be started (some serverless runtimes have no
+``sem_open``), fits fall back to a thread pool.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    def __init__(self, pending: int, retry_after: int):
+        super().__init__(f"Training queue is full ({pending} jobs pending)")
+        self.retry_after = retry_after
+
+
+class TrainingPending(Exception):
+    """A fit the request needs was queued (or was already running) and has not finished."""
+
+    def __init__(self, job: "TrainingJob"):
+        super().__init__(f"Training job {job.id} is {job.status}")
+        self.job = job
+
+
+def fit_history(trainer, history, available_features, ids=None, max_rows=None) -> dict:
+    """Job body: a full fit of ``trainer`` on a ``History``."""
+    return trainer.fit(history.frame(), available_features, ids, max_rows)
+
+
+def summarize(result: dict) -> dict:
+    """The JSON-friendly part of a fit result."""
+    return {name: value for name, value in result.items() if name not in ("predictor", "online")}
+
+
+class TrainingJob:
+    def __init__(self, key: str, future: Future):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.future = future
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def result_or_pending(self) -> dict:
+        """The fit result, raising the job's error if it failed and ``TrainingPending`` if unfinished."""
+        if not self.future.done():
+            raise TrainingPending(self)
+        return self.future.result()
+
+    def describe(self) -> dict:
+        status = self.status
+        description = {"job_id": self.id, "status": status, "submitted_at": self.submitted_at,
+                       "finished_at": self.finished_at}
+        if status == "done":
+            description["result"] = summarize(self.future.result())
+        elif status == "failed":
+            description["error"] = str(self.future.exception())
+        return description
+
+
+class TrainingJobQueue:
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64,
+                 keep_finished: int = 1000, use_processes: bool = True):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active: Dict[str, TrainingJob] = {}
+        self._jobs: "OrderedDict[str, TrainingJob]" = OrderedDict()
+        self._fit_seconds = 0.0
+        self.stats: Dict[str, int] = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    @property
+    def executor(self):
+        # Started on first use; spawned workers do not inherit the API's threads or locks
+        if self._executor is None:
+            if self.use_processes:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+                except (OSError, NotImplementedError) as e:
+                    logger.warning("Process pool unavailable (%s), training in threads instead", e)
+                    self.use_processes = False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="training")
+        return self._executor
+
+    def submit(self, key: str, fn: Callable, *args,
+               on_done: Optional[Callable[[dict], None]] = None) -> Tuple[TrainingJob, bool]:
+        """Queue ``fn(*args)`` under ``key``, or join the job already pending for it.
+
+        Returns the job and whether it was newly queued; ``on_done`` is called
+        with the result once the job succeeds, also when it was joined.
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                self.stats["deduplicated"] += 1
+                if on_done is not None:
+                    # Runs at once if the job finished in the meantime
+                    job.future.add_done_callback(lambda _: self._deliver(job, on_done))
+                return job, False
+            if len(self._active) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFull(len(self._active), self.retry_after())
+            try:
+                future = self.executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool once
+                self._executor = None
+                future = self.executor.submit(fn, *args)
+            job = TrainingJob(key, future)
+            self._active[key] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep_finished + self.max_pending:
+                self._jobs.popitem(last=False)
+            self.stats["submitted"] += 1
+        # Delivered before the job leaves _active, so a request repeated right
+        # after it finished joins it rather than fitting again
+        if on_done is not None:
+            future.add_done_callback(lambda _: self._deliver(job, on_done))
+        future.add_done_callback(lambda _: self._finished(job))
+        return job, True
+
+    def run(self, key: str, fn: Callable, *args) -> dict:
+        """Submit (or join) a job and block until its result is in.
+
+        Only for callers that are off the request path anyway (background
+        refreshes, benchmarks); handlers submit and raise ``TrainingPending``.
+        """
+        job, _ = self.submit(key, fn, *args)
+        return job.future.result()
+
+    def _finished(self, job: TrainingJob):
+        job.finished_at = time.time()
+        failed = job.future.exception() is not None
+        with self._lock:
+            self._active.pop(job.key, None)
+            self.stats["failed" if failed else "completed"] += 1
+            self._fit_seconds += job.finished_at - job.submitted_at
+        if failed:
+            logger.warning("Training job %s failed: %s", job.id, job.future.exception())
+
+    def _deliver(self, job: TrainingJob, on_done: Callable[[dict], None]):
+        if job.future.exception() is not None:
+            return
+        try:
+            on_done(job.future.result())
+        except Exception as e:
+            logger.warning("Storing the result of training job %s failed: %s", job.id, e)
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(job_id)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up, from the average job duration so far."""
+        finished = self.stats["completed"] + self.stats["failed"]
+        average = self._fit_seconds / finished if finished else 5.0
+        return max(1, round(average * max(1, len(self._active)) / self.max_workers))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            jobs = list(self._active.values())
+            return {
+                **self.stats,
+                "queued": sum(job.status == "queued" for job in jobs),
+                "running": sum(job.status == "running" for job in jobs),
+                "max_pending": self.max_pending,
+                "workers": self.max_workers,
+                "executor": "process" if self.use_processes else "thread",
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,31 +1,247 @@
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
-import requests
-import pandas as pd
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+import json
 from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
+import logging
 import os
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional, Union
 from dotenv import load_dotenv
 
+# Only lightweight modules are imported here; pandas, scikit-learn and the dataset
+# are loaded on first use through `services` so cold starts stay cheap
+from api._lib.nasa_cache import DEFAULT_CACHE_DIR, NasaPowerCache, UpstreamError
+from api._lib.nasa_cache import NASA_POWER_URL as DEFAULT_NASA_POWER_URL
+from api._lib.batch_fetch import fan_out
+from api._lib.chart_data import build_chart_data, build_downsampled_chart_data
+from api._lib.http_client import AsyncHttpClient
+from api._lib.geocode_cache import DEFAULT_CACHE_PATH as DEFAULT_GEOCODE_CACHE_PATH
+from api._lib.geocode_cache import OPEN_CAGE_URL, GeocodeCache, GeocoderError, GeocoderNotConfigured, OpenCageGeocoder
+from api._lib.services import Services
+from api._lib.streaming import NDJSON_MEDIA_TYPE, iter_chart_ndjson, iter_parameter_ndjson
+from api._lib.model_registry import DEFAULT_REGISTRY_DIR, ModelKey, ModelRegistry
+from api._lib.response_cache import ResponseCache, encode_json, etag_matches
+from api._lib.instrumentation import InstrumentationMiddleware, configure_logging, metrics, stage
+from api._lib.training_jobs import QueueFull, TrainingPending
+
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json")
-
-# Load the NASA POWER data from CSV
-csv_path = os.path.join(os.path.dirname(__file__), "nasa_power_data_with_date.csv")
-nasa_power_df = pd.read_csv(csv_path, parse_dates=['date'])
+# Structured logs (logfmt, or JSON lines with LOG_FORMAT=json); per-request logs are at DEBUG
+configure_logging(os.getenv('LOG_LEVEL', 'INFO'), json_lines=os.getenv('LOG_FORMAT', 'logfmt') == 'json')
+logger = logging.getLogger(__name__)
+metrics.enabled = os.getenv('METRICS_ENABLED', '1') == '1'
 
 # NASA POWER API Endpoint
-NASA_POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+NASA_POWER_URL = os.getenv('NASA_POWER_URL', DEFAULT_NASA_POWER_URL)
 
 # API Key for OpenCage (you need to sign up to get your own key)
 OPEN_CAGE_API_KEY = os.getenv('OPEN_CAGE_API_KEY')
 if OPEN_CAGE_API_KEY is None:
-    print("Warning: OPEN_CAGE_API_KEY environment variable is not set")
+    logger.warning("OPEN_CAGE_API_KEY environment variable is not set")
+
+# GET chart responses only change when the dataset is reloaded; clients revalidate with the ETag after this
+CHART_CACHE_CONTROL = f"public, max-age={int(os.getenv('CHART_CACHE_MAX_AGE_SECONDS', '300'))}"
+
+# Local mirror of NASA POWER for the farms listed in <dir>/farms.json (see api/_lib/power_mirror.py).
+# Points it covers are served from it; with NASA_POWER_OFFLINE=1 nothing is fetched upstream
+POWER_MIRROR_DIR = os.getenv('NASA_POWER_MIRROR_DIR')
+NASA_POWER_OFFLINE = os.getenv('NASA_POWER_OFFLINE') == '1'
+
+services = Services()
+
+
+def create_http_client():
+    # One pooled client per worker for every upstream call (NASA POWER, OpenCage)
+    return AsyncHttpClient(
+        max_connections=int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '200')),
+        max_in_flight=int(os.getenv('UPSTREAM_MAX_IN_FLIGHT', '200')),
+        timeout=float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', '30')))
+
+
+def load_nasa_power_index():
+    from api._lib.columnar_store import load_frame
+    from api._lib.frame_index import DateIndexedFrame
+
+    # Memory-mapped from the columnar store when it has been ingested
+    # (python -m api._lib.columnar_store <csv> <store>), otherwise parsed from CSV
+    csv_path = os.getenv('NASA_POWER_CSV', os.path.join(os.path.dirname(__file__), "nasa_power_data_with_date.csv"))
+    store_dir = os.getenv('NASA_POWER_STORE_DIR', os.path.join(os.path.dirname(__file__), "nasa_power_store"))
+    # Sorted by (location, date) once so range queries are binary searches instead of full scans
+    return DateIndexedFrame(load_frame(csv_path, store_dir))
+
+
+def create_nasa_cache():
+    # Daily values already fetched from NASA POWER, so overlapping ranges only fetch the missing days
+    return NasaPowerCache(directory=os.getenv('NASA_CACHE_DIR', DEFAULT_CACHE_DIR),
+                          base_url=NASA_POWER_URL, client=services.http_client)
+
+
+def create_power_mirror():
+    from api._lib.power_mirror import PowerMirror
+
+    return PowerMirror(POWER_MIRROR_DIR, farms_path=os.getenv('NASA_POWER_MIRROR_FARMS'))
+
+
+def power_mirror_source():
+    from api._lib.power_mirror import FilePowerSource, HttpPowerSource
+
+    # A directory of saved POWER responses stands in for the API (tests, air-gapped installs)
+    source_dir = os.getenv('NASA_POWER_MIRROR_SOURCE_DIR')
+    return FilePowerSource(source_dir) if source_dir else HttpPowerSource(NASA_POWER_URL)
+
+
+def create_geocode_cache():
+    # Resolved places are cached, so the API key is only needed for places not seen before
+    geocoder = OpenCageGeocoder(OPEN_CAGE_API_KEY, base_url=os.getenv('OPEN_CAGE_URL', OPEN_CAGE_URL),
+                                client=services.http_client)
+    return GeocodeCache(
+        geocoder,
+        async_geocoder=geocoder.acall,
+        path=os.getenv('GEOCODE_CACHE_PATH', DEFAULT_GEOCODE_CACHE_PATH),
+        ttl_seconds=float(os.getenv('GEOCODE_CACHE_TTL_SECONDS', str(30 * 24 * 3600))),
+        max_entries=int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '10000')),
+        flush_seconds=float(os.getenv('GEOCODE_CACHE_FLUSH_SECONDS', '5')))
+
+
+def create_model_registry():
+    # Fitted models are shared across requests and persisted so each worker loads them once
+    return ModelRegistry(
+        directory=os.getenv('MODEL_REGISTRY_DIR', DEFAULT_REGISTRY_DIR),
+        max_entries=int(os.getenv('MODEL_REGISTRY_MAX_ENTRIES', '256')),
+        max_disk_bytes=int(os.getenv('MODEL_REGISTRY_MAX_BYTES', str(512 * 1024 * 1024))))
+
+
+def create_model_trainer():
+    from api._lib.online_model import IncrementalTrainer
+
+    # How models follow newly arrived days: "forest" grows trees, "sgd" learns online,
+    # "refit" retrains from scratch on every change
+    return IncrementalTrainer(
+        mode=os.getenv('MODEL_UPDATE_MODE', 'forest'),
+        max_buffer_rows=int(os.getenv('MODEL_BUFFER_MAX_ROWS', '1095')),
+        refit_every=int(os.getenv('MODEL_REFIT_EVERY_UPDATES', '30')),
+        refit_interval=float(os.getenv('MODEL_REFIT_INTERVAL_SECONDS', str(7 * 24 * 3600))),
+        drift_tolerance=float(os.getenv('MODEL_DRIFT_TOLERANCE', '0.1')),
+        n_jobs=int(os.getenv('MODEL_FIT_N_JOBS', '1')))
+
+
+def create_training_jobs():
+    from api._lib.training_jobs import TrainingJobQueue
+
+    # Full fits run in worker processes, off the request threads; TRAINING_EXECUTOR=thread
+    # for runtimes that cannot start processes
+    workers = os.getenv('TRAINING_WORKERS')
+    return TrainingJobQueue(
+        max_workers=int(workers) if workers else None,
+        max_pending=int(os.getenv('TRAINING_MAX_PENDING', '64')),
+        use_processes=os.getenv('TRAINING_EXECUTOR', 'process') == 'process')
+
+
+def create_response_cache():
+    # Encoded chart responses, keyed by normalized parameters and dataset version
+    return ResponseCache(
+        max_entries=int(os.getenv('CHART_CACHE_MAX_ENTRIES', '512')),
+        max_bytes=int(os.getenv('CHART_CACHE_MAX_BYTES', str(64 * 1024 * 1024))))
+
+
+def load_rule_engine():
+    from api._lib.rules import RuleEngine
+
+    return RuleEngine.from_file(os.getenv('RECOMMENDATION_RULES_PATH'))
+
+
+def load_climatology(previous=None):
+    from api._lib.climatology import ClimatologyIndex
+
+    index = services.nasa_power_index
+    # Saved by the columnar store at ingest time; built from the frame when parsed from CSV,
+    # by appending the new days to ``previous`` (the index of the data before a reload) if given
+    path = index.frame.attrs.get("climatology")
+    if path and os.path.exists(path):
+        return ClimatologyIndex.load(path)
+    return ClimatologyIndex.from_frame(index.frame, index.date_column, index.location_column, previous=previous)
+
+
+def import_ml():
+    import pandas  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+    import sklearn.model_selection  # noqa: F401
+    return True
+
+
+services.register("http_client", create_http_client)
+services.register("nasa_power_index", load_nasa_power_index)
+services.register("nasa_cache", create_nasa_cache)
+services.register("geocode_cache", create_geocode_cache)
+services.register("model_registry", create_model_registry)
+services.register("model_trainer", create_model_trainer)
+services.register("training_jobs", create_training_jobs)
+services.register("response_cache", create_response_cache)
+services.register("rule_engine", load_rule_engine)
+services.register("climatology", load_climatology)
+services.register("ml", import_ml)
+if POWER_MIRROR_DIR:
+    services.register("power_mirror", create_power_mirror)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv('WARM_UP_ON_STARTUP') == '1':
+        await run_in_threadpool(services.warm_up)
+    scheduler = None
+    sync_interval = os.getenv('NASA_POWER_MIRROR_SYNC_SECONDS')
+    if POWER_MIRROR_DIR and sync_interval:
+        from api._lib.power_mirror import DEFAULT_START, MirrorScheduler
+
+        # Long-running servers only; serverless deployments sync with the CLI or /api/py/mirror/sync
+        scheduler = MirrorScheduler(services.power_mirror, power_mirror_source(), float(sync_interval),
+                                    start=os.getenv('NASA_POWER_MIRROR_START', DEFAULT_START))
+        scheduler.start()
+    yield
+    if scheduler is not None:
+        scheduler.stop()
+    http_client = services.get_if_initialized("http_client")
+    if http_client is not None:
+        await http_client.aclose()
+    training_jobs = services.get_if_initialized("training_jobs")
+    if training_jobs is not None:
+        training_jobs.shutdown()
+    geocode_cache = services.get_if_initialized("geocode_cache")
+    if geocode_cache is not None:
+        geocode_cache.close()
+
+
+app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json", lifespan=lifespan)
+# Profiles (per-stage timings in a Server-Timing header and the log) for a sample of requests,
+# and on demand with an X-Profile: 1 header where PROFILE_HEADER_ENABLED=1
+app.add_middleware(InstrumentationMiddleware,
+                   sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+                   header_enabled=os.getenv('PROFILE_HEADER_ENABLED') == '1')
+
+# Services whose snapshot() counters are exported as api_service_stat gauges
+STATS_SERVICES = ("nasa_cache", "geocode_cache", "model_registry", "training_jobs", "response_cache")
+
+
+def service_stats():
+    # Only services already built; a scrape never loads the dataset or starts the training pool
+    for name in STATS_SERVICES:
+        service = services.get_if_initialized(name)
+        if service is None:
+            continue
+        for stat, value in service.snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield (name, stat), value
+
+
+metrics.collector("api_service_stat", "Counters and sizes reported by the cache and training services",
+                  ("service", "stat"), service_stats)
+
 
 class CityInput(BaseModel):
     city_name: str
@@ -33,8 +249,65 @@ class CityInput(BaseModel):
     end_date: str
 
 
+class ColumnarHistory(BaseModel):
+    # One value per day for each parameter, null where missing
+    dates: Optional[List[Optional[str]]] = None
+    columns: Dict[str, List[Optional[float]]]
+
+
 class PredictionInput(BaseModel):
-    data: List[dict]
+    # Row records ([{"date": ..., "T2M": ...}, ...]) or a ColumnarHistory
+    data: Union[ColumnarHistory, List[dict]]
+    location: Optional[str] = None
+    window_days: Optional[int] = None
+
+
+# Validated straight from the body bytes, without an intermediate dict
+PREDICTION_INPUT = TypeAdapter(PredictionInput)
+HISTORY_DATA = TypeAdapter(Union[ColumnarHistory, List[dict]])
+
+# Bodies are read raw so binary histories can skip JSON; documented here instead
+BINARY_HISTORY_CONTENT = {
+    "application/msgpack": {"schema": {"type": "string", "format": "binary",
+                                       "description": '{"dates": [...], "columns": {name: float64 LE bytes or list}}'}},
+    "application/vnd.apache.arrow.stream": {"schema": {"type": "string", "format": "binary",
+                                                       "description": "date column plus numeric columns"}},
+}
+
+
+def inline_schema(adapter):
+    """JSON schema of ``adapter`` with its ``$defs`` substituted, for use inside the OpenAPI document."""
+    schema = adapter.json_schema()
+    defs = schema.pop("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+
+    return resolve(schema)
+
+
+PREDICTION_BODY_OPENAPI = {"requestBody": {"required": True, "content": {
+    "application/json": {"schema": inline_schema(PREDICTION_INPUT)}, **BINARY_HISTORY_CONTENT}}}
+HISTORY_BODY_OPENAPI = {"requestBody": {"required": True, "content": {
+    "application/json": {"schema": inline_schema(HISTORY_DATA)}, **BINARY_HISTORY_CONTENT}}}
+
+
+class FarmBatchInput(BaseModel):
+    # Defaults to the locations
+    ids: Optional[List[str]] = None
+    # Per farm, the location whose model scores it
+    locations: List[str]
+    # Latest value of each parameter, one per farm in the order of `locations`, null where missing
+    columns: Dict[str, List[Optional[float]]]
+    window_days: Optional[int] = None
+    # Model for farms whose location has none trained yet, e.g. a regional one
+    default_location: Optional[str] = None
 
 
 class UserInput(BaseModel):
@@ -46,125 +319,452 @@ class LocationInput(BaseModel):
     location: str
 
 
+class LocationBatchInput(BaseModel):
+    locations: List[str]
+
+
 class NASADataInput(BaseModel):
     lat: float
     lon: float
     start_date: str
     end_date: str
+    # Return newline-delimited JSON rows, one per day, as they are serialized
+    stream: bool = False
+
+
+class NASABatchInput(BaseModel):
+    points: List[NASADataInput]
+    max_concurrency: int = Field(default=8, ge=1, le=64)
+
+
+class ChartQuery(BaseModel):
+    # Query parameters of the GET chart and alert endpoints, whose responses clients may cache
+    start_date: str
+    end_date: str
+    columnar: bool = False
+    location: Optional[str] = None
+    # Either reduces the series: a calendar bucket ("day", "week", "month", "year") or "lttb",
+    # and/or a bound on the number of points per series
+    resolution: Optional[str] = None
+    max_points: Optional[int] = Field(default=None, ge=2)
+
+
+class ChartDataInput(NASADataInput, ChartQuery):
+    pass
+
+
+class NormalsInput(BaseModel):
+    location: Optional[str] = None
+    # Defaults to every parameter the climatology covers
+    parameters: Optional[List[str]] = None
+
+
+class ClimateRangeInput(NormalsInput):
+    start_date: str
+    end_date: str
+
+
+class RollingInput(ClimateRangeInput):
+    window: int = 30
+
+
+class FrequencyInput(BaseModel):
+    start_date: str
+    end_date: str
+    location: Optional[str] = None
+    bucket: str = "month"
 
 
 @app.get("/api/py/")
 def hello_fast_api():
-    print("GET /api/py/ endpoint hit")
+    logger.debug("GET /api/py/")
     return {"message": "Hello from FastAPI"}
 
 
 @app.post("/api/py/get_lat_lon")
 async def get_lat_lon(location: LocationInput):
-    if OPEN_CAGE_API_KEY is None:
-        raise HTTPException(status_code=500, detail="OpenCage API key is not configured")
-    print(
-        f"POST /api/py/get_lat_lon endpoint hit with location: {location.location}")
-    url = f"https://api.opencagedata.com/geocode/v1/json?q={
-        location.location}&key={OPEN_CAGE_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
-    if data['results']:
-        result = {
-            "lat": data['results'][0]['geometry']['lat'],
-            "lon": data['results'][0]['geometry']['lng']
-        }
-        print(f"Returning lat/lon: {result}")
+    logger.debug("POST /api/py/get_lat_lon", extra={"location": location.location})
+    if POWER_MIRROR_DIR:
+        # Registered farms resolve without the geocoder, so mirrored places work offline
+        farm = services.power_mirror.farm(location.location)
+        if farm is not None:
+            return {"lat": farm.lat, "lon": farm.lon}
+    try:
+        with stage("upstream"):
+            result = await services.geocode_cache.alookup(location.location)
+    except GeocoderNotConfigured as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except GeocoderError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if result is not None:
+        result = {"lat": result[0], "lon": result[1]}
         return result
     else:
-        print(f"Location not found for: {location.location}")
+        logger.info("Location not found", extra={"location": location.location})
         raise HTTPException(status_code=404, detail="Location not found")
 
 
+@app.post("/api/py/get_lat_lon_batch")
+async def get_lat_lon_batch(batch: LocationBatchInput):
+    logger.debug("POST /api/py/get_lat_lon_batch", extra={"locations": len(batch.locations)})
+    with stage("upstream"):
+        found = await services.geocode_cache.alookup_many(batch.locations)
+    results = []
+    for location, result in found.items():
+        if isinstance(result, Exception):
+            results.append({"location": location, "error": str(result)})
+        elif result is None:
+            results.append({"location": location, "error": "Location not found"})
+        else:
+            results.append({"location": location, "lat": result[0], "lon": result[1]})
+    return {"results": results}
+
+
+@app.get("/api/py/geocode_cache/stats")
+def get_geocode_cache_stats():
+    return services.geocode_cache.snapshot()
+
+
+NASA_POWER_PARAMETERS = ["T2M", "PRECTOTCORR", "RH2M", "WS2M", "ALLSKY_SFC_SW_DWN",
+                         "T2M_MAX", "T2M_MIN", "PS", "QV10M", "U10M", "V10M"]
+
+
+async def power_data(lat, lon, start_date, end_date):
+    """Daily POWER values for a point and, when they come from the local mirror, its freshness."""
+    if POWER_MIRROR_DIR:
+        from api._lib.power_mirror import MirrorBehind, NotMirrored, next_day
+
+        try:
+            with stage("mirror"):
+                return services.power_mirror.get(lat, lon, start_date, end_date, NASA_POWER_PARAMETERS,
+                                                 fill_tail=NASA_POWER_OFFLINE)
+        except MirrorBehind as e:
+            if e.last_day >= start_date:
+                # The mirror serves what it has; only the days after its last sync come from upstream
+                with stage("mirror"):
+                    head, freshness = services.power_mirror.get(lat, lon, start_date, e.last_day,
+                                                                NASA_POWER_PARAMETERS)
+                with stage("upstream"):
+                    tail = await services.nasa_cache.aget(lat, lon, next_day(e.last_day), end_date,
+                                                          NASA_POWER_PARAMETERS, community="AG")
+                return ({parameter: {**head[parameter], **tail[parameter]} for parameter in NASA_POWER_PARAMETERS},
+                        {**freshness, "upstream_from": next_day(e.last_day)})
+        except NotMirrored as e:
+            if NASA_POWER_OFFLINE:
+                raise HTTPException(status_code=404, detail=str(e))
+    elif NASA_POWER_OFFLINE:
+        raise HTTPException(status_code=503, detail="Offline, and no NASA POWER mirror is configured")
+    with stage("upstream"):
+        return await services.nasa_cache.aget(lat, lon, start_date, end_date, NASA_POWER_PARAMETERS,
+                                              community="AG"), None
+
+
+def freshness_headers(freshness):
+    if freshness is None:
+        return {}
+    headers = {"X-Mirror-Synced-At": freshness["synced_at"], "X-Mirror-Last-Day": freshness["last_day"]}
+    if "upstream_from" in freshness:
+        headers["X-Mirror-Upstream-From"] = freshness["upstream_from"]
+    return headers
+
+
 @app.post("/api/py/get_nasa_data")
-def get_nasa_data(nasa_input: NASADataInput):
-    print(f"POST /api/py/get_nasa_data endpoint hit with input: {nasa_input}")
-
-    params = {
-        "start": nasa_input.start_date,
-        "end": nasa_input.end_date,
-        "latitude": nasa_input.lat,
-        "longitude": nasa_input.lon,
-        "parameters": "T2M,PRECTOTCORR,RH2M,WS2M,ALLSKY_SFC_SW_DWN,T2M_MAX,T2M_MIN,PS,QV10M,U10M,V10M",
-        "community": "AG",
-        "format": "JSON"
-    }
+async def get_nasa_data(nasa_input: NASADataInput, response: Response):
+    logger.debug("POST /api/py/get_nasa_data %s", nasa_input)
+    try:
+        nasa_data, freshness = await power_data(nasa_input.lat, nasa_input.lon,
+                                                nasa_input.start_date, nasa_input.end_date)
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYYMMDD format")
+    headers = freshness_headers(freshness)
+    if nasa_input.stream:
+        return StreamingResponse(iter_parameter_ndjson(nasa_data), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    response.headers.update(headers)
+    return nasa_data
 
-    response = requests.get(NASA_POWER_URL, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        return data['properties']['parameter']
-    else:
-        raise HTTPException(status_code=response.status_code,
-                            detail=f"Error fetching data from NASA: {response.status_code}")
-
-
-@app.post("/api/py/train_model")
-def train_model(data: List[dict]):
-    print(
-        f"POST /api/py/train_model endpoint hit with {len(data)} data points")
-    df = pd.DataFrame(data)
-    df = df.dropna()
-    required_features = ['PRECTOTCORR', 'RH2M', 'WS2M', 'T2M_MAX',
-                         'T2M_MIN', 'PS', 'QV10M', 'U10M', 'V10M', 'ALLSKY_SFC_SW_DWN']
-    available_features = [
-        feature for feature in required_features if feature in df.columns]
+
+def batch_error_status(error):
+    if isinstance(error, HTTPException):
+        return error.status_code
+    if isinstance(error, UpstreamError):
+        return error.status_code
+    if isinstance(error, ValueError):
+        return 400
+    return 502
+
+
+@app.post("/api/py/get_nasa_data_batch")
+async def get_nasa_data_batch(batch: NASABatchInput):
+    logger.debug("POST /api/py/get_nasa_data_batch", extra={"points": len(batch.points)})
+
+    async def fetch(point):
+        return await power_data(point.lat, point.lon, point.start_date, point.end_date)
+
+    async def results():
+        async for indices, fetched, error in fan_out(batch.points, fetch, batch.max_concurrency):
+            for index in indices:
+                line = {"index": index, **batch.points[index].model_dump(exclude={"stream"})}
+                if error is None:
+                    line["data"], freshness = fetched
+                    if freshness is not None:
+                        line["freshness"] = freshness
+                elif isinstance(error, HTTPException):
+                    line["error"] = error.detail
+                    line["status_code"] = error.status_code
+                else:
+                    line["error"] = str(error) or type(error).__name__
+                    line["status_code"] = batch_error_status(error)
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/api/py/nasa_cache/stats")
+def get_nasa_cache_stats():
+    return services.nasa_cache.snapshot()
+
+
+def power_mirror():
+    if not POWER_MIRROR_DIR:
+        raise HTTPException(status_code=404, detail="No NASA POWER mirror is configured")
+    return services.power_mirror
+
+
+@app.get("/api/py/mirror/status")
+def get_mirror_status():
+    # Per farm: its grid cell and when it was synced, through which day
+    return power_mirror().status()
+
+
+@app.post("/api/py/mirror/sync")
+def sync_mirror(start_date: Optional[str] = None):
+    """Download the days missing from the mirror now; meant for cron triggers on serverless deployments."""
+    from api._lib.power_mirror import DEFAULT_START, SyncInProgress
+
+    mirror = power_mirror()
+    try:
+        return mirror.sync(power_mirror_source(),
+                           start=start_date or os.getenv('NASA_POWER_MIRROR_START', DEFAULT_START))
+    except SyncInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYYMMDD format")
+
+
+REQUIRED_FEATURES = ['PRECTOTCORR', 'RH2M', 'WS2M', 'T2M_MAX',
+                     'T2M_MIN', 'PS', 'QV10M', 'U10M', 'V10M', 'ALLSKY_SFC_SW_DWN']
+
+
+def update_model(result, df, available_features, ids):
+    from api._lib.online_model import training_arrays
+
+    with stage("frame"):
+        X, y = training_arrays(df, available_features)
+    return services.model_trainer.update(result, X.to_numpy(dtype=float), y.to_numpy(), [ids[i] for i in X.index])
+
+
+def get_available_features(columns):
+    return [feature for feature in REQUIRED_FEATURES if feature in columns]
+
+
+def model_key_for(location, window_days, available_features, fingerprint):
+    # Anonymous histories get a key of their own so unrelated callers never share a model
+    location = location or f"anonymous:{fingerprint}"
+    window = str(window_days) if window_days else "all"
+    return ModelKey(location, tuple(available_features), window)
+
+
+def registry_model(history, available_features, location=None, window_days=None):
+    """Registry entry for a history; known locations are updated with their new days
+    instead of refitting from scratch.
+
+    A cold miss does not wait for the fit: it is queued in the training pool,
+    stored in the registry when it finishes, and ``TrainingPending`` is raised.
+    """
+    from api._lib.training_jobs import fit_history
+
+    fingerprint = history.fingerprint()
+    key = model_key_for(location, window_days, available_features, fingerprint)
+    ids = history.row_ids()
+    job_key = f"{key.digest()}:{fingerprint}"
+    fit_args = (fit_history, services.model_trainer, history, available_features, ids, window_days)
+
+    def store(result):
+        services.model_registry.put(key, fingerprint, result, background=True)
+
+    def train():
+        # Concurrent misses on one history share a job
+        job, _ = services.training_jobs.submit(job_key, *fit_args, on_done=store)
+        return job.result_or_pending()
+
+    def refit():
+        # Background refreshes run off the request path, so they may wait for the pool
+        return services.training_jobs.run(job_key, *fit_args)
+
+    def update(entry):
+        with stage("fit"):
+            return update_model(entry.result, history.frame(), available_features, ids)
+
+    return services.model_registry.get_or_train(key, fingerprint, train, update=update, refit=refit)
+
+
+def queue_full(e):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def job_status_url(job):
+    return f"/api/py/train_jobs/{job.id}"
+
+
+@app.exception_handler(TrainingPending)
+def training_pending(request: Request, e: TrainingPending):
+    # The model is not fitted yet: poll the job, then repeat the request
+    status_url = job_status_url(e.job)
+    return JSONResponse({**e.job.describe(), "status_url": status_url}, status_code=202,
+                        headers={"Location": status_url, "Retry-After": str(services.training_jobs.retry_after())})
+
+
+@app.exception_handler(QueueFull)
+async def training_queue_full(request: Request, e: QueueFull):
+    # Raised by any endpoint that queues a fit, e.g. a cold miss in registry_model
+    return await http_exception_handler(request, queue_full(e))
+
+
+async def read_body(request: Request):
+    """Media type and raw bytes of the request body, parsed later off the event loop."""
+    media_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    return media_type, await request.body()
+
+
+def to_history(data):
+    from api._lib.history import History
+
+    try:
+        if isinstance(data, ColumnarHistory):
+            return History.from_columns(data.dates, data.columns)
+        return History.from_records(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def binary_history(media_type, content):
+    """The history in a msgpack or Arrow body, or None for any other media type."""
+    from api._lib.history import ARROW_MEDIA_TYPE, MSGPACK_MEDIA_TYPES, History, binary_format_available
+
+    if media_type not in MSGPACK_MEDIA_TYPES + (ARROW_MEDIA_TYPE,):
+        return None
+    if not binary_format_available(media_type):
+        raise HTTPException(status_code=415, detail=f"{media_type} bodies are not supported by this deployment")
+    try:
+        return History.from_arrow(content) if media_type == ARROW_MEDIA_TYPE else History.from_msgpack(content)
+    except Exception as e:
+        # Decoding errors of either library, or columns of different lengths
+        raise HTTPException(status_code=400, detail=f"Invalid {media_type} body: {e}")
+
+
+def validate_json(adapter, content):
+    try:
+        return adapter.validate_json(content)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+def history_request(body, location=None, window_days=None):
+    """``HistoryRequest`` from a ``PredictionInput`` JSON body, or from a binary
+    history with ``location`` and ``window_days`` given as query parameters."""
+    from api._lib.history import HistoryRequest
+
+    with stage("parse"):
+        history = binary_history(*body)
+        if history is not None:
+            return HistoryRequest(history, location, window_days)
+        prediction_input = validate_json(PREDICTION_INPUT, body[1])
+        return HistoryRequest(to_history(prediction_input.data), prediction_input.location,
+                              prediction_input.window_days)
+
+
+@app.post("/api/py/train_model", openapi_extra=HISTORY_BODY_OPENAPI)
+def train_model(body=Depends(read_body), location: Optional[str] = None):
+    """Fit on a history sent as the whole body: row records or columns as JSON, or msgpack / Arrow.
+
+    Answers 202 with the training job's status URL until the fit is done; the
+    fitted model is kept in the registry (under the history's fingerprint when
+    no location is given), so repeating the request then answers 200."""
+    from api._lib.training_jobs import summarize
+
+    with stage("parse"):
+        history = binary_history(*body)
+        if history is None:
+            history = to_history(validate_json(HISTORY_DATA, body[1]))
+    logger.debug("POST /api/py/train_model", extra={"rows": len(history), "location": location})
+    available_features = get_available_features(history.columns)
     if len(available_features) < 2:
-        print("Not enough features to train the model")
         raise HTTPException(
             status_code=400, detail="Not enough features to train the model")
-    X = df[available_features]
-    threshold_temp = 20
-    y = (df['T2M'] >= threshold_temp).astype(int)
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42)
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    report = classification_report(y_test, y_pred)
-    print(f"Model trained with accuracy: {accuracy}")
-    return {
-        "feature_importances": dict(zip(available_features, model.feature_importances_.tolist())),
-        "model": model,
-        "accuracy": accuracy,
-        "classification_report": report
-    }
+    result = registry_model(history, available_features, location).result
+    return summarize(result)
+
+
+@app.post("/api/py/train_jobs", status_code=202, openapi_extra=PREDICTION_BODY_OPENAPI)
+def submit_training_job(body=Depends(read_body), location: Optional[str] = None,
+                        window_days: Optional[int] = None):
+    """Queue a full fit and return at once; poll /api/py/train_jobs/{job_id} for the result.
+    Fits for a location are stored in the model registry when they finish."""
+    from api._lib.training_jobs import fit_history
+
+    request = history_request(body, location, window_days)
+    history = request.window()
+    available_features = get_available_features(history.columns)
+    if len(available_features) < 2:
+        raise HTTPException(status_code=400, detail="Not enough features to train the model")
+    fingerprint = history.fingerprint()
+    key = model_key_for(request.location, request.window_days, available_features, fingerprint)
+    store = None
+    if request.location:
+        def store(result):
+            services.model_registry.put(key, fingerprint, result, background=True)
+    job, created = services.training_jobs.submit(f"{key.digest()}:{fingerprint}", fit_history,
+                                                 services.model_trainer, history, available_features,
+                                                 history.row_ids(), request.window_days, on_done=store)
+    return {**job.describe(), "status_url": job_status_url(job), "deduplicated": not created}
+
+
+@app.get("/api/py/train_jobs/{job_id}")
+def get_training_job(job_id: str):
+    job = services.training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown training job")
+    return job.describe()
+
+
+@app.get("/api/py/train_jobs")
+def get_training_queue_stats():
+    return services.training_jobs.snapshot()
 
 
-@app.post("/api/py/generate_recommendations")
-def generate_recommendations(prediction_input: PredictionInput):
-    print(f"POST /api/py/generate_recommendations endpoint hit with {
-          len(prediction_input.data)} data points")
-    df = pd.DataFrame(prediction_input.data)
-    model_result = train_model(prediction_input.data)
-    model = model_result["model"]
-    latest_data = df.iloc[-1]
-    required_features = ['PRECTOTCORR', 'RH2M', 'WS2M', 'T2M_MAX',
-                         'T2M_MIN', 'PS', 'QV10M', 'U10M', 'V10M', 'ALLSKY_SFC_SW_DWN']
-    available_features = [
-        feature for feature in required_features if feature in df.columns]
+@app.post("/api/py/generate_recommendations", openapi_extra=PREDICTION_BODY_OPENAPI)
+def generate_recommendations(body=Depends(read_body), location: Optional[str] = None,
+                             window_days: Optional[int] = None):
+    return recommend(history_request(body, location, window_days))
+
+
+def recommend(request):
+    history = request.window()
+    logger.debug("generate_recommendations", extra={"rows": len(history), "location": request.location})
+    available_features = get_available_features(history.columns)
     if len(available_features) < 2:
-        print("Not enough features to generate recommendations")
         raise HTTPException(
             status_code=400, detail="Not enough features to generate recommendations")
-    X_latest = latest_data[available_features].values.reshape(1, -1)
-    predicted_condition = model.predict(X_latest)[0]
-    recommendations = []
-    if predicted_condition == 0:
-        recommendations = [
-            wind_speed_recommendations(latest_data['WS2M'] * 3.6),
-            humidity_recommendations(latest_data['RH2M']),
-            solar_radiation_recommendations(latest_data['ALLSKY_SFC_SW_DWN']),
-            precipitation_recommendations(latest_data['PRECTOTCORR']),
-            temperature_recommendations(latest_data['T2M_MAX'])
-        ]
-    print(f"Generated recommendations: {recommendations}")
+    entry = registry_model(history, available_features, request.location, request.window_days)
+    model_result = entry.result
+    with stage("predict"):
+        predicted_condition = model_result["predictor"].predict(history.latest(available_features))[0]
+        recommendations = []
+        if predicted_condition == 0:
+            latest_messages = services.rule_engine.messages_for_frame(history.tail(1).columns)
+            recommendations = [str(messages[0]) for messages in latest_messages.values()]
     return {
         "predicted_condition": "favorable" if predicted_condition == 1 else "unfavorable",
         "recommendations": recommendations,
@@ -174,19 +774,72 @@ def generate_recommendations(prediction_input: PredictionInput):
     }
 
 
+@app.get("/api/py/metrics")
+def get_metrics():
+    # Prometheus text exposition format
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/api/py/score_farms")
+def score_farms(batch_input: FarmBatchInput):
+    """Predicted condition and recommendations for many farms from their latest values.
+
+    Farms are scored with the models already trained for their locations (see
+    generate_recommendations); nothing is trained here. Farms sharing a model
+    are predicted together in one call.
+    """
+    from api._lib.batch_scoring import FarmBatch, score_batch
+
+    logger.debug("POST /api/py/score_farms", extra={"farms": len(batch_input.locations)})
+    with stage("parse"):
+        try:
+            batch = FarmBatch.from_columns(batch_input.ids, batch_input.locations, batch_input.columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    available_features = get_available_features(batch.columns)
+    if len(available_features) < 2:
+        raise HTTPException(status_code=400, detail="Not enough features to score the farms")
+
+    def model_for(location):
+        # Same key as the model generate_recommendations keeps for this location
+        entry = services.model_registry.latest(
+            model_key_for(location, batch_input.window_days, available_features, None))
+        return None if entry is None else entry.result
+
+    with stage("predict"):
+        scores = score_batch(batch, available_features, model_for, services.rule_engine,
+                             batch_input.default_location)
+    # Encoded directly: jsonable_encoder would walk every per-farm value
+    with stage("serialize"):
+        return Response(encode_json(scores), media_type="application/json")
+
+
+@app.get("/api/py/warmup")
+async def warm_up():
+    # Builds every lazily initialized service; point a cron or deploy hook here
+    return {"initialized": await run_in_threadpool(services.warm_up)}
+
+
+@app.get("/api/py/model_registry/stats")
+def get_model_registry_stats():
+    return services.model_registry.snapshot()
+
+
 @app.post("/api/py/")
 async def process_user_input(user_input: UserInput = Body(...)):
-    print(f"POST /api/py/ endpoint hit with user input: {user_input}")
+    from api._lib.history import History, HistoryRequest
+
+    logger.debug("POST /api/py/ %s", user_input)
     try:
         city_input = CityInput(city_name=user_input.location, start_date=(datetime.now(
         ) - timedelta(days=30)).strftime("%Y%m%d"), end_date=datetime.now().strftime("%Y%m%d"))
-        lat_lon = get_lat_lon(LocationInput(location=user_input.location))
-        nasa_data = get_nasa_data(NASADataInput(
-            start_date=city_input.start_date, end_date=city_input.end_date))
-        recommendations = generate_recommendations(
-            PredictionInput(data=nasa_data))
-        message = f"Hello {user_input.name}! Here are your personalized crop care recommendations for {
-            user_input.location}:\n\n"
+        lat_lon = await get_lat_lon(LocationInput(location=user_input.location))
+        nasa_data, _ = await power_data(lat_lon["lat"], lat_lon["lon"], city_input.start_date, city_input.end_date)
+        # Model fitting is CPU bound, keep it off the event loop
+        recommendations = await run_in_threadpool(
+            recommend, HistoryRequest(History.from_parameters(nasa_data), user_input.location))
+        message = (f"Hello {user_input.name}! Here are your personalized crop care recommendations for "
+                   f"{user_input.location}:\n\n")
         if recommendations["predicted_condition"] == "favorable":
             message += "The current conditions are favorable for your crops. "
         else:
@@ -194,154 +847,275 @@ async def process_user_input(user_input: UserInput = Body(...)):
         message += "Here are some specific recommendations:\n\n"
         for rec in recommendations["recommendations"]:
             message += f"- {rec}\n"
-        print(f"Returning recommendations for {
-              user_input.name} in {user_input.location}")
         return {"message": message}
+    except (TrainingPending, QueueFull, HTTPException):
+        # Answered by their own handlers: 202 with the job to poll, 429, or the status raised
+        raise
     except Exception as e:
-        print(f"Error processing user input: {str(e)}")
+        logger.exception("Error processing user input", extra={"location": user_input.location})
         raise HTTPException(status_code=500, detail=str(e))
 
-# Helper functions for recommendations
+# Helper functions for recommendations; the thresholds live in api/_lib/recommendation_rules.json
 
 
 def wind_speed_recommendations(wind_speed):
-    print(f"Generating wind speed recommendation for {wind_speed} km/h")
-    wind_speed = wind_speed * 3.6  # Convert from m/s to km/h
-    if 0 <= wind_speed < 50:
-        return "Light to moderate wind speed: Monitor for light erosion and protect sensitive crops."
-    elif 50 <= wind_speed < 60:
-        return "Moderate to strong wind speed: Check for damage and use windbreaks."
-    elif 70 <= wind_speed < 90:
-        return "Strong wind speed: Expect crop damage. Take immediate action to secure plants."
-    elif wind_speed >= 100:
-        return "Extreme wind speed: Prepare for significant erosion and evacuate at-risk crops."
-    elif 120 <= wind_speed <= 250:
-        return "Very extreme: Catastrophic damage possible. Take emergency measures and evacuate."
-    else:
-        return "Please enter a valid wind speed."
+    return services.rule_engine.evaluate("wind_speed", wind_speed)
 
 
 def humidity_recommendations(relative_humidity):
-    print(f"Generating humidity recommendation for {relative_humidity}%")
-    if relative_humidity == 100:
-        return "Extreme humidity: Expect soil saturation and possible flooding. Monitor for soil erosion and root rot."
-    elif 80 < relative_humidity < 100:
-        return "High humidity: Significant moisture retention may lead to fungal growth. Improve drainage and monitor plants."
-    elif 50 <= relative_humidity <= 80:
-        return "Moderate humidity: Generally favorable for growth. Maintain regular watering and check soil moisture."
-    elif relative_humidity < 50:
-        return "Low humidity: Soil moisture may evaporate quickly. Increase irrigation to support crop growth."
-    else:
-        return "Please enter a valid relative humidity percentage."
+    return services.rule_engine.evaluate("humidity", relative_humidity)
 
 
 def solar_radiation_recommendations(solar_irradiance):
-    print(f"Generating solar radiation recommendation for {
-          solar_irradiance} W/m^2")
-    if solar_irradiance >= 1000:
-        return "Extreme radiation: High temperatures expected. Increase irrigation and provide shade."
-    elif 900 <= solar_irradiance < 1000:
-        return "High radiation: Monitor soil moisture and water crops adequately."
-    elif 700 <= solar_irradiance < 900:
-        return "Moderate radiation: Suitable for growth. Regularly irrigate and check for heat stress."
-    elif solar_irradiance < 700:
-        return "Low radiation: Ensure adequate sunlight and consider supplemental lighting."
-    else:
-        return "Enter a valid solar irradiance value."
+    return services.rule_engine.evaluate("solar_radiation", solar_irradiance)
 
 
 def precipitation_recommendations(precipitation_rate):
-    print(f"Generating precipitation recommendation for {
-          precipitation_rate} mm/hr")
-    if precipitation_rate > 2:
-        return "Extreme precipitation: Rapid erosion and waterlogging expected. Manage drainage to prevent flooding."
-    elif 1 <= precipitation_rate <= 2:
-        return "High precipitation: Risk of flash flooding. Monitor drainage and prepare for runoff."
-    elif 0.5 <= precipitation_rate < 1:
-        return "Moderate precipitation: Monitor soil saturation and prepare for localized flooding."
-    elif precipitation_rate < 0.5:
-        return "Low precipitation: Favorable for planting. Consider irrigation if moisture drops."
-    else:
-        return "Enter a valid precipitation rate."
+    return services.rule_engine.evaluate("precipitation", precipitation_rate)
 
 
 def temperature_recommendations(temperature):
-    print(f"Generating temperature recommendation for {temperature}°C")
-    if temperature > 70:
-        return "Extreme: High risk of land degradation. Increase irrigation and provide shade."
-    elif 60 < temperature <= 70:
-        return "High: Expect rapid soil drying. Monitor moisture and reduce water loss."
-    elif 50 < temperature <= 60:
-        return "Very high: Soil may crack. Increase irrigation and consider mulching."
-    elif 40 < temperature <= 50:
-        return "High: Increased evaporation. Monitor for water stress and adjust watering."
-    elif temperature <= 40:
-        return "Moderate: Generally manageable for growth. Continue regular irrigation."
-    else:
-        return "Enter a valid temperature value."
+    return services.rule_engine.evaluate("temperature", temperature)
 
 
-@app.post("/api/py/get_chart_data")
-def get_chart_data(nasa_input: NASADataInput):
-    print(f"POST /api/py/get_chart_data endpoint hit with input: {nasa_input}")
+@app.post("/api/py/get_alert_series")
+def get_alert_series(nasa_input: ChartDataInput, request: Request):
+    logger.debug("POST /api/py/get_alert_series %s", nasa_input)
+    return alert_series(nasa_input, request)
+
+
+@app.get("/api/py/get_alert_series")
+def get_alert_series_query(chart_query: Annotated[ChartQuery, Query()], request: Request):
+    """Alert series as with POST, from query parameters; revalidated with ``If-None-Match``."""
+    logger.debug("GET /api/py/get_alert_series %s", chart_query)
+    return alert_series(chart_query, request)
+
+
+def alert_series(chart_query: ChartQuery, request: Request):
+    def build():
+        filtered_data = chart_range(chart_query)
+        engine = services.rule_engine
+        with stage("predict"):
+            codes = engine.codes_for_frame(filtered_data)
+        # Per-day rule indices plus the message table, rather than repeating long strings per day
+        with stage("serialize"):
+            return {
+                "dates": filtered_data['date'].dt.strftime("%Y-%m-%d").tolist(),
+                "alerts": {name: values.tolist() for name, values in codes.items()},
+                "messages": engine.legend(),
+            }
+
+    params = chart_params(chart_query)
+    return cached_response(request, "alert_series", {"start": params["start"], "end": params["end"],
+                                                     "location": params["location"]}, build)
+
+
+def chart_params(nasa_input: ChartQuery) -> dict:
+    """The parameters that determine a chart response, normalized for cache keys."""
+    from api._lib.frame_index import DEFAULT_LOCATION, parse_date_range
+
+    try:
+        start, end = parse_date_range(nasa_input.start_date, nasa_input.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "start": str(start.astype("datetime64[D]")),
+        "end": str(end.astype("datetime64[D]")),
+        "location": nasa_input.location or DEFAULT_LOCATION,
+        "columnar": nasa_input.columnar,
+        "resolution": nasa_input.resolution,
+        "max_points": nasa_input.max_points,
+    }
+
+
+def cached_response(request: Request, endpoint: str, params: dict, build):
+    """``build()`` as a JSON response, answered from the response cache.
+
+    GET responses carry an ETag and are answered 304 when the client already
+    has them; POST responses are not cached by clients, so they get neither.
+    """
+    cache = services.response_cache
+    version = services.nasa_power_index.version
+    key = cache.key(endpoint, params, version)
+    headers = {}
+    if request.method == "GET":
+        headers = {"ETag": f'"{key}"', "Cache-Control": CHART_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            cache.not_modified()
+            return Response(status_code=304, headers=headers)
+
+    def encode(content):
+        with stage("serialize"):
+            return encode_json(content)
+
+    body = cache.get_or_build(key, version, build, encode=encode)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def chart_range(nasa_input: ChartQuery):
+    from api._lib.frame_index import parse_date_range
 
-    # Filter the data based on the input date range
-    mask = (nasa_power_df['date'] >= nasa_input.start_date) & (nasa_power_df['date'] <= nasa_input.end_date)
-    filtered_data = nasa_power_df.loc[mask]
+    try:
+        start, end = parse_date_range(nasa_input.start_date, nasa_input.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("frame"):
+        filtered_data = services.nasa_power_index.slice(start, end, nasa_input.location)
 
     if filtered_data.empty:
         raise HTTPException(status_code=404, detail="No data found for the specified date range")
+    return filtered_data
+
+
+def downsampled_chart_data(filtered_data, nasa_input: ChartQuery):
+    from api._lib.downsample import RESOLUTIONS
 
-    temperature_data = process_temperature_data(filtered_data)
-    precipitation_data = process_precipitation_data(filtered_data)
-    wind_speed_data = process_wind_speed_data(filtered_data)
-    solar_radiation_data = process_solar_radiation_data(filtered_data)
+    if nasa_input.resolution is not None and nasa_input.resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Resolution must be one of {list(RESOLUTIONS)}")
+    # Bounded in size, so never streamed
+    try:
+        with stage("serialize"):
+            return build_downsampled_chart_data(filtered_data, nasa_input.resolution, nasa_input.max_points,
+                                                columnar=nasa_input.columnar)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/py/get_chart_data")
+def get_chart_data(nasa_input: ChartDataInput, request: Request):
+    logger.debug("POST /api/py/get_chart_data %s", nasa_input)
 
+    downsampled = nasa_input.resolution is not None or nasa_input.max_points is not None
+    if nasa_input.stream and not downsampled:
+        return StreamingResponse(iter_chart_ndjson(chart_range(nasa_input)), media_type=NDJSON_MEDIA_TYPE)
+    return chart_data(nasa_input, request)
+
+
+@app.get("/api/py/get_chart_data")
+def get_chart_data_query(chart_query: Annotated[ChartQuery, Query()], request: Request):
+    """Chart series as with POST, from query parameters; revalidated with ``If-None-Match``."""
+    logger.debug("GET /api/py/get_chart_data %s", chart_query)
+    return chart_data(chart_query, request)
+
+
+def chart_data(chart_query: ChartQuery, request: Request):
+    downsampled = chart_query.resolution is not None or chart_query.max_points is not None
+
+    def build():
+        filtered_data = chart_range(chart_query)
+        if downsampled:
+            return downsampled_chart_data(filtered_data, chart_query)
+        with stage("serialize"):
+            return build_chart_data(filtered_data, columnar=chart_query.columnar)
+
+    return cached_response(request, "chart_data", chart_params(chart_query), build)
+
+
+@app.get("/api/py/response_cache/stats")
+def get_response_cache_stats():
+    return services.response_cache.snapshot()
+
+
+@app.post("/api/py/reload_dataset")
+def reload_dataset():
+    # Cached responses carry the dataset version, so they are dropped once the new data is seen
+    previous = services.get_if_initialized("climatology")
+    services.reset("nasa_power_index", "climatology")
+    if previous is not None:
+        # New days are appended to the climatology already built instead of rebuilding it
+        services.put("climatology", load_climatology(previous))
+    return {"version": services.nasa_power_index.version}
+
+
+def location_climate(location):
+    climate = services.climatology.get(location)
+    if climate is None:
+        raise HTTPException(status_code=404, detail=f"No climatology for location {location or 'default'}")
+    return climate
+
+
+def climate_parameters(climate, parameters):
+    unknown = sorted(set(parameters or ()) - set(climate.parameters))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"No climatology for parameters {unknown}")
+    return parameters or climate.parameters
+
+
+def climate_range(climate_input):
+    from api._lib.frame_index import parse_date_range
+
+    try:
+        start, end = parse_date_range(climate_input.start_date, climate_input.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    climate = location_climate(climate_input.location)
+    days = climate.dates(start, end)
+    if not len(days):
+        raise HTTPException(status_code=404, detail="No data found for the specified date range")
+    return climate, start, end, days
+
+
+@app.post("/api/py/climatology")
+def get_climatology(normals_input: NormalsInput):
+    from api._lib.downsample import json_values
+
+    logger.debug("POST /api/py/climatology %s", normals_input)
+    climate = location_climate(normals_input.location)
+    # One value per day of year, February 29 included (index 59)
     return {
-        "temperature": temperature_data,
-        "precipitation": precipitation_data,
-        "windSpeed": wind_speed_data,
-        "solarRadiation": solar_radiation_data
+        name: {stat: json_values(values) for stat, values in climate.normals(name).items()}
+        for name in climate_parameters(climate, normals_input.parameters)
     }
 
 
-def process_temperature_data(df):
-    return [
-        {
-            "date": row['date'].strftime("%Y-%m-%d"),
-            "min": row['T2M_MIN'],
-            "max": row['T2M_MAX'],
-            "avg": row['T2M']
-        }
-        for _, row in df.iterrows()
-    ]
-
-
-def process_precipitation_data(df):
-    return [
-        {
-            "date": row['date'].strftime("%Y-%m-%d"),
-            "value": row['PRECTOTCORR']
-        }
-        for _, row in df.iterrows()
-    ]
-
-
-def process_wind_speed_data(df):
-    return [
-        {
-            "date": row['date'].strftime("%Y-%m-%d"),
-            "value": row['WS2M']
-        }
-        for _, row in df.iterrows()
-    ]
-
-
-def process_solar_radiation_data(df):
-    return [
-        {
-            "date": row['date'].strftime("%Y-%m-%d"),
-            "value": row['ALLSKY_SFC_SW_DWN']
-        }
-        for _, row in df.iterrows()
-    ]
\ No newline at end of file
+@app.post("/api/py/get_anomalies")
+def get_anomalies(climate_input: ClimateRangeInput):
+    from api._lib.climatology import labels
+    from api._lib.downsample import json_values
+
+    logger.debug("POST /api/py/get_anomalies %s", climate_input)
+    climate, start, end, days = climate_range(climate_input)
+    anomalies = {}
+    for name in climate_parameters(climate, climate_input.parameters):
+        columns = climate.anomalies(name, start, end)
+        band = columns.pop("band")
+        anomalies[name] = {**{key: json_values(values) for key, values in columns.items()},
+                           "band": band.tolist()}
+    return {"dates": labels(days), "anomalies": anomalies}
+
+
+@app.post("/api/py/get_rolling")
+def get_rolling(rolling_input: RollingInput):
+    from api._lib.climatology import ROLLING_WINDOWS, labels
+    from api._lib.downsample import json_values
+
+    logger.debug("POST /api/py/get_rolling %s", rolling_input)
+    if rolling_input.window not in ROLLING_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Window must be one of {list(ROLLING_WINDOWS)} days")
+    climate, start, end, days = climate_range(rolling_input)
+    rolling = {}
+    for name in climate_parameters(climate, rolling_input.parameters):
+        columns = climate.rolling(name, rolling_input.window, start, end)
+        rolling[name] = {"value": json_values(columns["value"]), "days": columns["days"].tolist()}
+    return {"dates": labels(days), "window": rolling_input.window, "rolling": rolling}
+
+
+@app.post("/api/py/get_precipitation_frequency")
+def get_precipitation_frequency(frequency_input: FrequencyInput):
+    from api._lib.climatology import BUCKETS, PRECIPITATION, labels
+    from api._lib.downsample import json_values
+
+    logger.debug("POST /api/py/get_precipitation_frequency %s", frequency_input)
+    if frequency_input.bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Bucket must be one of {list(BUCKETS)}")
+    climate, start, end, _ = climate_range(frequency_input)
+    climate_parameters(climate, [PRECIPITATION])
+    # Counts of days with PRECTOTCORR above zero, as on the precipitation frequency chart
+    frequency = climate.frequency(start, end, frequency_input.bucket)
+    return {
+        "periods": labels(frequency["periods"]),
+        "rain_days": frequency["rain_days"].tolist(),
+        "days": frequency["days"].tolist(),
+        "precipitation": json_values(frequency["precipitation"]),
+    }
@@ -5,6 +5,7 @@ import { useRouter } from "next/navigation";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardFooter } from "@/components/ui/card";
 import { cn } from "@/lib/utils";
+import { fetchAlertSeries, latestAlerts } from "@/lib/chart-data";
 import { DateRangePicker } from "@/components/date-range-picker";
 import { DateRange } from "react-day-picker";
 import { format } from "date-fns";
@@ -13,6 +14,8 @@ export default function Home() {
   const [farmerName, setFarmerName] = useState("");
   const [dateRange, setDateRange] = useState<DateRange | undefined>();
   const [nasaData, setNasaData] = useState(null);
+  // Messages for the last day of the selected range, by metric
+  const [alerts, setAlerts] = useState<Record<string, string>>({});
   const router = useRouter();
 
   useEffect(() => {
@@ -29,6 +32,13 @@ export default function Home() {
   const fetchNASAData = async () => {
     if (!dateRange?.from || !dateRange?.to) return;
 
+    fetchAlertSeries({
+      startDate: format(dateRange.from, "yyyyMMdd"),
+      endDate: format(dateRange.to, "yyyyMMdd"),
+    })
+      .then((series) => setAlerts(latestAlerts(series)))
+      .catch((error) => console.error("Error fetching alerts:", error));
+
     const lat = localStorage.getItem("farmerLat");
     const lon = localStorage.getItem("farmerLon");
 
@@ -84,28 +94,40 @@ export default function Home() {
           <ColoredAlert
             icon={WindIcon}
             title="Wind Speed"
-            message="Moderate to strong wind speed: Check for damage and use windbreaks."
+            message={
+              alerts.wind_speed ??
+              "Moderate to strong wind speed: Check for damage and use windbreaks."
+            }
             severity="warning"
           />
 
           <ColoredAlert
             icon={HumidityIcon}
             title="Humidity"
-            message="Moderate humidity: Generally favorable for growth. Maintain regular watering and check soil moisture."
+            message={
+              alerts.humidity ??
+              "Moderate humidity: Generally favorable for growth. Maintain regular watering and check soil moisture."
+            }
             severity="success"
           />
 
           <ColoredAlert
             icon={SunIcon}
             title="Solar Radiation"
-            message="High radiation: Monitor soil moisture and water crops adequately."
+            message={
+              alerts.solar_radiation ??
+              "High radiation: Monitor soil moisture and water crops adequately."
+            }
             severity="warning"
           />
 
           <ColoredAlert
             icon={TemperatureIcon}
             title="Temperature"
-            message="High: Increased evaporation. Monitor for water stress and adjust watering."
+            message={
+              alerts.temperature ??
+              "High: Increased evaporation. Monitor for water stress and adjust watering."
+            }
             severity="warning"
           />
         </div>
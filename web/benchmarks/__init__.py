@@ -0,0 +1 @@
+"""Micro-benchmarks for the API hot paths. Run from ``web/`` with ``python -m benchmarks.<name>``."""
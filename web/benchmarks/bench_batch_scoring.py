@@ -0,0 +1,92 @@
+"""Farms scored per second by the batch scoring endpoint.
+
+Registers one fitted forest under ``--models`` locations, then scores batches
+of farms spread evenly over those locations three ways:
+
+* ``per-farm``: one predict and one rule evaluation per farm, as N
+  ``generate_recommendations`` calls do once their model is cached;
+* ``batched``: ``score_batch`` in-process, one predict per model;
+* ``endpoint``: POST /api/py/score_farms through the test client, JSON
+  parsing and encoding included.
+
+A request runs on one core, so farms/s is per core.
+
+    python -m benchmarks.bench_batch_scoring --farms 100 1000 10000 --models 1 10 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_flat_predict import best_of
+from benchmarks.bench_incremental_training import synthetic_rows
+from benchmarks.bench_training_throughput import FEATURES
+
+
+# Per-farm scoring is slow; larger batches only run the batched paths
+MAX_PER_FARM = 2000
+
+
+def farm_columns(rows: list, farms: int) -> dict:
+    rng = np.random.default_rng(3)
+    picked = rng.integers(0, len(rows), farms)
+    return {name: [rows[i][name] for i in picked] for name in FEATURES + ["T2M"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--farms", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--models", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--days", type=int, default=1500, help="history the forest is fitted on")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["MODEL_REGISTRY_DIR"] = workdir
+        from fastapi.testclient import TestClient
+
+        from api._lib.batch_scoring import FarmBatch, score_batch
+        from api._lib.online_model import IncrementalTrainer
+        import api.index as api
+
+        rows = synthetic_rows(args.days)
+        result = IncrementalTrainer(mode="forest").fit(pd.DataFrame(rows), FEATURES)
+        registry, engine = api.services.model_registry, api.services.rule_engine
+        for model in range(max(args.models)):
+            registry.put(api.model_key_for(f"region-{model}", None, FEATURES, None), "bench", result)
+        print(f"{os.cpu_count()} cpus; forest of {len(result['predictor'].roots)} trees")
+        print(f"{'farms':>6s} {'models':>6s} {'per-farm/s':>11s} {'batched/s':>11s} {'endpoint/s':>11s}")
+
+        client = TestClient(api.app)
+        for farms in args.farms:
+            columns = farm_columns(rows, farms)
+            for models in args.models:
+                locations = [f"region-{i % models}" for i in range(farms)]
+                batch = FarmBatch.from_columns(None, locations, columns)
+
+                def model_for(location):
+                    return registry.latest(api.model_key_for(location, None, FEATURES, None)).result
+
+                def per_farm():
+                    X = np.column_stack([batch.columns[name] for name in FEATURES])
+                    for i, location in enumerate(locations):
+                        model_for(location)["predictor"].predict(X[i:i + 1])
+                        engine.codes_for_frame({name: values[i:i + 1] for name, values in batch.columns.items()})
+
+                body = {"locations": locations, "columns": columns}
+
+                def endpoint():
+                    response = client.post("/api/py/score_farms", json=body)
+                    assert response.status_code == 200, response.text
+
+                per_farm_rate = farms / best_of(per_farm, args.runs) if farms <= MAX_PER_FARM else float("nan")
+                batched_rate = farms / best_of(lambda: score_batch(batch, FEATURES, model_for, engine), args.runs)
+                endpoint_rate = farms / best_of(endpoint, args.runs)
+                print(f"{farms:6d} {models:6d} {per_farm_rate:11.0f} {batched_rate:11.0f} {endpoint_rate:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare the columnar chart serializer with the previous per-series iterrows path.
+
+    python -m benchmarks.bench_chart_data --years 1 5 20
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from api._lib.chart_data import build_chart_data
+
+
+def synthetic_frame(days: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    frame = pd.DataFrame({
+        column: rng.normal(10, 5, days).round(2)
+        for column in ["T2M", "T2M_MIN", "T2M_MAX", "PRECTOTCORR", "WS2M", "ALLSKY_SFC_SW_DWN"]
+    })
+    frame.insert(0, "date", pd.date_range("2000-01-01", periods=days, freq="D"))
+    return frame
+
+
+def legacy_chart_data(df) -> dict:
+    """The four ``iterrows`` passes ``get_chart_data`` used before."""
+    return {
+        "temperature": [
+            {"date": row['date'].strftime("%Y-%m-%d"), "min": row['T2M_MIN'],
+             "max": row['T2M_MAX'], "avg": row['T2M']}
+            for _, row in df.iterrows()
+        ],
+        "precipitation": [
+            {"date": row['date'].strftime("%Y-%m-%d"), "value": row['PRECTOTCORR']}
+            for _, row in df.iterrows()
+        ],
+        "windSpeed": [
+            {"date": row['date'].strftime("%Y-%m-%d"), "value": row['WS2M']}
+            for _, row in df.iterrows()
+        ],
+        "solarRadiation": [
+            {"date": row['date'].strftime("%Y-%m-%d"), "value": row['ALLSKY_SFC_SW_DWN']}
+            for _, row in df.iterrows()
+        ],
+    }
+
+
+def measure(build, df, repeat: int):
+    best = float("inf")
+    payload = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = json.dumps(build(df)).encode("utf-8")
+        best = min(best, time.perf_counter() - started)
+    return best, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = {
+        "iterrows": legacy_chart_data,
+        "records": lambda df: build_chart_data(df),
+        "columnar": lambda df: build_chart_data(df, columnar=True),
+    }
+    print(f"{'years':>5} {'path':>9} {'ms':>9} {'bytes':>10}")
+    for years in args.years:
+        df = synthetic_frame(years * 365)
+        for name, build in paths.items():
+            seconds, size = measure(build, df, args.repeat)
+            print(f"{years:>5} {name:>9} {seconds * 1000:>9.2f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Anomaly, rolling and frequency queries: index lookups against per-request scans.
+
+Builds the climatology of a synthetic history of ``--years`` years, then times
+one year of each query answered from the index and computed from the raw frame
+with pandas (as an endpoint would without the index), and appending one day.
+
+    python -m benchmarks.bench_climatology --years 40
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from api._lib.climatology import ClimatologyIndex, day_of_year
+from benchmarks.bench_incremental_training import synthetic_rows
+
+
+def best_of(call, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def scan_anomalies(df: pd.DataFrame, start, end):
+    # The normal of each requested day from every year's days within a week of it
+    days = df[(df.date >= start) & (df.date <= end)]
+    slots = day_of_year(df.date.to_numpy())
+    normals = []
+    for slot in day_of_year(days.date.to_numpy()):
+        distance = np.abs(slots - slot)
+        normals.append(df.T2M[np.minimum(distance, 366 - distance) <= 7].mean())
+    return days.T2M.to_numpy() - np.array(normals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    df = pd.DataFrame(synthetic_rows(args.years * 365))
+    df["date"] = pd.to_datetime(df["date"])
+    df["PRECTOTCORR"] = np.maximum(df["PRECTOTCORR"] - 10, 0)
+    started = time.perf_counter()
+    index = ClimatologyIndex.from_frame(df)
+    print(f"{len(df)} days, index built in {time.perf_counter() - started:.2f} s")
+
+    climate = index.get(None)
+    start, end = df.date.iloc[-365].to_datetime64(), df.date.iloc[-1].to_datetime64()
+    series = df.set_index("date")
+    queries = {
+        "anomalies": (lambda: climate.anomalies("T2M", start, end),
+                      lambda: scan_anomalies(df, start, end)),
+        "rolling 30d": (lambda: climate.rolling("T2M", 30, start, end),
+                        lambda: series.T2M.rolling(30, min_periods=1).mean()[start:end]),
+        "rain days/month": (lambda: climate.frequency(start, end, "month"),
+                            lambda: (series.PRECTOTCORR[start:end] > 0).resample("MS").sum()),
+    }
+    for name, (lookup, scan) in queries.items():
+        lookup_seconds = best_of(lookup, args.runs)
+        scan_seconds = best_of(scan, args.runs)
+        print(f"{name:16s} index {lookup_seconds * 1000:8.2f} ms, scan {scan_seconds * 1000:8.2f} ms")
+
+    next_day = np.array([df.date.iloc[-1].to_datetime64() + np.timedelta64(1, "D")])
+    started = time.perf_counter()
+    climate.append(next_day, {"T2M": np.array([20.0]), "PRECTOTCORR": np.array([1.5])})
+    print(f"append one day   {(time.perf_counter() - started) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Cold-start cost of the serverless entry point: CSV parse vs columnar store.
+
+Each run imports ``api.index`` in a fresh interpreter, the way a cold Vercel
+invocation does, and reports the import time and peak RSS of that process.
+
+    python -m benchmarks.bench_cold_start --years 20 --stations 50 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from api._lib.columnar_store import ingest_csv
+
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, time
+started = time.perf_counter()
+import api.index
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+COLUMNS = ["T2M", "T2M_MIN", "T2M_MAX", "PRECTOTCORR", "RH2M", "WS2M", "ALLSKY_SFC_SW_DWN",
+           "PS", "QV10M", "U10M", "V10M"]
+
+
+def write_synthetic_csv(path: str, years: int, stations: int):
+    rng = np.random.default_rng(42)
+    dates = pd.date_range("2000-01-01", periods=years * 365, freq="D")
+    frames = []
+    for station in range(stations):
+        frame = pd.DataFrame({column: rng.normal(10, 5, len(dates)).round(2) for column in COLUMNS})
+        frame.insert(0, "date", dates.strftime("%Y-%m-%d"))
+        frame.insert(0, "location", f"station-{station:04d}")
+        frames.append(frame)
+    pd.concat(frames).to_csv(path, index=False)
+
+
+def cold_start(env: dict) -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=WEB_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "nasa_power.csv")
+        store_dir = os.path.join(workdir, "store")
+        write_synthetic_csv(csv_path, args.years, args.stations)
+        ingest_csv(csv_path, store_dir)
+        print(f"{args.years} years x {args.stations} stations, "
+              f"CSV {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        base_env = {**os.environ, "NASA_POWER_CSV": csv_path,
+                    "MODEL_REGISTRY_DIR": os.path.join(workdir, "models"),
+                    "NASA_CACHE_DIR": os.path.join(workdir, "nasa-cache"),
+                    "GEOCODE_CACHE_PATH": os.path.join(workdir, "geocode.json")}
+        modes = {
+            "csv": {**base_env, "NASA_POWER_STORE_DIR": ""},
+            "store": {**base_env, "NASA_POWER_STORE_DIR": store_dir},
+        }
+        for name, env in modes.items():
+            runs = [cold_start(env) for _ in range(args.runs)]
+            seconds = statistics.median(run["seconds"] for run in runs)
+            rss = statistics.median(run["max_rss_kb"] for run in runs)
+            print(f"{name:>6}: import {seconds * 1000:8.1f} ms (median of {args.runs}), "
+                  f"peak RSS {rss / 1024:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
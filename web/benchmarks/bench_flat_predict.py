@@ -0,0 +1,62 @@
+"""Prediction latency of the exported flat forest against scikit-learn.
+
+Fits the recommendation forest on a synthetic history, exports it with
+``export_model`` and times both predictors on batches of rows, checking that
+they agree on every prediction.
+
+    python -m benchmarks.bench_flat_predict --days 3000 --batches 1 10 100 1000 10000
+"""
+import argparse
+import contextlib
+import io
+import pickle
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from api._lib.flat_model import export_model
+from api._lib.online_model import IncrementalTrainer, training_arrays
+from benchmarks.bench_incremental_training import synthetic_rows
+from benchmarks.bench_training_throughput import FEATURES
+
+
+def best_of(call, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=3000)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    # The forest was fitted on a DataFrame; plain arrays are what both predictors get here
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    df = pd.DataFrame(synthetic_rows(args.days))
+    trainer = IncrementalTrainer(mode="forest")
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = trainer.fit(df, FEATURES, ids=list(range(len(df))))["online"].model
+    flat = export_model(model)
+    X, _ = training_arrays(df, FEATURES)
+    X = np.resize(X.to_numpy(dtype=np.float64), (max(args.batches), len(FEATURES)))
+    print(f"{len(model.estimators_)} trees, pickled: sklearn {len(pickle.dumps(model)) / 1e6:.2f} MB, "
+          f"flat {len(pickle.dumps(flat)) / 1e6:.2f} MB")
+    for rows in args.batches:
+        batch = X[:rows]
+        assert np.array_equal(flat.predict(batch), model.predict(batch))
+        flat_seconds = best_of(lambda: flat.predict(batch), args.runs)
+        sklearn_seconds = best_of(lambda: model.predict(batch), args.runs)
+        print(f"{rows:6d} rows: flat {flat_seconds * 1000:8.2f} ms ({flat_seconds / rows * 1e6:7.1f} us/row), "
+              f"sklearn {sklearn_seconds * 1000:8.2f} ms ({sklearn_seconds / rows * 1e6:7.1f} us/row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Import-time profile of the serverless entry point, with a startup budget check.
+
+Runs ``python -X importtime -c "import api.index"`` in fresh interpreters, reports
+the modules with the highest cumulative import cost and fails (exit code 1) when
+the median import exceeds ``--max-ms`` or a module from ``--forbid`` is imported
+at startup instead of lazily.
+
+    python -m benchmarks.bench_import_time --runs 5 --max-ms 800
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FORBIDDEN = ["pandas", "sklearn", "scipy", "numpy", "joblib", "requests"]
+
+
+def profile_import(env: dict) -> dict:
+    """``{module: (self_us, cumulative_us)}`` for one cold import of ``api.index``."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api.index"],
+                            cwd=WEB_DIR, env=env, capture_output=True, text=True, check=True).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=800.0,
+                        help="budget for the median cumulative import of api.index")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="top-level packages that must not be imported at startup")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**os.environ,
+               "MODEL_REGISTRY_DIR": os.path.join(workdir, "models"),
+               "NASA_CACHE_DIR": os.path.join(workdir, "nasa-cache"),
+               "GEOCODE_CACHE_PATH": os.path.join(workdir, "geocode.json")}
+        runs = [profile_import(env) for _ in range(args.runs)]
+
+    # Per top-level package, summing self time so nested imports are not double counted
+    packages = defaultdict(list)
+    for modules in runs:
+        totals = defaultdict(int)
+        for name, (self_us, _) in modules.items():
+            totals[name.split(".")[0]] += self_us
+        for package, total in totals.items():
+            packages[package].append(total)
+    ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+
+    print(f"{'package':<30} {'median self ms':>15}")
+    for package, samples in ranked[:args.top]:
+        print(f"{package:<30} {statistics.median(samples) / 1000:>15.1f}")
+
+    total_ms = statistics.median(modules["api.index"][1] for modules in runs) / 1000
+    print(f"\napi.index cumulative import: {total_ms:.1f} ms (median of {args.runs}, budget {args.max_ms:.0f} ms)")
+
+    failures = []
+    if total_ms > args.max_ms:
+        failures.append(f"import took {total_ms:.1f} ms, over the {args.max_ms:.0f} ms budget")
+    eager = sorted({name.split(".")[0] for modules in runs for name in modules} & set(args.forbid))
+    if eager:
+        failures.append(f"imported at startup instead of lazily: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
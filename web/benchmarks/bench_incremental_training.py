@@ -0,0 +1,85 @@
+"""Training cost per request as a location's history grows one day at a time.
+
+For each update mode, a location's model is fitted once on ``--start-days`` of
+history, then the ``generate_recommendations`` handler is called with one more day each
+time. The time reported per request includes any background refit it
+triggered, so "refit" shows the cost of retraining on the whole history.
+
+    python -m benchmarks.bench_incremental_training --start-days 1000 --requests 60
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from api._lib.history import History, HistoryRequest
+from api._lib.training_jobs import TrainingPending
+from benchmarks.bench_cold_start import COLUMNS
+
+
+def synthetic_rows(days: int):
+    rng = np.random.default_rng(7)
+    dates = pd.date_range("2000-01-01", periods=days, freq="D")
+    season = 12 * np.sin(2 * np.pi * dates.dayofyear.to_numpy() / 365.25)
+    frame = pd.DataFrame({column: rng.normal(10, 5, days).round(2) for column in COLUMNS})
+    frame["T2M"] = (15 + season + rng.normal(0, 3, days)).round(2)
+    frame["T2M_MAX"] = (frame["T2M"] + rng.normal(5, 1, days)).round(2)
+    frame["T2M_MIN"] = (frame["T2M"] - rng.normal(5, 1, days)).round(2)
+    frame.insert(0, "date", dates.strftime("%Y%m%d"))
+    return frame.to_dict(orient="records")
+
+
+def recommend_when_trained(api, request):
+    try:
+        return api.recommend(request)
+    except TrainingPending as e:
+        # Cold miss: the fit was queued; wait for it and score again
+        e.job.future.result()
+        return api.recommend(request)
+
+
+def wait_for_refits(registry):
+    while registry.snapshot()["refreshing"]:
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start-days", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--modes", nargs="+", default=["refit", "forest", "sgd"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(workdir, "models"))
+        import api.index as api
+
+        rows = synthetic_rows(args.start_days + args.requests)
+        for mode in args.modes:
+            os.environ["MODEL_UPDATE_MODE"] = mode
+            api.services.reset("model_trainer")
+            location = f"bench-{mode}"
+            history = lambda days: HistoryRequest(History.from_records(rows[:days]), location)
+            started = time.perf_counter()
+            recommend_when_trained(api, history(args.start_days))
+            first = time.perf_counter() - started
+            timings = []
+            for days in range(args.start_days + 1, args.start_days + args.requests + 1):
+                started = time.perf_counter()
+                recommend_when_trained(api, history(days))
+                wait_for_refits(api.services.model_registry)
+                timings.append(time.perf_counter() - started)
+            quarter = max(1, len(timings) // 4)
+            print(f"{mode:>6}: first fit {first * 1000:7.1f} ms, per new day median "
+                  f"{statistics.median(timings) * 1000:7.1f} ms, first quarter "
+                  f"{statistics.mean(timings[:quarter]) * 1000:7.1f} ms, last quarter "
+                  f"{statistics.mean(timings[-quarter:]) * 1000:7.1f} ms")
+        print(api.services.model_registry.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Model fit throughput of the training queue against worker processes and n_jobs.
+
+Submits ``--fits`` independent full fits (distinct histories, so none are
+deduplicated) and reports fits per second for each combination of pool size
+and per-fit ``n_jobs``, up to the number of cores.
+
+    python -m benchmarks.bench_training_throughput --days 1500 --fits 16
+"""
+import argparse
+import multiprocessing
+import time
+
+from api._lib.online_model import IncrementalTrainer
+from api._lib.history import History
+from api._lib.training_jobs import TrainingJobQueue, fit_history
+from benchmarks.bench_incremental_training import synthetic_rows
+
+
+FEATURES = ['PRECTOTCORR', 'RH2M', 'WS2M', 'T2M_MAX', 'T2M_MIN', 'PS', 'QV10M', 'U10M', 'V10M',
+            'ALLSKY_SFC_SW_DWN']
+
+
+def powers_of_two(limit: int):
+    value = 1
+    while value < limit:
+        yield value
+        value *= 2
+    yield limit
+
+
+def throughput(workers: int, n_jobs: int, histories, use_processes: bool) -> float:
+    queue = TrainingJobQueue(max_workers=workers, max_pending=len(histories), use_processes=use_processes)
+    trainer = IncrementalTrainer(mode="refit", n_jobs=n_jobs)
+    # Start the workers before timing so process spawn is not counted
+    queue.run("warm-up", fit_history, trainer, histories[0].tail(100), FEATURES)
+    started = time.perf_counter()
+    jobs = [queue.submit(f"fit-{index}", fit_history, trainer, history, FEATURES)[0]
+            for index, history in enumerate(histories)]
+    for job in jobs:
+        job.future.result()
+    elapsed = time.perf_counter() - started
+    queue.shutdown()
+    return len(histories) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=1500)
+    parser.add_argument("--fits", type=int, default=16)
+    parser.add_argument("--cores", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--threads", action="store_true", help="use the thread pool fallback")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.days + args.fits)
+    # Each fit sees a different window so results differ like distinct locations would
+    histories = [History.from_records(rows[index:index + args.days]) for index in range(args.fits)]
+    print(f"{args.fits} fits of {args.days} days, {args.cores} cores, "
+          f"{'threads' if args.threads else 'processes'}")
+    for workers in powers_of_two(args.cores):
+        for n_jobs in powers_of_two(max(1, args.cores // workers)):
+            rate = throughput(workers, n_jobs, histories, not args.threads)
+            print(f"workers {workers:3d} x n_jobs {n_jobs:3d}: {rate:6.2f} fits/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Upstream throughput of one event loop: blocking ``requests`` vs the pooled async client.
+
+The "blocking" path is what the async endpoints did before: call ``requests.get``
+inside a coroutine, which stalls the loop for every round trip. The "pooled" path
+goes through ``AsyncHttpClient``, so the requests overlap.
+
+    python -m benchmarks.bench_upstream_load --requests 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from api._lib.http_client import AsyncHttpClient
+from benchmarks.mock_upstream import POWER_PATH, mock_upstream
+
+
+PARAMS = {
+    "start": "20240101",
+    "end": "20240131",
+    "latitude": 48.75,
+    "longitude": 2.1875,
+    "parameters": "T2M,PRECTOTCORR,RH2M,WS2M,ALLSKY_SFC_SW_DWN",
+    "community": "AG",
+    "format": "JSON",
+}
+
+
+async def blocking(url: str, count: int) -> None:
+    async def one():
+        requests.get(url, params=PARAMS).json()
+
+    await asyncio.gather(*(one() for _ in range(count)))
+
+
+async def pooled(url: str, count: int, in_flight: int) -> None:
+    client = AsyncHttpClient(max_in_flight=in_flight)
+
+    async def one():
+        (await client.get(url, params=PARAMS)).json()
+
+    try:
+        await asyncio.gather(*(one() for _ in range(count)))
+    finally:
+        await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock upstream delay in seconds")
+    parser.add_argument("--in-flight", type=int, default=200)
+    args = parser.parse_args()
+
+    with mock_upstream(args.latency) as (base_url, _):
+        url = base_url + POWER_PATH
+        runs = {
+            "blocking": lambda: blocking(url, args.requests),
+            "pooled": lambda: pooled(url, args.requests, args.in_flight),
+        }
+        for name, run in runs.items():
+            started = time.perf_counter()
+            asyncio.run(run())
+            elapsed = time.perf_counter() - started
+            print(f"{name:>9}: {args.requests / elapsed:8.1f} req/s ({elapsed:.2f}s for {args.requests})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Local stand-ins for the NASA POWER and OpenCage APIs.
+
+Both answer with synthetic payloads after a configurable delay, so the API can
+be benchmarked (or pointed at through ``NASA_POWER_URL``) without network access.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+POWER_PATH = "/api/temporal/daily/point"
+GEOCODE_PATH = "/geocode/v1/json"
+
+
+def power_payload(query: dict) -> dict:
+    start = datetime.strptime(query["start"], "%Y%m%d")
+    end = datetime.strptime(query["end"], "%Y%m%d")
+    days = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range((end - start).days + 1)]
+    parameters = query["parameters"].split(",")
+    return {"properties": {"parameter": {
+        parameter: {day: round(10 + (i % 30) * 0.5 + j, 2) for i, day in enumerate(days)}
+        for j, parameter in enumerate(parameters)
+    }}}
+
+
+def geocode_payload(query: dict) -> dict:
+    if query.get("q", "").casefold().startswith("nowhere"):
+        return {"results": []}
+    seed = sum(map(ord, query.get("q", ""))) % 1000
+    return {"results": [{"geometry": {"lat": seed / 20 - 25, "lng": seed / 10 - 50}}]}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _handler(latency: float, counter: dict):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            counter[url.path] = counter.get(url.path, 0) + 1
+            time.sleep(latency)
+            if url.path == POWER_PATH:
+                body = power_payload(query)
+            elif url.path == GEOCODE_PATH:
+                body = geocode_payload(query)
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def mock_upstream(latency: float = 0.05):
+    """Run the stand-in server on a free port; yields ``(base_url, request_counter)``."""
+    counter = {}
+    server = _Server(("127.0.0.1", 0), _handler(latency, counter))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", counter
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,309 @@
+"""Benchmark suite for the API endpoints and the data/ML hot paths.
+
+Runs every case in-process through FastAPI's test client against a synthetic
+dataset. NASA POWER and OpenCage are replaced by the local ``mock_upstream``
+servers. For each case it reports p50/p95/p99 latency, throughput (sequential
+requests per second) and peak RSS. Peak RSS is the process high-water mark
+after the case, so it depends on the cases run before it. The training
+workers' peak is reported separately.
+
+Results can be saved as a JSON baseline. With ``--baseline``, the run fails
+(exit status 1) when a case's p50 or p95 latency is more than ``--threshold``
+above the baseline, its throughput falls by more than that, or its peak RSS
+grows by more than ``--rss-threshold``. Baselines only compare runs on the
+same machine.
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.25
+    python -m benchmarks.suite --cases 'chart_*' --iterations 50
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from benchmarks.bench_cold_start import WEB_DIR, write_synthetic_csv
+from benchmarks.bench_incremental_training import synthetic_rows
+from benchmarks.mock_upstream import GEOCODE_PATH, POWER_PATH, mock_upstream
+
+
+LATENCY_METRICS = ("p50_ms", "p95_ms")
+LOCATION = "station-0000"
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[int], None]
+    # Called before each iteration, outside the timing
+    setup: Optional[Callable[[int], None]] = None
+    # Fraction of --iterations for slow cases (full fits), at least 3
+    scale: float = 1.0
+    warmup: int = 1
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / divisor
+
+
+def measure(case: Case, iterations: int) -> dict:
+    iterations = max(3, int(iterations * case.scale))
+    for i in range(case.warmup):
+        if case.setup:
+            case.setup(-1 - i)
+        case.run(-1 - i)
+    timings = []
+    for i in range(iterations):
+        if case.setup:
+            case.setup(i)
+        started = time.perf_counter()
+        case.run(i)
+        timings.append(time.perf_counter() - started)
+    timings_ms = np.array(timings) * 1000
+    p50, p95, p99 = np.percentile(timings_ms, [50, 95, 99])
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(timings_ms.mean()), 3),
+        "throughput_per_s": round(iterations / sum(timings), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_child_rss_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+
+
+def check(response, status: int = 200):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.url} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def until_trained(client, send, status: int = 200):
+    """``send()``, waiting out (and then repeating it after) any 202 answered while a model trains."""
+    response = send()
+    while response.status_code == 202:
+        wait_for_job(client, response)
+        response = send()
+    return check(response, status)
+
+
+def wait_for_job(client, accepted) -> dict:
+    """The final description of the training job a 202 response points to."""
+    while True:
+        job = check(client.get(accepted.json()["status_url"])).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.001)
+
+
+def columnar_body(rows: List[dict]) -> dict:
+    names = [name for name in rows[0] if name != "date"]
+    return {"dates": [row["date"] for row in rows], "columns": {name: [row[name] for row in rows] for name in names}}
+
+
+def build_cases(api, client, store_dir: str, years: int) -> List[Case]:
+    cases = []
+    # The dataset written by write_synthetic_csv
+    first = np.datetime64("2000-01-01")
+    last = first + np.timedelta64(years * 365 - 1, "D")
+
+    def chart(days: Optional[int], cached: bool = False, **options):
+        start = last - np.timedelta64(days - 1, "D") if days else first
+        body = {"lat": 0, "lon": 0, "start_date": str(start), "end_date": str(last), "location": LOCATION, **options}
+        setup = None if cached else (lambda _: api.services.reset("response_cache"))
+        return lambda _: check(client.post("/api/py/get_chart_data", json=body)), setup
+
+    for label, days in (("30d", 30), ("1y", 365), ("all", None)):
+        run, setup = chart(days)
+        cases.append(Case(f"chart_data_{label}", run, setup))
+    run, setup = chart(None, columnar=True)
+    cases.append(Case("chart_data_all_columnar", run, setup))
+    run, setup = chart(None, max_points=500)
+    cases.append(Case("chart_data_all_downsampled", run, setup))
+    run, _ = chart(365, cached=True)
+    cases.append(Case("chart_data_1y_cached", run))
+
+    # GET with the ETag of the previous answer: a 304 without the body
+    query = {"start_date": str(last - np.timedelta64(364, "D")), "end_date": str(last), "location": LOCATION}
+    etag = {}
+
+    def revalidate(_):
+        response = check(client.get("/api/py/get_chart_data", params=query, headers=etag),
+                         304 if etag else 200)
+        etag.setdefault("If-None-Match", response.headers["ETag"])
+
+    cases.append(Case("chart_data_1y_not_modified", revalidate))
+
+    history = synthetic_rows(3650 + 64)
+
+    def train(days, i):
+        # Shifted by a day per iteration so each one is a cold fit: queued, then polled until done
+        body = columnar_body(history[(i + 1) % 64:][:days])
+        return wait_for_job(client, check(client.post("/api/py/train_model", json=body), 202))
+
+    for days in (365, 1095, 3650):
+        cases.append(Case(f"train_model_{days}d", lambda i, days=days: train(days, i), scale=0.1))
+        prediction = {"data": columnar_body(history[:days]), "location": f"bench-{days}"}
+        cases.append(Case(f"generate_recommendations_{days}d",
+                          lambda _, prediction=prediction: until_trained(
+                              client, lambda: client.post("/api/py/generate_recommendations", json=prediction))))
+
+    # One more day per request: the incremental model update path
+    growing = {}
+
+    def next_day(i):
+        days = 1095 + 1 + i + 1  # warm-up is i = -1
+        growing["body"] = {"data": columnar_body(history[:days]), "location": "bench-growing"}
+
+    cases.append(Case("generate_recommendations_new_day",
+                      lambda _: until_trained(
+                          client, lambda: client.post("/api/py/generate_recommendations", json=growing["body"])),
+                      setup=next_day, scale=0.5))
+
+    # Many farms scored with the models the cases above trained
+    farms = 10000
+    picked = np.random.default_rng(2).integers(0, len(history), farms)
+    scoring = {"locations": [f"bench-{(365, 1095, 3650)[i % 3]}" for i in range(farms)],
+               "columns": {name: [history[i][name] for i in picked] for name in history[0] if name != "date"}}
+    cases.append(Case(f"score_farms_{farms}",
+                      lambda _: check(client.post("/api/py/score_farms", json=scoring)), scale=0.5))
+
+    rng = np.random.default_rng(1)
+    helpers = (api.wind_speed_recommendations, api.humidity_recommendations, api.solar_radiation_recommendations,
+               api.precipitation_recommendations, api.temperature_recommendations)
+    values = rng.uniform(-10, 100, 100)
+
+    def recommendation_helpers(_):
+        for value in values:
+            for helper in helpers:
+                helper(value)
+
+    cases.append(Case("recommendation_helpers_x500", recommendation_helpers))
+
+    def reload_dataset(_):
+        api.services.reset("nasa_power_index")
+        api.services.nasa_power_index
+
+    def use_store(enabled: bool):
+        def setup(_):
+            os.environ["NASA_POWER_STORE_DIR"] = store_dir if enabled else ""
+        return setup
+
+    cases.append(Case("dataset_load_csv", reload_dataset, use_store(False), scale=0.2))
+    cases.append(Case("dataset_load_store", reload_dataset, use_store(True), scale=0.2))
+
+    def import_api(_):
+        # A cold serverless start: a fresh interpreter importing the entry point
+        subprocess.run([sys.executable, "-c", "import api.index"], cwd=WEB_DIR, env=os.environ.copy(),
+                       check=True, capture_output=True)
+
+    cases.append(Case("import_api", import_api, scale=0.2))
+
+    # End to end: geocode, POWER fetch and a model fit for a place not seen before
+    cases.append(Case("process_user_input",
+                      lambda i: until_trained(client, lambda: client.post(
+                          "/api/py/", json={"name": "Bench", "location": f"Bench Town {i + 1}"})),
+                      scale=0.2))
+    return cases
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+            rss_threshold: float) -> List[str]:
+    """Human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if current[metric] > reference[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {current[metric]} > {reference[metric]} (+{threshold:.0%})")
+        if current["throughput_per_s"] < reference["throughput_per_s"] / (1 + threshold):
+            regressions.append(f"{name}: throughput {current['throughput_per_s']}/s < "
+                               f"{reference['throughput_per_s']}/s (-{threshold:.0%})")
+        if current["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']} MB > "
+                               f"{reference['peak_rss_mb']} MB (+{rss_threshold:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", default=["*"], help="glob patterns of case names to run")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--years", type=int, default=10, help="length of the synthetic dataset")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock upstream delay in seconds")
+    parser.add_argument("--output", help="write this run's results as JSON")
+    parser.add_argument("--save-baseline", help="write this run's results as the baseline")
+    parser.add_argument("--baseline", help="compare against this baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed latency/throughput change")
+    parser.add_argument("--rss-threshold", type=float, default=0.5, help="allowed peak RSS growth")
+    parser.add_argument("--list", action="store_true", help="list the case names and exit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, mock_upstream(args.latency) as (base_url, _):
+        csv_path = os.path.join(workdir, "nasa_power.csv")
+        store_dir = os.path.join(workdir, "store")
+        write_synthetic_csv(csv_path, args.years, 1)
+        os.environ.update({
+            "NASA_POWER_CSV": csv_path,
+            "NASA_POWER_STORE_DIR": "",
+            "MODEL_REGISTRY_DIR": os.path.join(workdir, "models"),
+            "NASA_CACHE_DIR": os.path.join(workdir, "nasa-cache"),
+            "GEOCODE_CACHE_PATH": os.path.join(workdir, "geocode.json"),
+            "NASA_POWER_URL": base_url + POWER_PATH,
+            "OPEN_CAGE_URL": base_url + GEOCODE_PATH,
+            "OPEN_CAGE_API_KEY": "benchmark",
+        })
+        from fastapi.testclient import TestClient
+
+        from api._lib.columnar_store import ingest_csv
+        import api.index as api
+
+        ingest_csv(csv_path, store_dir)
+        with TestClient(api.app) as client:
+            cases = [case for case in build_cases(api, client, store_dir, args.years)
+                     if any(fnmatch.fnmatch(case.name, pattern) for pattern in args.cases)]
+            if args.list:
+                print("\n".join(case.name for case in cases))
+                return
+            results = {}
+            print(f"{'case':36s} {'iters':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} "
+                  f"{'req/s':>8s} {'RSS MB':>7s}")
+            for case in cases:
+                result = measure(case, args.iterations)
+                results[case.name] = result
+                print(f"{case.name:36s} {result['iterations']:5d} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+                      f"{result['p99_ms']:9.2f} {result['throughput_per_s']:8.2f} {result['peak_rss_mb']:7.1f}")
+
+    report = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "years": args.years, "created_at": time.time()},
+              "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.rss_threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
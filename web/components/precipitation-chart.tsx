@@ -1,5 +1,7 @@
 "use client";
 
+import { useEffect, useState } from "react";
+import { format, subDays } from "date-fns";
 import { TrendingUp } from "lucide-react";
 import {
   Bar,
@@ -24,9 +26,10 @@ import {
   ChartTooltip,
   ChartTooltipContent,
 } from "@/components/ui/chart";
+import { fetchChartData } from "@/lib/chart-data";
 
-// Sample data - replace with your actual data
-const precipitationData = [
+// Shown until the last week's data has loaded, or when the dataset has none
+const sampleData = [
   { date: "2023-01-01", PRECTOTCORR: 5 },
   { date: "2023-01-02", PRECTOTCORR: 0 },
   { date: "2023-01-03", PRECTOTCORR: 10 },
@@ -36,10 +39,6 @@ const precipitationData = [
   { date: "2023-01-07", PRECTOTCORR: 3 },
 ];
 
-const precipitationDays = precipitationData.filter(
-  (day) => day.PRECTOTCORR > 0
-).length;
-
 const chartConfig = {
   precipitation: {
     label: "Precipitation",
@@ -48,6 +47,29 @@ const chartConfig = {
 } satisfies ChartConfig;
 
 export function PrecipitationChart() {
+  const [precipitationData, setPrecipitationData] = useState(sampleData);
+
+  useEffect(() => {
+    const today = new Date();
+    fetchChartData({
+      startDate: format(subDays(today, 6), "yyyyMMdd"),
+      endDate: format(today, "yyyyMMdd"),
+    })
+      .then((data) =>
+        setPrecipitationData(
+          data.precipitation.map((day) => ({
+            date: day.date,
+            PRECTOTCORR: day.value ?? 0,
+          }))
+        )
+      )
+      .catch((error) => console.error("Error fetching chart data:", error));
+  }, []);
+
+  const precipitationDays = precipitationData.filter(
+    (day) => day.PRECTOTCORR > 0
+  ).length;
+
   return (
     <Card className="flex flex-col">
       <CardHeader className="text-center">
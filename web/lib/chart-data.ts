@@ -0,0 +1,58 @@
+// Chart and alert series are fetched with GET, so the browser caches them and
+// revalidates with the ETag; the API answers 304 until the dataset changes.
+
+export interface ChartQuery {
+  // yyyyMMdd
+  startDate: string;
+  endDate: string;
+  location?: string;
+}
+
+export interface ChartData {
+  temperature: { date: string; min: number | null; max: number | null; avg: number | null }[];
+  precipitation: { date: string; value: number | null }[];
+  windSpeed: { date: string; value: number | null }[];
+  solarRadiation: { date: string; value: number | null }[];
+}
+
+export interface AlertSeries {
+  dates: string[];
+  // Per metric, the index into its messages for each day
+  alerts: Record<string, number[]>;
+  messages: Record<string, string[]>;
+}
+
+function queryString({ startDate, endDate, location }: ChartQuery): string {
+  const params = new URLSearchParams({ start_date: startDate, end_date: endDate });
+  if (location) {
+    params.set("location", location);
+  }
+  return params.toString();
+}
+
+async function getJson<T>(path: string, query: ChartQuery): Promise<T> {
+  const response = await fetch(`${path}?${queryString(query)}`);
+  if (!response.ok) {
+    throw new Error(`${path} failed with status ${response.status}`);
+  }
+  return response.json();
+}
+
+export function fetchChartData(query: ChartQuery): Promise<ChartData> {
+  return getJson<ChartData>("/api/py/get_chart_data", query);
+}
+
+export function fetchAlertSeries(query: ChartQuery): Promise<AlertSeries> {
+  return getJson<AlertSeries>("/api/py/get_alert_series", query);
+}
+
+// The message of each metric on the last day of the series
+export function latestAlerts(series: AlertSeries): Record<string, string> {
+  const latest: Record<string, string> = {};
+  for (const [metric, codes] of Object.entries(series.alerts)) {
+    if (codes.length > 0) {
+      latest[metric] = series.messages[metric][codes[codes.length - 1]];
+    }
+  }
+  return latest;
+}
@@ -1,89 +1,149 @@
 import streamlit as st
-import requests
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import os
 
+from api._lib.nasa_cache import NASA_POWER_URL as DEFAULT_NASA_POWER_URL
+from api._lib.nasa_cache import DEFAULT_CACHE_DIR, NasaPowerCache, UpstreamError
+from api._lib.geocode_cache import DEFAULT_CACHE_PATH as DEFAULT_GEOCODE_CACHE_PATH
+from api._lib.geocode_cache import GeocodeCache, GeocoderError, GeocoderNotConfigured, OpenCageGeocoder
+from api._lib.csv_ingest import IngestError, ingest_csv
+from api._lib.figures import frame_digest, history_png
+from api._lib.power_mirror import MirrorBehind, NotMirrored, PowerMirror, next_day
+
 # NASA POWER API Endpoint
-NASA_POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+NASA_POWER_URL = os.environ.get('NASA_POWER_URL', DEFAULT_NASA_POWER_URL)
+
+# Shared with the API: overlapping date ranges only fetch the days not cached yet
+nasa_cache = NasaPowerCache(directory=os.environ.get('NASA_CACHE_DIR', DEFAULT_CACHE_DIR), base_url=NASA_POWER_URL)
+
+# Local mirror of NASA POWER kept up to date by `python -m api._lib.power_mirror sync`;
+# farms it covers are served without calling the API
+POWER_MIRROR_DIR = os.environ.get('NASA_POWER_MIRROR_DIR')
+power_mirror = PowerMirror(POWER_MIRROR_DIR, farms_path=os.environ.get('NASA_POWER_MIRROR_FARMS')) if POWER_MIRROR_DIR else None
 
 # API Key for OpenCage (you need to sign up to get your own key)
+# Only needed for cities that are not in the geocode cache yet
 OPEN_CAGE_API_KEY = os.environ.get('OPEN_CAGE_API_KEY')
-if OPEN_CAGE_API_KEY is None:
-    raise ValueError("OPEN_CAGE_API_KEY environment variable is not set")
+
+geocode_cache = GeocodeCache(OpenCageGeocoder(OPEN_CAGE_API_KEY), path=os.environ.get('GEOCODE_CACHE_PATH', DEFAULT_GEOCODE_CACHE_PATH))
+
+# Streamlit reruns the whole script on every interaction; fetched data and trained
+# models are memoized per process so only a new query refetches or refits.
+# Entries expire after DATA_CACHE_TTL seconds, the least recently used are evicted
+# beyond the max entries, and the sidebar button clears everything.
+DATA_CACHE_TTL = int(os.environ.get('STREAMLIT_DATA_CACHE_TTL', 6 * 3600))
+DATA_CACHE_ENTRIES = int(os.environ.get('STREAMLIT_DATA_CACHE_ENTRIES', 32))
+MODEL_CACHE_ENTRIES = int(os.environ.get('STREAMLIT_MODEL_CACHE_ENTRIES', 8))
+FIGURE_CACHE_ENTRIES = int(os.environ.get('STREAMLIT_FIGURE_CACHE_ENTRIES', 64))
+
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_ENTRIES, show_spinner=False)
+def lookup_city(city_name):
+    # Farms registered in the mirror resolve without the geocoder
+    farm = power_mirror.farm(city_name) if power_mirror is not None else None
+    if farm is not None:
+        return farm.lat, farm.lon
+    return geocode_cache.lookup(city_name)
 
 # Function to get latitude and longitude of a city via OpenCage API
 def get_lat_lon(city_name):
-    url = f"https://api.opencagedata.com/geocode/v1/json?q={city_name}&key={OPEN_CAGE_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
-    if data['results']:
-        return data['results'][0]['geometry']['lat'], data['results'][0]['geometry']['lng']
+    try:
+        result = lookup_city(city_name)
+    except GeocoderNotConfigured:
+        st.error("OPEN_CAGE_API_KEY environment variable is not set")
+        return None, None
+    except GeocoderError as e:
+        st.error(f"Error looking up the city: {e.status_code}")
+        return None, None
+    if result is not None:
+        return result
     else:
         st.error("City not found. Please check the name.")
         return None, None
 
+# Fetch historical weather data from the mirror or the NASA POWER API; errors are raised, and not cached
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_ENTRIES, show_spinner="Fetching NASA POWER data...")
+def fetch_nasa_data(lat, lon, start_date, end_date):
+    parameters = ["T2M", "PRECTOTCORR", "RH2M", "WS2M", "ALLSKY_SFC_SW_DWN", "T2M_MAX", "T2M_MIN", "PS", "QV10M", "SNODP",
+                  "TS", "U10M", "U2M", "U50M", "V10M", "V2M", "PSC", "WD10M", "WD2M", "WS10M"]
+
+    # Ensure site elevation parameter is included in upstream requests
+    upstream = {"community": "AG", "site-elevation": "35"}
+    payload, freshness = None, None
+    try:
+        if power_mirror is None:
+            raise NotMirrored()
+        # Online, days past the mirror's last sync are fetched from the API instead
+        payload, freshness = power_mirror.get(lat, lon, start_date, end_date, parameters,
+                                              fill_tail=os.environ.get('NASA_POWER_OFFLINE') == '1')
+    except MirrorBehind as e:
+        if e.last_day >= start_date:
+            # The mirror serves what it has; only the days after its last sync come from the API
+            head, freshness = power_mirror.get(lat, lon, start_date, e.last_day, parameters)
+            tail = nasa_cache.get(lat, lon, next_day(e.last_day), end_date, parameters, **upstream)
+            payload = {parameter: {**head[parameter], **tail[parameter]} for parameter in parameters}
+            freshness = {**freshness, "upstream_from": next_day(e.last_day)}
+    except NotMirrored:
+        if os.environ.get('NASA_POWER_OFFLINE') == '1':
+            raise
+    if payload is None:
+        payload = nasa_cache.get(lat, lon, start_date, end_date, parameters, **upstream)
+
+    # Create a date range based on the provided dates
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    df = pd.DataFrame(payload)
+
+    # Insert the Date column at the beginning of the DataFrame
+    df.insert(0, 'Date', dates)
+
+    return df, freshness
+
 # Function to fetch historical weather data via NASA POWER API
 def get_nasa_data(lat, lon, start_date, end_date):
-    params = {
-        "start": start_date,
-        "end": end_date,
-        "latitude": lat,
-        "longitude": lon,
-        "parameters": "T2M,PRECTOTCORR,RH2M,WS2M,ALLSKY_SFC_SW_DWN,T2M_MAX,T2M_MIN,PS,QV10M,SNODP,TS,U10M,U2M,U50M,V10M,V2M,PSC,WD10M,WD2M,WS10M",
-        "community": "AG",
-        "format": "JSON",
-        "site-elevation": "35"  # Ensure site elevation parameter is included
-    }
-
-    response = requests.get(NASA_POWER_URL, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        parameters = data['properties']['parameter']
-
-        # Create a date range based on the provided dates
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        df = pd.DataFrame(parameters)
-
-        # Insert the Date column at the beginning of the DataFrame
-        df.insert(0, 'Date', dates)
-
-        return df
-    else:
-        st.error(f"Error fetching data from NASA: {response.status_code}")
+    try:
+        df, freshness = fetch_nasa_data(lat, lon, start_date, end_date)
+    except NotMirrored:
+        st.error("This location is not in the local NASA POWER mirror")
+        return None
+    except UpstreamError as e:
+        st.error(f"Error fetching data from NASA: {e.status_code}")
         return None
 
-# Function to visualize climatic trends
-def visualize_data(df):
-    plt.figure(figsize=(12, 8))
-
-    # Plot average, max, and min temperatures
-    plt.subplot(2, 1, 1)
-    plt.plot(df['Date'], df['T2M'], label='Temperature (°C)', color='blue')
-
-    if 'TMAX' in df.columns:
-        plt.plot(df['Date'], df['TMAX'], label='Max Temperature (°C)', color='red')
-
-    if 'TMIN' in df.columns:
-        plt.plot(df['Date'], df['TMIN'], label='Min Temperature (°C)', color='green')
-
-    plt.title('Temperatures (°C)')
-    plt.legend()
+    if freshness is not None:
+        caption = (f"From the local NASA POWER mirror: synced {freshness['synced_at']}, "
+                   f"data through {freshness['last_day']}")
+        if "upstream_from" in freshness:
+            caption += f"; from {freshness['upstream_from']} on, from the NASA POWER API"
+        st.caption(caption)
+    return df
 
-    if 'PRECTOT' in df.columns:
-        plt.subplot(2, 1, 2)
-        plt.bar(df['Date'], df['PRECTOT'], label='Precipitation (mm)', color='orange', alpha=0.5)
-        plt.title('Precipitation (mm)')
-        plt.legend()
+# Uploads are keyed by their file id, so the same upload is only read once
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_ENTRIES, show_spinner="Reading the CSV...")
+def ingest_upload(file_id, _uploaded_file):
+    return ingest_csv(_uploaded_file)
 
-    st.pyplot(plt)
+# Rendered charts, keyed by the digest of the data and the plotted range
+@st.cache_data(ttl=DATA_CACHE_TTL, max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def render_history(digest, start, end, _df):
+    return history_png(_df, start, end)
 
-# Function to train predictive model for classification
-def train_classification_model(df):
+# Function to visualize climatic trends
+def visualize_data(df):
+    digest = frame_digest(df)
+    first, last = df['Date'].min().date(), df['Date'].max().date()
+    start, end = first, last
+    if first < last:
+        # Keyed by the data, so a new dataset starts from its full range
+        start, end = st.slider("Dates to plot", min_value=first, max_value=last, value=(first, last),
+                               key=f"plot_range_{digest}")
+    st.image(render_history(digest, start, end, df))
+
+# Fit the classifier; shared (not copied) between reruns and sessions training on the same data
+@st.cache_resource(max_entries=MODEL_CACHE_ENTRIES, show_spinner="Training the model...")
+def fit_classification_model(df):
     df = df.dropna()  # Remove missing data
 
     # Check which columns are available in the DataFrame
@@ -92,7 +152,6 @@ def train_classification_model(df):
 
     # Handle case where there are insufficient columns
     if len(available_features) < 2:
-        st.error("Not enough features to train the model. Please check the data.")
         return None
 
     # Define independent (X) and dependent (y) variables
@@ -116,6 +175,16 @@ def train_classification_model(df):
     accuracy = accuracy_score(y_test, y_pred)
     report = classification_report(y_test, y_pred)
 
+    return model, accuracy, report
+
+# Function to train predictive model for classification
+def train_classification_model(df):
+    fitted = fit_classification_model(df)
+    if fitted is None:
+        st.error("Not enough features to train the model. Please check the data.")
+        return None
+    model, accuracy, report = fitted
+
     st.write(f"Accuracy: {accuracy:.2f}")
     st.write("Classification Report:")
     st.text(report)
@@ -257,10 +326,18 @@ def generate_recommendations(df, model):
         for i in sorted_indices:
             st.write(f"{feature_names[i]}: {feature_importances[i]:.4f}")
 
+def clear_caches():
+    for cached in (lookup_city, fetch_nasa_data, ingest_upload, fit_classification_model, render_history):
+        cached.clear()
+    st.session_state.pop('api_query', None)
+
 # Main Streamlit application
 def main():
     st.title("Climate Prediction Tool for Farmers")
 
+    # Explicit invalidation, e.g. after the mirror was synced or the geocode cache edited
+    st.sidebar.button("Clear cached data, models and charts", on_click=clear_caches)
+
     # Choose data retrieval method
     data_choice = st.radio("How would you like to obtain the data?", ('API', 'Upload a CSV file'))
 
@@ -272,11 +349,16 @@ def main():
         start_date = st.date_input("Select Start Date", datetime(2020, 1, 1))
         end_date = st.date_input("Select End Date", datetime(2024, 1, 31))
 
+        # The query outlives the button press, so later reruns redraw from the caches
         if st.button("Get data via API"):
+            st.session_state['api_query'] = (city_name, start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"))
+
+        if 'api_query' in st.session_state:
+            city_name, start, end = st.session_state['api_query']
             lat, lon = get_lat_lon(city_name)
 
             if lat and lon:
-                historical_df = get_nasa_data(lat, lon, start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"))
+                historical_df = get_nasa_data(lat, lon, start, end)
 
                 if historical_df is not None:
                     st.write("Historical Weather Data:")
@@ -291,15 +373,30 @@ def main():
     else:
         uploaded_file = st.file_uploader("Upload CSV file", type=["csv"])
         if uploaded_file is not None:
-            historical_df = pd.read_csv(uploaded_file)
-            st.write("Historical Weather Data:")
-            st.dataframe(historical_df)
-
-            visualize_data(historical_df)
-
-            model = train_classification_model(historical_df)
+            # Read in chunks: only summaries, a sample and the latest rows are kept in memory
+            try:
+                ingested = ingest_upload(uploaded_file.file_id, uploaded_file)
+            except IngestError as e:
+                st.error(str(e))
+                return
+            for issue in ingested.issues:
+                st.warning(issue)
+            if ingested.rows == 0:
+                st.error("The CSV has no rows with a valid date.")
+                return
+
+            st.write(f"Historical Weather Data: {ingested.rows} days from "
+                     f"{ingested.first_date:%Y-%m-%d} to {ingested.last_date:%Y-%m-%d}")
+            st.dataframe(ingested.summary)
+            st.write(f"Sample of {len(ingested.sample)} rows:")
+            st.dataframe(ingested.sample)
+
+            visualize_data(ingested.monthly)
+
+            # Trained on the most recent rows, the latest of which is scored
+            model = train_classification_model(ingested.training)
             if model:
-                generate_recommendations(historical_df, model)
+                generate_recommendations(ingested.training, model)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,97 @@
+"""Shared fixtures: a stub of the NASA POWER and OpenCage APIs on a local port.
+
+Run from ``web/``: ``python -m pytest tests``.
+"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_upstream import GEOCODE_PATH, POWER_PATH, geocode_payload, power_payload  # noqa: E402
+from api._lib.nasa_cache import FILL_VALUE  # noqa: E402
+
+
+class StubUpstream:
+    """Answers like ``benchmarks.mock_upstream`` and records every query.
+
+    ``status`` makes every request fail with that code, and days from
+    ``unpublished_from`` on come back as fill values, as POWER reports days it
+    has not published yet.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.status = 200
+        self.unpublished_from = None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        self.power_url = self.base_url + POWER_PATH
+        self.geocode_url = self.base_url + GEOCODE_PATH
+
+    def power_queries(self):
+        return [query for path, query in self.queries if path == POWER_PATH]
+
+    def power_spans(self):
+        return [(query["start"], query["end"]) for query in self.power_queries()]
+
+    def _respond(self, path, query):
+        with self._lock:
+            self.queries.append((path, query))
+        if self.status != 200:
+            return self.status, {"message": "stubbed failure"}
+        if path == POWER_PATH:
+            body = power_payload(query)
+            if self.unpublished_from is not None:
+                for values in body["properties"]["parameter"].values():
+                    for day in values:
+                        if day >= self.unpublished_from:
+                            values[day] = FILL_VALUE
+            return 200, body
+        if path == GEOCODE_PATH:
+            return 200, geocode_payload(query)
+        return 404, {}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = stub._respond(url.path, query)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    stub = StubUpstream()
+    stub.start()
+    yield stub
+    stub.stop()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from api._lib import geocode_cache
+from api._lib.geocode_cache import GeocodeCache, GeocoderError, GeocoderNotConfigured, OpenCageGeocoder
+
+
+class FakeGeocoder:
+    """Counts calls; with ``gate`` set, each call waits for it so concurrent lookups overlap."""
+
+    def __init__(self, places=None):
+        self.places = places or {"paris": (48.85, 2.35)}
+        self.calls = []
+        self.gate = None
+
+    def __call__(self, query):
+        self.calls.append(query)
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        return self.places.get(query)
+
+    async def acall(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(0.05)
+        return self.places.get(query)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(geocode_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(geocoder, **options):
+        options.setdefault("path", str(tmp_path / "geocode.json"))
+        cache = GeocodeCache(geocoder, **options)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_queries_are_normalized_and_cached(make_cache):
+    geocoder = FakeGeocoder()
+    cache = make_cache(geocoder)
+    assert cache.lookup("Paris") == (48.85, 2.35)
+    assert cache.lookup("  PARIS ") == (48.85, 2.35)
+    assert geocoder.calls == ["paris"]
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_concurrent_threaded_lookups_share_one_call(make_cache):
+    geocoder = FakeGeocoder()
+    geocoder.gate = threading.Event()
+    cache = make_cache(geocoder)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.lookup("Paris"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.snapshot()["coalesced"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    geocoder.gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [(48.85, 2.35)] * 5
+    assert geocoder.calls == ["paris"]
+
+
+def test_concurrent_async_lookups_share_one_call(make_cache):
+    geocoder = FakeGeocoder()
+    cache = make_cache(geocoder, async_geocoder=geocoder.acall)
+
+    async def lookups():
+        return await asyncio.gather(*(cache.alookup(query) for query in ["Paris", "paris ", "PARIS"]))
+
+    assert asyncio.run(lookups()) == [(48.85, 2.35)] * 3
+    assert geocoder.calls == ["paris"]
+    assert cache.snapshot()["coalesced"] == 2
+
+
+def test_batches_look_up_each_place_once(make_cache):
+    geocoder = FakeGeocoder({"paris": (48.85, 2.35), "lyon": (45.76, 4.84)})
+    cache = make_cache(geocoder)
+    found = cache.lookup_many(["Paris", "Lyon", "paris", "Nowhere"])
+    assert found == {"Paris": (48.85, 2.35), "Lyon": (45.76, 4.84), "paris": (48.85, 2.35), "Nowhere": None}
+    assert sorted(geocoder.calls) == ["lyon", "nowhere", "paris"]
+
+
+def test_entries_expire_after_the_ttl(make_cache, clock):
+    geocoder = FakeGeocoder()
+    cache = make_cache(geocoder, ttl_seconds=60)
+    cache.lookup("Paris")
+    clock.now += 59
+    cache.lookup("Paris")
+    assert len(geocoder.calls) == 1
+
+    clock.now += 1
+    cache.lookup("Paris")
+    assert len(geocoder.calls) == 2
+    assert cache.snapshot()["expired"] == 1
+
+
+def test_expired_entries_are_not_loaded_from_disk(make_cache, clock, tmp_path):
+    cache = make_cache(FakeGeocoder(), ttl_seconds=60)
+    cache.lookup("Paris")
+    cache.close()
+
+    geocoder = FakeGeocoder()
+    assert make_cache(geocoder, ttl_seconds=60).lookup("Paris") == (48.85, 2.35)
+    assert geocoder.calls == []
+
+    clock.now += 60
+    geocoder = FakeGeocoder()
+    make_cache(geocoder, ttl_seconds=60).lookup("Paris")
+    assert geocoder.calls == ["paris"]
+
+
+def test_writes_are_debounced(make_cache, tmp_path):
+    path = tmp_path / "geocode.json"
+    cache = make_cache(FakeGeocoder({f"place {i}": (i, i) for i in range(50)}), flush_seconds=60)
+    for i in range(50):
+        cache.lookup(f"Place {i}")
+    assert not path.exists()
+
+    cache.flush()
+    assert len(json.loads(path.read_text())) == 50
+
+
+def test_least_recently_used_entries_are_evicted(make_cache):
+    geocoder = FakeGeocoder({"a": (1, 1), "b": (2, 2), "c": (3, 3)})
+    cache = make_cache(geocoder, max_entries=2)
+    cache.lookup("a")
+    cache.lookup("b")
+    cache.lookup("a")
+    cache.lookup("c")
+    cache.lookup("a")
+    cache.lookup("b")
+    assert geocoder.calls == ["a", "b", "c", "b"]
+
+
+def test_opencage_responses(upstream):
+    geocoder = OpenCageGeocoder("key", base_url=upstream.geocode_url)
+    assert geocoder("Paris") is not None
+    assert geocoder("Nowhere at all") is None
+    assert upstream.queries[0][1] == {"q": "Paris", "key": "key"}
+
+    upstream.status = 402
+    with pytest.raises(GeocoderError) as raised:
+        geocoder("Paris")
+    assert raised.value.status_code == 402
+
+    with pytest.raises(GeocoderNotConfigured):
+        OpenCageGeocoder(None, base_url=upstream.geocode_url)("Paris")
+
+
+def test_geocoder_errors_are_not_cached(make_cache, upstream):
+    cache = make_cache(OpenCageGeocoder("key", base_url=upstream.geocode_url))
+    upstream.status = 503
+    with pytest.raises(GeocoderError):
+        cache.lookup("Paris")
+    upstream.status = 200
+    assert cache.lookup("Paris") is not None
+    assert len(upstream.queries) == 2
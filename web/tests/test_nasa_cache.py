@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from api._lib.nasa_cache import FILL_VALUE, NasaPowerCache, contiguous_spans, snap_to_grid
+
+
+PARAMETERS = ["T2M", "PRECTOTCORR"]
+
+
+@pytest.fixture
+def cache(tmp_path, upstream):
+    return NasaPowerCache(directory=str(tmp_path), base_url=upstream.power_url)
+
+
+def aget(cache, *args, **kwargs):
+    async def run():
+        try:
+            return await cache.aget(*args, **kwargs)
+        finally:
+            # The pooled client is bound to the loop asyncio.run starts and closes
+            await cache.client.aclose()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("point, grid_point", [
+    ((0, 0), (0.0, 0.0)),
+    ((0.24, 0.31), (0.0, 0.0)),
+    ((0.26, 0.32), (0.5, 0.625)),
+    ((-33.87, 151.21), (-34.0, 151.25)),
+    ((48.85, 2.35), (49.0, 2.5)),
+    ((90, 0), (90.0, 0.0)),
+    ((-90, -180), (-90.0, -180.0)),
+    # 180 and -180 are the same meridian
+    ((10, 179.9), (10.0, -180.0)),
+])
+def test_snap_to_grid_rounds_to_the_nearest_grid_point(point, grid_point):
+    assert snap_to_grid(*point) == grid_point
+
+
+def test_contiguous_spans():
+    days = ["20200101", "20200102", "20200104", "20200228", "20200229", "20200301"]
+    assert contiguous_spans(days) == [("20200101", "20200102"), ("20200104", "20200104"),
+                                      ("20200228", "20200301")]
+
+
+def test_overlapping_ranges_only_fetch_missing_days(cache, upstream):
+    first = cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    second = cache.get(48.85, 2.35, "20200105", "20200120", PARAMETERS)
+
+    assert upstream.power_spans() == [("20200101", "20200110"), ("20200111", "20200120")]
+    # Cached days keep the values of the first response, new ones start their own span
+    assert second["T2M"]["20200105"] == first["T2M"]["20200105"] == 12.0
+    assert second["T2M"]["20200111"] == 10.0
+    assert list(second["PRECTOTCORR"]) == [f"202001{day:02d}" for day in range(5, 21)]
+
+
+def test_gaps_on_both_sides_are_fetched_as_separate_spans(cache, upstream):
+    cache.get(48.85, 2.35, "20200110", "20200120", PARAMETERS)
+    merged = cache.get(48.85, 2.35, "20200105", "20200125", PARAMETERS)
+
+    assert upstream.power_spans()[1:] == [("20200105", "20200109"), ("20200121", "20200125")]
+    assert len(merged["T2M"]) == 21
+    assert cache.get(48.85, 2.35, "20200105", "20200125", PARAMETERS) == merged
+    assert len(upstream.power_spans()) == 3
+    assert cache.snapshot()["days_from_cache"] == 11 + 21
+
+
+def test_async_fetches_missing_spans_and_merges(cache, upstream):
+    cache.get(48.85, 2.35, "20200110", "20200120", PARAMETERS)
+    merged = aget(cache, 48.85, 2.35, "20200105", "20200125", PARAMETERS)
+
+    assert sorted(upstream.power_spans()[1:]) == [("20200105", "20200109"), ("20200121", "20200125")]
+    assert merged == cache.get(48.85, 2.35, "20200105", "20200125", PARAMETERS)
+
+
+def test_unpublished_days_are_served_but_fetched_again(cache, upstream):
+    upstream.unpublished_from = "20200108"
+    first = cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    assert first["T2M"]["20200108"] == FILL_VALUE
+
+    upstream.unpublished_from = None
+    second = cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    assert upstream.power_spans()[-1] == ("20200108", "20200110")
+    assert second["T2M"]["20200108"] != FILL_VALUE
+
+
+def test_points_in_one_grid_cell_share_the_cache(cache, upstream):
+    cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    cache.get(48.9, 2.3, "20200101", "20200110", PARAMETERS)
+    assert len(upstream.power_queries()) == 1
+    # Upstream is asked for the grid point, not the point requested
+    query = upstream.power_queries()[0]
+    assert (float(query["latitude"]), float(query["longitude"])) == (49.0, 2.5)
+
+    # Across the cell boundary (48.75) is another grid point
+    cache.get(48.7, 2.35, "20200101", "20200110", PARAMETERS)
+    query = upstream.power_queries()[1]
+    assert (float(query["latitude"]), float(query["longitude"])) == (48.5, 2.5)
+
+
+def test_upstream_errors_are_raised_and_not_cached(cache, upstream):
+    from api._lib.nasa_cache import UpstreamError
+
+    upstream.status = 503
+    with pytest.raises(UpstreamError) as raised:
+        cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    assert raised.value.status_code == 503
+
+    upstream.status = 200
+    cache.get(48.85, 2.35, "20200101", "20200110", PARAMETERS)
+    assert upstream.power_spans()[-1] == ("20200101", "20200110")
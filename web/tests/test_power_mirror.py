@@ -0,0 +1,151 @@
+import json
+
+import pytest
+
+from benchmarks.mock_upstream import power_payload
+from api._lib.nasa_cache import FILL_VALUE, UpstreamError
+from api._lib.power_mirror import (FilePowerSource, MirrorBehind, NotMirrored, PowerMirror, SyncInProgress,
+                                   cell_name, next_day)
+
+
+PARAMETERS = ("T2M", "PRECTOTCORR", "RH2M")
+FARMS = [{"name": "Farm A", "lat": 48.85, "lon": 2.35},
+         # Same grid cell as Farm A
+         {"name": "Farm B", "lat": 48.9, "lon": 2.3},
+         {"name": "Farm C", "lat": -33.9, "lon": 18.4}]
+
+
+class RecordingSource(FilePowerSource):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.spans = []
+
+    def fetch(self, lat, lon, start, end, parameters):
+        self.spans.append((cell_name(lat, lon), start, end))
+        return super().fetch(lat, lon, start, end, parameters)
+
+
+def write_source(directory, farm, start, end, unpublished_from=None):
+    payload = power_payload({"start": start, "end": end, "parameters": ",".join(PARAMETERS)})
+    for values in payload["properties"]["parameter"].values():
+        for day in values:
+            if unpublished_from is not None and day >= unpublished_from:
+                values[day] = FILL_VALUE
+    with open(directory / f"{cell_name(farm['lat'], farm['lon'])}.json", "w") as f:
+        json.dump(payload, f)
+    return payload["properties"]["parameter"]
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    directory = tmp_path / "source"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    directory = tmp_path / "mirror"
+    directory.mkdir()
+    (directory / "farms.json").write_text(json.dumps(FARMS))
+    return PowerMirror(str(directory), parameters=PARAMETERS)
+
+
+def test_sync_stores_published_days_per_cell(mirror, source_dir):
+    source = RecordingSource(str(source_dir))
+    expected = write_source(source_dir, FARMS[0], "20200101", "20200310", unpublished_from="20200308")
+    write_source(source_dir, FARMS[2], "20200101", "20200310")
+
+    summary = mirror.sync(source, start="20200101", end="20200310")
+
+    assert summary["farms"] == 3
+    assert summary["cells"] == 2
+    assert summary["failed"] == {}
+    # Farms A and B share a cell, so it is fetched once
+    assert sorted(span[0] for span in source.spans) == sorted({cell_name(f["lat"], f["lon"]) for f in FARMS})
+    values, freshness = mirror.get(48.9, 2.3, "20200301", "20200307", ["T2M", "RH2M"])
+    assert values == {name: {day: expected[name][day] for day in values[name]} for name in ("T2M", "RH2M")}
+    assert freshness["first_day"] == "20200101"
+    # Unpublished days are left out, so the next sync asks for them again
+    assert freshness["last_day"] == "20200307"
+
+
+def test_later_syncs_only_fetch_new_days(mirror, source_dir):
+    source = RecordingSource(str(source_dir))
+    write_source(source_dir, FARMS[0], "20200101", "20200310", unpublished_from="20200308")
+    write_source(source_dir, FARMS[2], "20200101", "20200310")
+    mirror.sync(source, farms=mirror.farms()[:1], start="20200101", end="20200310")
+
+    write_source(source_dir, FARMS[0], "20200101", "20200315")
+    source.spans.clear()
+    summary = mirror.sync(source, farms=mirror.farms()[:1], start="20200101", end="20200315")
+
+    assert source.spans == [(cell_name(48.85, 2.35), "20200308", "20200315")]
+    assert summary["days_fetched"] == 8
+    assert mirror.cell(48.85, 2.35).freshness()["last_day"] == "20200315"
+
+
+def test_failed_cells_keep_their_data(mirror, source_dir):
+    write_source(source_dir, FARMS[0], "20200101", "20200310")
+    mirror.sync(FilePowerSource(str(source_dir)), start="20200101", end="20200310")
+
+    (source_dir / f"{cell_name(48.85, 2.35)}.json").unlink()
+    summary = mirror.sync(FilePowerSource(str(source_dir)), start="20200101", end="20200320")
+
+    # Farm C never had a source file
+    assert set(summary["failed"]) == {cell_name(48.85, 2.35), cell_name(-33.9, 18.4)}
+    assert mirror.cell(48.85, 2.35).freshness()["last_day"] == "20200310"
+
+
+def test_ranges_past_the_last_sync_raise_mirror_behind(mirror, source_dir):
+    write_source(source_dir, FARMS[0], "20200101", "20200310")
+    mirror.sync(FilePowerSource(str(source_dir)), farms=mirror.farms()[:1], start="20200101", end="20200310")
+
+    with pytest.raises(MirrorBehind) as behind:
+        mirror.get(48.85, 2.35, "20200305", "20200315", PARAMETERS)
+    assert behind.value.last_day == "20200310"
+    assert next_day(behind.value.last_day) == "20200311"
+    # Still a NotMirrored, for callers that do not serve part of the range
+    assert isinstance(behind.value, NotMirrored)
+
+    # Offline callers get the days not synced yet as fill values
+    values, _ = mirror.get(48.85, 2.35, "20200309", "20200312", ["T2M"], fill_tail=True)
+    assert list(values["T2M"]) == ["20200309", "20200310", "20200311", "20200312"]
+    assert values["T2M"]["20200310"] != FILL_VALUE
+    assert values["T2M"]["20200311"] == values["T2M"]["20200312"] == FILL_VALUE
+
+
+def test_ranges_the_mirror_cannot_serve(mirror, source_dir):
+    write_source(source_dir, FARMS[0], "20200101", "20200310")
+    mirror.sync(FilePowerSource(str(source_dir)), farms=mirror.farms()[:1], start="20200101", end="20200310")
+
+    with pytest.raises(NotMirrored):
+        mirror.get(-33.9, 18.4, "20200101", "20200105", PARAMETERS)
+    with pytest.raises(NotMirrored):
+        mirror.get(48.85, 2.35, "20191225", "20200105", PARAMETERS)
+    with pytest.raises(NotMirrored):
+        mirror.get(48.85, 2.35, "20200101", "20200105", ["WS2M"])
+    with pytest.raises(ValueError):
+        mirror.get(48.85, 2.35, "20200105", "20200101", PARAMETERS)
+
+
+def test_farms_resolve_by_name(mirror):
+    assert mirror.farm("  farm   a ") == mirror.farms()[0]
+    assert mirror.farm("Farm D") is None
+
+
+def test_concurrent_syncs_are_refused(mirror, source_dir):
+    class BlockingSource(FilePowerSource):
+        def fetch(self, *args):
+            with pytest.raises(SyncInProgress):
+                mirror.sync(FilePowerSource(str(source_dir)), start="20200101", end="20200105")
+            return super().fetch(*args)
+
+    write_source(source_dir, FARMS[0], "20200101", "20200105")
+    mirror.sync(BlockingSource(str(source_dir)), farms=mirror.farms()[:1], start="20200101", end="20200105")
+
+
+def test_file_source_reports_missing_cells(source_dir):
+    with pytest.raises(UpstreamError) as raised:
+        FilePowerSource(str(source_dir)).fetch(0, 0, "20200101", "20200105", PARAMETERS)
+    assert raised.value.status_code == 404
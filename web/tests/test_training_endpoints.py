@@ -0,0 +1,103 @@
+"""202 and 429 answers of the endpoints that queue model fits."""
+import threading
+
+import pytest
+
+from benchmarks.bench_incremental_training import synthetic_rows
+from api._lib import training_jobs
+
+
+# Built from the settings below in each test, and dropped again after it
+SERVICES = ("http_client", "nasa_cache", "geocode_cache", "model_registry", "model_trainer", "training_jobs")
+ROWS = synthetic_rows(120)
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path, upstream):
+    monkeypatch.setenv("TRAINING_EXECUTOR", "thread")
+    monkeypatch.setenv("MODEL_REGISTRY_DIR", str(tmp_path / "models"))
+    monkeypatch.setenv("NASA_CACHE_DIR", str(tmp_path / "nasa"))
+    monkeypatch.setenv("GEOCODE_CACHE_PATH", str(tmp_path / "geocode.json"))
+    monkeypatch.setenv("OPEN_CAGE_URL", upstream.geocode_url)
+    import api.index as index
+
+    monkeypatch.setattr(index, "NASA_POWER_URL", upstream.power_url)
+    monkeypatch.setattr(index, "OPEN_CAGE_API_KEY", "key")
+    monkeypatch.setattr(index, "POWER_MIRROR_DIR", None)
+    index.services.reset(*SERVICES)
+    yield index
+    index.services.reset(*SERVICES)
+
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Holds every fit until set, so requests made meanwhile find the job pending."""
+    gate = threading.Event()
+    fit_history = training_jobs.fit_history
+
+    def gated_fit(*args):
+        assert gate.wait(30)
+        return fit_history(*args)
+
+    monkeypatch.setattr(training_jobs, "fit_history", gated_fit)
+    yield gate
+    gate.set()
+
+
+def columnar(rows):
+    names = [name for name in rows[0] if name != "date"]
+    return {"dates": [row["date"] for row in rows], "columns": {name: [row[name] for row in rows] for name in names}}
+
+
+ENDPOINTS = {
+    "train_model": lambda client: client.post("/api/py/train_model", json=columnar(ROWS)),
+    "generate_recommendations": lambda client: client.post(
+        "/api/py/generate_recommendations", json={"data": columnar(ROWS), "location": "Paris"}),
+    "process_user_input": lambda client: client.post("/api/py/", json={"name": "Ana", "location": "Paris"}),
+}
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_cold_misses_answer_202_until_the_model_is_fitted(api, client, gate, endpoint):
+    send = ENDPOINTS[endpoint]
+    accepted = send(client)
+    assert accepted.status_code == 202
+    status_url = accepted.json()["status_url"]
+    assert accepted.headers["Location"] == status_url
+    assert int(accepted.headers["Retry-After"]) >= 1
+
+    # Repeats while the fit runs join the job instead of queueing another
+    repeated = send(client)
+    assert repeated.status_code == 202
+    assert repeated.json()["status_url"] == status_url
+
+    gate.set()
+    job = api.services.training_jobs.get(accepted.json()["job_id"])
+    job.future.result(30)
+    assert client.get(status_url).json()["status"] == "done"
+    assert send(client).status_code == 200
+    assert api.services.training_jobs.snapshot()["submitted"] == 1
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_full_queue_answers_429(api, client, endpoint):
+    api.services.training_jobs.max_pending = 0
+    rejected = ENDPOINTS[endpoint](client)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert api.services.training_jobs.snapshot()["rejected"] == 1
+
+
+def test_geocoder_failures_keep_their_status(api, client, upstream):
+    upstream.status = 402
+    response = ENDPOINTS["process_user_input"](client)
+    # Not turned into a 500 by the endpoint's catch-all
+    assert response.status_code == 502